@@ -0,0 +1,105 @@
+# asset.py
+
+# ====================================================================
+# ASSET STATICI CON IMPRONTA (BUNDLE, MANIFEST, CACHE DEL BROWSER)
+# ====================================================================
+# JS e CSS condivisi, Bootstrap compreso (servito da qui: jsdelivr è bloccato su parte della
+# rete interna), sono uniti nei bundle di BUNDLE e salvati in static/dist con l'hash del
+# contenuto nel nome (app.<impronta>.js). static/dist/manifest.json associa il nome logico al
+# file e i template lo risolvono con {{ asset('app.js') }}.
+#
+# Un file con impronta non cambia mai (un contenuto nuovo ha un nome nuovo): viene servito
+# con Cache-Control immutable e durata di un anno, quindi il browser lo scarica una volta
+# sola invece di ricevere lo stesso JavaScript in linea a ogni pagina.
+#
+# I bundle si rigenerano con 'python costruisci_asset.py' dopo ogni modifica ai sorgenti
+# (static/js, static/css, static/vendor) e vanno committati: Render e Vercel non eseguono
+# build. 'python costruisci_asset.py --verifica' controlla che siano aggiornati.
+import hashlib
+import json
+import os
+import re
+
+from flask import current_app, request, url_for
+
+CARTELLA_DIST = 'dist'
+FILE_MANIFEST = 'manifest.json'
+CACHE_IMMUTABILE = 'public, max-age=31536000, immutable'
+
+# Nome logico -> sorgenti (relativi a static/), concatenati in quest'ordine
+BUNDLE = {
+    'app.css': [
+        'vendor/bootstrap/bootstrap.min.css',
+        'css/base.css',
+    ],
+    'app.js': [
+        'vendor/bootstrap/bootstrap.bundle.min.js',
+        'js/filtri_tabella.js',
+        'js/selezione_multipla.js',
+        'js/modale_trasferta.js',
+    ],
+    'griglia_presenze.js': [
+        'js/griglia_presenze.js',
+    ],
+}
+
+# Le source map dei file minificati non sono distribuite: i riferimenti darebbero solo 404
+_SOURCE_MAP = re.compile(r'^\s*(?://# sourceMappingURL=.*|/\*# sourceMappingURL=.*\*/)\s*$', re.MULTILINE)
+
+
+def componi_bundle(cartella_static, nome):
+    parti = []
+    for sorgente in BUNDLE[nome]:
+        with open(os.path.join(cartella_static, sorgente), encoding='utf-8') as f:
+            parti.append(_SOURCE_MAP.sub('', f.read()).strip())
+    # Il ';' separa script che non terminano con un punto e virgola
+    separatore = '\n;\n' if nome.endswith('.js') else '\n'
+    return separatore.join(parti) + '\n'
+
+
+def nome_con_impronta(nome, contenuto):
+    base, estensione = os.path.splitext(nome)
+    impronta = hashlib.sha256(contenuto.encode('utf-8')).hexdigest()[:12]
+    return f'{CARTELLA_DIST}/{base}.{impronta}{estensione}'
+
+
+def costruisci_bundle(cartella_static):
+    """{nome logico: (percorso con impronta relativo a static/, contenuto)} per tutti i bundle."""
+    bundle = {}
+    for nome in BUNDLE:
+        contenuto = componi_bundle(cartella_static, nome)
+        bundle[nome] = (nome_con_impronta(nome, contenuto), contenuto)
+    return bundle
+
+
+def leggi_manifest(cartella_static):
+    percorso = os.path.join(cartella_static, CARTELLA_DIST, FILE_MANIFEST)
+    try:
+        with open(percorso, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise RuntimeError(f"Manifest degli asset assente ({percorso}): eseguire 'python costruisci_asset.py'")
+
+
+def asset(nome):
+    """URL del bundle con impronta per il nome logico (es. 'app.js'), da usare nei template."""
+    try:
+        percorso = current_app.extensions['asset'][nome]
+    except KeyError:
+        raise KeyError(f"Asset '{nome}' non presente nel manifest: eseguire 'python costruisci_asset.py'")
+    return url_for('static', filename=percorso)
+
+
+def _cache_immutabile(response):
+    # Solo i file con impronta: gli altri file statici mantengono la cache predefinita di Flask
+    if request.endpoint == 'static' and response.status_code in (200, 304):
+        if request.view_args.get('filename') in current_app.extensions['asset'].values():
+            response.headers['Cache-Control'] = CACHE_IMMUTABILE
+    return response
+
+
+def init_asset(app):
+    """Carica il manifest, rende disponibile asset() nei template e imposta la cache dei bundle."""
+    app.extensions['asset'] = leggi_manifest(app.static_folder)
+    app.jinja_env.globals.update(asset=asset)
+    app.after_request(_cache_immutabile)
@@ -0,0 +1,72 @@
+# cache_modali.py
+
+# ====================================================================
+# CACHE DEI FRAMMENTI DEI MODALI
+# ====================================================================
+# I modali "Dettagli" vengono riaperti molte volte, soprattutto per missioni che cambiano di
+# rado. Il frammento HTML viene quindi conservato in memoria per (trasferta, fase, readonly),
+# insieme alla versione della trasferta con cui è stato generato: una sola query sulla colonna
+# versione (incrementata a ogni modifica della missione o delle sue spese, da qualunque
+# processo) decide se il frammento è ancora valido. Nessuno stato è considerato immutabile:
+# rendiconto e spese si possono riscrivere anche su missioni concluse o rimborsate.
+# Ogni risposta porta ETag e Last-Modified, quindi il browser rivalida e riceve 304.
+import hashlib
+import threading
+from collections import OrderedDict
+
+from flask import current_app, request
+
+MODALI_CACHE_MAX_VOCI = 2000
+FASI_MODALE = ('pre', 'rendiconto', 'rimborso')
+
+_cache_modali = OrderedDict()  # (trasferta_id, fase, readonly) -> dict(versione, etag, generato, corpo)
+_cache_modali_lock = threading.Lock()
+_revisione_modali = []
+
+
+def revisione_template_modali():
+    """Impronta dei template dei modali: un deploy che li cambia invalida anche gli ETag già nei browser."""
+    if not _revisione_modali:
+        impronta = hashlib.sha1()
+        for nome in ('_modale_pre.html', '_modale_rendiconto.html'):
+            sorgente, _, _ = current_app.jinja_env.loader.get_source(current_app.jinja_env, nome)
+            impronta.update(sorgente.encode('utf-8'))
+        _revisione_modali.append(impronta.hexdigest()[:8])
+    return _revisione_modali[0]
+
+
+def leggi_cache_modale(chiave):
+    with _cache_modali_lock:
+        voce = _cache_modali.get(chiave)
+        if voce is not None:
+            _cache_modali.move_to_end(chiave)
+        return voce
+
+
+def salva_cache_modale(chiave, voce):
+    with _cache_modali_lock:
+        _cache_modali[chiave] = voce
+        _cache_modali.move_to_end(chiave)
+        while len(_cache_modali) > MODALI_CACHE_MAX_VOCI:
+            _cache_modali.popitem(last=False)
+
+
+def invalida_cache_modali(trasferta_id=None):
+    """Rimuove i frammenti di una trasferta (o tutti, senza argomenti) dalla cache di questo processo."""
+    with _cache_modali_lock:
+        if trasferta_id is None:
+            _cache_modali.clear()
+            return
+        for chiave in [c for c in _cache_modali if c[0] == trasferta_id]:
+            del _cache_modali[chiave]
+
+
+def risposta_modale(voce):
+    """Risposta condizionale: 304 se il browser ha già questa versione del frammento."""
+    risposta = current_app.make_response(voce['corpo'])
+    risposta.set_etag(voce['etag'])
+    risposta.last_modified = voce['generato']
+    # private: il contenuto dipende dall'utente autenticato; no-cache: rivalidare sempre con l'ETag
+    risposta.cache_control.private = True
+    risposta.cache_control.no_cache = True
+    return risposta.make_conditional(request)
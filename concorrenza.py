@@ -0,0 +1,117 @@
+# concorrenza.py
+
+# ====================================================================
+# MODALITÀ DEI WORKER (SYNC, A THREAD, GREEN)
+# ====================================================================
+# Con i worker sync ogni processo gunicorn serve una richiesta alla volta: un export CSV
+# o una dashboard_presenze pesante tengono fermo un worker (un quarto della capacità con
+# --workers 4). WEB_WORKER_MODALITA sceglie come ogni processo serve più richieste:
+#   sync    un processo per richiesta (comportamento storico)
+#   thread  worker 'gthread': WEB_THREADS thread per processo
+#   green   worker 'gevent': fino a WEB_CONNESSIONI_GREEN greenlet per processo (richiede gevent)
+# La configurazione di gunicorn (gunicorn.conf.py) legge le impostazioni da qui; il benchmark
+# verify_concorrenza.py confronta le tre modalità sullo stesso mix di rotte.
+#
+# Cosa rende l'app sicura con più richieste per processo:
+#   - la sessione di Flask-SQLAlchemy è legata al contesto dell'app, quindi a ogni richiesta
+#     (thread o greenlet), e viene chiusa a fine richiesta;
+#   - il pool di connessioni è dimensionato sulle richieste contemporanee del processo
+#     (DB_POOL_SIZE, impostato qui se non già presente nell'ambiente);
+#   - le cache di processo (utenti, modali, monitoraggio, statistiche del pool) sono protette
+#     da lock, che gevent rende cooperativi;
+#   - con gevent psycopg2 attende il database cedendo il controllo agli altri greenlet
+#     (attiva_attese_cooperative) e l'hashing delle password gira su thread veri
+#     (executor_per_calcoli), altrimenti bloccherebbe l'intero processo.
+import os
+import sys
+
+MODALITA = ('sync', 'thread', 'green')
+# Nomi accettati anche con il nome del worker gunicorn
+ALIAS_MODALITA = {'gthread': 'thread', 'gevent': 'green'}
+CLASSI_WORKER = {'sync': 'sync', 'thread': 'gthread', 'green': 'gevent'}
+
+WORKERS_DEFAULT = 4
+THREADS_DEFAULT = 8
+CONNESSIONI_GREEN_DEFAULT = 100
+# Connessioni al database per processo in modalità green: le richieste contemporanee sono
+# molte di più, ma passano quasi tutto il tempo fuori dal database
+POOL_GREEN_DEFAULT = 10
+
+
+def modalita_worker(ambiente=os.environ):
+    modalita = ambiente.get('WEB_WORKER_MODALITA', 'sync').strip().lower()
+    modalita = ALIAS_MODALITA.get(modalita, modalita)
+    if modalita not in MODALITA:
+        raise ValueError(f"WEB_WORKER_MODALITA non valida: '{modalita}' (ammesse: {', '.join(MODALITA)})")
+    return modalita
+
+
+def impostazioni_gunicorn(ambiente=os.environ):
+    """
+    Impostazioni di gunicorn per la modalità scelta. Completa 'ambiente' con DB_POOL_SIZE
+    (ereditato dai worker) quando non è già impostato.
+    """
+    modalita = modalita_worker(ambiente)
+    impostazioni = {
+        'workers': int(ambiente.get('WEB_CONCURRENCY', WORKERS_DEFAULT)),
+        'worker_class': CLASSI_WORKER[modalita],
+    }
+    if modalita == 'thread':
+        impostazioni['threads'] = int(ambiente.get('WEB_THREADS', THREADS_DEFAULT))
+        # Una connessione per thread: nessuna richiesta attende il pool
+        ambiente.setdefault('DB_POOL_SIZE', str(impostazioni['threads']))
+    elif modalita == 'green':
+        impostazioni['worker_connections'] = int(ambiente.get('WEB_CONNESSIONI_GREEN', CONNESSIONI_GREEN_DEFAULT))
+        ambiente.setdefault('DB_POOL_SIZE', str(POOL_GREEN_DEFAULT))
+    return impostazioni
+
+
+def green_attivo():
+    """True se il processo gira sotto gevent con i moduli standard già patchati (worker 'gevent')."""
+    if 'gevent' not in sys.modules:
+        return False
+    from gevent import monkey
+    return monkey.is_module_patched('socket')
+
+
+def _attendi_psycopg2(connessione, timeout=None):
+    # Stessa logica di psycogreen: si attende il socket con gevent invece di bloccare il processo
+    import psycopg2
+    from psycopg2 import extensions
+    from gevent.socket import wait_read, wait_write
+
+    while True:
+        stato = connessione.poll()
+        if stato == extensions.POLL_OK:
+            break
+        elif stato == extensions.POLL_READ:
+            wait_read(connessione.fileno(), timeout=timeout)
+        elif stato == extensions.POLL_WRITE:
+            wait_write(connessione.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f"Stato di poll() inatteso: {stato!r}")
+
+
+def attiva_attese_cooperative():
+    """Con gevent fa attendere psycopg2 in modo cooperativo. Senza gevent o psycopg2 non fa nulla."""
+    if not green_attivo():
+        return False
+    try:
+        from psycopg2 import extensions
+    except ImportError:
+        return False
+    extensions.set_wait_callback(_attendi_psycopg2)
+    return True
+
+
+def executor_per_calcoli(max_workers, thread_name_prefix):
+    """
+    Executor per lavoro CPU (hashing delle password). Con gevent i thread di
+    concurrent.futures diventano greenlet e un calcolo bloccherebbe tutto il processo:
+    si usa invece il pool di thread nativi di gevent, i cui risultati si attendono cooperando.
+    """
+    if green_attivo():
+        from gevent.threadpool import ThreadPoolExecutor as ExecutorNativo
+        return ExecutorNativo(max_workers=max_workers)
+    from concurrent.futures import ThreadPoolExecutor
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
@@ -0,0 +1,69 @@
+import os
+import sys
+import json
+
+# Uso:
+#   python costruisci_asset.py             -> rigenera i bundle con impronta in static/dist e il manifest
+#   python costruisci_asset.py --verifica  -> controlla che static/dist corrisponda ai sorgenti (exit 1 se no)
+#
+# I bundle sono definiti in asset.py (BUNDLE). I file di una build precedente, con un'impronta
+# che non compare più nel manifest, vengono eliminati.
+from asset import CARTELLA_DIST, FILE_MANIFEST, costruisci_bundle, leggi_manifest
+
+CARTELLA_STATIC = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+CARTELLA_OUTPUT = os.path.join(CARTELLA_STATIC, CARTELLA_DIST)
+
+
+def costruisci():
+    print("--- COSTRUZIONE DEGLI ASSET STATICI ---")
+    bundle = costruisci_bundle(CARTELLA_STATIC)
+    os.makedirs(CARTELLA_OUTPUT, exist_ok=True)
+
+    for nome, (percorso, contenuto) in bundle.items():
+        with open(os.path.join(CARTELLA_STATIC, percorso), 'w', encoding='utf-8') as f:
+            f.write(contenuto)
+        print(f"{nome:<22} -> {percorso} ({len(contenuto.encode('utf-8')) / 1024:.1f} KB)")
+
+    manifest = {nome: percorso for nome, (percorso, _) in bundle.items()}
+    with open(os.path.join(CARTELLA_OUTPUT, FILE_MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.write('\n')
+
+    correnti = {os.path.basename(p) for p in manifest.values()} | {FILE_MANIFEST}
+    for file in sorted(os.listdir(CARTELLA_OUTPUT)):
+        if file not in correnti:
+            os.remove(os.path.join(CARTELLA_OUTPUT, file))
+            print(f"Eliminato {CARTELLA_DIST}/{file} (build precedente)")
+    print(f"\n[SUCCESS] {len(manifest)} bundle scritti in static/{CARTELLA_DIST}.")
+    return True
+
+
+def verifica():
+    print("--- VERIFICA DEGLI ASSET STATICI ---")
+    bundle = costruisci_bundle(CARTELLA_STATIC)
+    try:
+        manifest = leggi_manifest(CARTELLA_STATIC)
+    except RuntimeError as e:
+        print(f"[FAILURE] {e}")
+        return False
+
+    falliti = []
+    for nome, (percorso, _) in bundle.items():
+        if manifest.get(nome) != percorso:
+            falliti.append(f"{nome}: il manifest indica {manifest.get(nome)}, i sorgenti producono {percorso}")
+        elif not os.path.exists(os.path.join(CARTELLA_STATIC, percorso)):
+            falliti.append(f"{nome}: {percorso} non esiste")
+    for nome in set(manifest) - set(bundle):
+        falliti.append(f"{nome}: nel manifest ma non in BUNDLE")
+
+    if falliti:
+        for f in falliti:
+            print(f"[FAILURE] {f}")
+        print("\nCRITICAL: asset non aggiornati, eseguire 'python costruisci_asset.py'.")
+        return False
+    print(f"[SUCCESS] {len(bundle)} bundle aggiornati rispetto ai sorgenti.")
+    return True
+
+
+if __name__ == '__main__':
+    sys.exit(0 if (verifica() if '--verifica' in sys.argv else costruisci()) else 1)
@@ -0,0 +1,163 @@
+# credenziali.py
+
+# ====================================================================
+# HASHING DELLE PASSWORD (POOL DEDICATO E LIMITATO)
+# ====================================================================
+# scrypt e pbkdf2 sono lenti per scelta (decine di ms di CPU per password). Perché un
+# picco di accessi (le 8:30) non occupi tutti i worker, il calcolo passa da un pool di
+# thread dedicato con concorrenza limitata (PASSWORD_HASH_CONCORRENZA) e una coda di
+# attesa limitata (PASSWORD_HASH_CODA_MAX): oltre la coda, o dopo PASSWORD_HASH_ATTESA_MAX
+# secondi di attesa, la richiesta viene rifiutata con CodaHashingPiena (503) invece di
+# accumularsi. hashlib rilascia il GIL durante scrypt/pbkdf2: con worker a thread le
+# altre richieste continuano a essere servite mentre il pool calcola. Con i worker gevent
+# il pool usa thread nativi (concorrenza.executor_per_calcoli).
+#
+# Metodo e parametri di costo (formato werkzeug, es. 'scrypt:32768:8:1') si leggono da
+# PASSWORD_HASH_METODO: al login riuscito un hash salvato con parametri diversi viene
+# ricalcolato (da_ricalcolare), così un cambio di configurazione si propaga da solo.
+import threading
+import time
+from collections import deque
+from concurrent.futures import TimeoutError as AttesaScaduta
+
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+
+from concorrenza import executor_per_calcoli
+
+METODO_DEFAULT = 'scrypt:32768:8:1'
+CONCORRENZA_DEFAULT = 2
+CODA_MAX_DEFAULT = 16
+ATTESA_MAX_DEFAULT = 10  # secondi
+# Numero di operazioni conservate per le statistiche (finestra mobile)
+FINESTRA_MISURE = 500
+
+
+class CodaHashingPiena(Exception):
+    """Troppe operazioni di hashing in attesa: la richiesta va rifiutata, non accodata."""
+
+
+def normalizza_metodo(metodo):
+    """Completa il metodo con i default di werkzeug ('scrypt' -> 'scrypt:32768:8:1'), come compare negli hash."""
+    parti = metodo.split(':')
+    if parti[0] == 'scrypt':
+        predefinite = ['scrypt', str(2 ** 15), '8', '1']
+    elif parti[0] == 'pbkdf2':
+        predefinite = ['pbkdf2', 'sha256', str(DEFAULT_PBKDF2_ITERATIONS)]
+    else:
+        raise ValueError(f"Metodo di hashing non supportato: '{metodo}'")
+    if len(parti) > len(predefinite):
+        raise ValueError(f"Troppi parametri per il metodo di hashing '{metodo}'")
+    return ':'.join(parti + predefinite[len(parti):])
+
+
+class PoolHashing:
+    """Esegue hashing e verifiche in un ThreadPoolExecutor limitato, misurando attesa in coda e durata."""
+
+    def __init__(self, metodo=METODO_DEFAULT, concorrenza=CONCORRENZA_DEFAULT,
+                 coda_max=CODA_MAX_DEFAULT, attesa_max=ATTESA_MAX_DEFAULT):
+        self.metodo = normalizza_metodo(metodo)
+        self.concorrenza = concorrenza
+        self.coda_max = coda_max
+        self.attesa_max = attesa_max
+        # I thread vengono avviati alla prima operazione (dopo il fork dei worker)
+        self._executor = executor_per_calcoli(concorrenza, 'hash-password')
+        self._posti = threading.BoundedSemaphore(concorrenza + coda_max)
+        self._lock = threading.Lock()
+        self._misure = deque(maxlen=FINESTRA_MISURE)
+        self._in_corso = 0
+        self._rifiutate = 0
+
+    def _rifiuta(self, motivo):
+        with self._lock:
+            self._rifiutate += 1
+        raise CodaHashingPiena(motivo)
+
+    def _esegui(self, operazione, funzione, *args):
+        if not self._posti.acquire(blocking=False):
+            self._rifiuta(f"coda di hashing piena ({self.concorrenza} in calcolo, {self.coda_max} in attesa)")
+
+        accodata = time.perf_counter()
+        with self._lock:
+            self._in_corso += 1
+
+        def lavoro():
+            iniziata = time.perf_counter()
+            try:
+                return funzione(*args)
+            finally:
+                fine = time.perf_counter()
+                self._libera()
+                with self._lock:
+                    self._misure.append({
+                        'operazione': operazione,
+                        'attesa_ms': (iniziata - accodata) * 1000,
+                        'durata_ms': (fine - iniziata) * 1000,
+                    })
+
+        futuro = self._executor.submit(lavoro)
+        try:
+            return futuro.result(timeout=self.attesa_max)
+        except AttesaScaduta:
+            # Se non è ancora partito lo si toglie dalla coda; altrimenti il posto lo libera lavoro()
+            if futuro.cancel():
+                self._libera()
+            self._rifiuta(f"attesa di hashing oltre {self.attesa_max} s")
+
+    def _libera(self):
+        with self._lock:
+            self._in_corso -= 1
+        self._posti.release()
+
+    def genera(self, password):
+        return self._esegui('genera', generate_password_hash, password, self.metodo)
+
+    def verifica(self, password_hash, password):
+        return self._esegui('verifica', check_password_hash, password_hash, password)
+
+    def da_ricalcolare(self, password_hash):
+        """True se l'hash salvato usa un metodo o parametri diversi da quelli configurati."""
+        return password_hash.split('$', 1)[0] != self.metodo
+
+    def statistiche(self):
+        with self._lock:
+            misure = list(self._misure)
+            in_corso, rifiutate = self._in_corso, self._rifiutate
+        attese = sorted(m['attesa_ms'] for m in misure)
+        return {
+            'metodo': self.metodo,
+            'concorrenza': self.concorrenza,
+            'coda_max': self.coda_max,
+            'in_corso': in_corso,
+            'rifiutate': rifiutate,
+            'operazioni': len(misure),
+            'attesa_media_ms': sum(attese) / len(attese) if attese else 0.0,
+            'attesa_p95_ms': attese[min(len(attese) - 1, int(len(attese) * 0.95))] if attese else 0.0,
+            'attesa_max_ms': attese[-1] if attese else 0.0,
+            'durata_media_ms': sum(m['durata_ms'] for m in misure) / len(misure) if misure else 0.0,
+        }
+
+
+pool = PoolHashing()
+
+
+def init_credenziali(app):
+    """Crea il pool di hashing con i parametri della configurazione dell'app."""
+    global pool
+    pool = PoolHashing(
+        metodo=app.config.get('PASSWORD_HASH_METODO', METODO_DEFAULT),
+        concorrenza=app.config.get('PASSWORD_HASH_CONCORRENZA', CONCORRENZA_DEFAULT),
+        coda_max=app.config.get('PASSWORD_HASH_CODA_MAX', CODA_MAX_DEFAULT),
+        attesa_max=app.config.get('PASSWORD_HASH_ATTESA_MAX', ATTESA_MAX_DEFAULT),
+    )
+
+
+def genera_hash(password):
+    return pool.genera(password)
+
+
+def verifica_password(password_hash, password):
+    return pool.verifica(password_hash, password)
+
+
+def da_ricalcolare(password_hash):
+    return pool.da_ricalcolare(password_hash)
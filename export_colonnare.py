@@ -0,0 +1,188 @@
+# export_colonnare.py
+#
+# Export colonnare (Parquet) per le analisi di Presenze e Amministrazione.
+#
+# Il CSV di export_csv_presenze è pensato per Excel: importi come stringhe con la virgola e
+# spese impacchettate in un'unica colonna di testo. Qui invece ogni colonna ha il suo tipo
+# (date, orari, interi, importi, booleani) e le spese sono una tabella a parte, collegata
+# tramite id_trasferta, così gli strumenti di analisi caricano anni di dati senza parsing.
+#
+# Il file viene scritto a row group: ogni gruppo di righe letto dal database è codificato e
+# inviato al client subito, quindi la memoria resta costante anche esportando tutto lo storico.
+# pyarrow è importato solo quando serve, per non appesantire l'avvio dell'applicazione.
+import io
+
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+
+from models import db, Dipendente, Trasferta, Spesa
+
+PARQUET_RIGHE_PER_GRUPPO = 10000
+
+# Colonne esportate: (nome nel file, tipo arrow). I tipi sono stringhe risolte con _tipo_arrow
+# per non importare pyarrow al caricamento del modulo.
+COLONNE_TRASFERTE = [
+    ('id', 'int64'),
+    ('id_dipendente', 'int64'),
+    ('dipendente', 'string'),
+    ('data_richiesta', 'timestamp'),
+    ('giorno_missione', 'date'),
+    ('missione_presso', 'string'),
+    ('motivo_missione', 'string'),
+
+    # Pre-Missione
+    ('stato_pre_missione', 'string'),
+    ('inizio_missione_ora', 'time'),
+    ('utilizzo_mezzo', 'string'),
+    ('aut_extra_orario', 'string'),
+    ('aut_timbratura_entrata', 'time'),
+    ('aut_timbratura_uscita', 'time'),
+    ('motivo_timbratura', 'string'),
+    ('note_premissione', 'string'),
+    ('id_approvatore_pre', 'int64'),
+    ('approvatore_pre', 'string'),
+    ('data_approvazione_pre', 'timestamp'),
+
+    # Post-Missione / Rendiconto
+    ('stato_post_missione', 'string'),
+    ('ora_inizio_effettiva', 'time'),
+    ('ora_fine_effettiva', 'time'),
+    ('durata_totale_ore', 'int32'),
+    ('pernotto', 'bool'),
+    ('durata_viaggio_andata_min', 'int32'),
+    ('durata_viaggio_ritorno_min', 'int32'),
+    ('km_percorsi', 'float64'),
+    ('mezzo_km_percorsi', 'string'),
+    ('percorso_effettuato', 'string'),
+    ('richiesta_pausa_pranzo', 'string'),
+    ('pausa_pranzo_dalle', 'time'),
+    ('pausa_pranzo_alle', 'time'),
+    ('extra_orario', 'string'),
+    ('note_rendicontazione', 'string'),
+    ('id_approvatore_post', 'int64'),
+    ('approvatore_post', 'string'),
+    ('data_approvazione_post', 'timestamp'),
+
+    # Amministrazione
+    ('stato_approvazione_finale', 'string'),
+    ('data_approvazione_finale', 'timestamp'),
+    ('id_lotto_pagamento', 'int64'),
+
+    # Presenze
+    ('gestito_presenze', 'bool'),
+    ('nbp', 'bool'),
+
+    # Spese (totali denormalizzati; il dettaglio è nella tabella spese)
+    ('totale_spese', 'float64'),
+    ('numero_spese', 'int32'),
+]
+
+COLONNE_SPESE = [
+    ('id', 'int64'),
+    ('id_trasferta', 'int64'),
+    ('data_spesa', 'date'),
+    ('categoria', 'string'),
+    ('importo', 'float64'),
+    ('descrizione', 'string'),
+]
+
+
+def _tipo_arrow(pa, tipo):
+    return {
+        'int32': pa.int32(),
+        'int64': pa.int64(),
+        'float64': pa.float64(),
+        'bool': pa.bool_(),
+        'string': pa.string(),
+        'date': pa.date32(),
+        'time': pa.time64('us'),
+        'timestamp': pa.timestamp('us'),
+    }[tipo]
+
+
+def schema_arrow(colonne):
+    import pyarrow as pa
+    return pa.schema([(nome, _tipo_arrow(pa, tipo)) for nome, tipo in colonne])
+
+
+def _nome_completo(alias):
+    return alias.nome + ' ' + alias.cognome
+
+
+def select_trasferte():
+    """SELECT delle colonne di COLONNE_TRASFERTE, con i nomi di richiedente e approvatori in join."""
+    richiedente = aliased(Dipendente)
+    approvatore_pre = aliased(Dipendente)
+    approvatore_post = aliased(Dipendente)
+    calcolate = {
+        'dipendente': _nome_completo(richiedente),
+        'approvatore_pre': _nome_completo(approvatore_pre),
+        'approvatore_post': _nome_completo(approvatore_post),
+    }
+    colonne = [
+        calcolate[nome].label(nome) if nome in calcolate else getattr(Trasferta, nome)
+        for nome, _ in COLONNE_TRASFERTE
+    ]
+    return (
+        select(*colonne)
+        .join(richiedente, richiedente.id == Trasferta.id_dipendente)
+        .outerjoin(approvatore_pre, approvatore_pre.id == Trasferta.id_approvatore_pre)
+        .outerjoin(approvatore_post, approvatore_post.id == Trasferta.id_approvatore_post)
+    )
+
+
+def select_spese():
+    """SELECT della tabella spese; il join su Trasferta permette di applicare gli stessi filtri."""
+    return select(*[getattr(Spesa, nome) for nome, _ in COLONNE_SPESE]).join(
+        Trasferta, Trasferta.id == Spesa.id_trasferta
+    )
+
+
+class _Uscita(io.RawIOBase):
+    """File di sola scrittura che accumula i byte prodotti da ParquetWriter finché non vengono ritirati."""
+
+    def __init__(self):
+        self._parti = []
+        self._posizione = 0
+
+    def writable(self):
+        return True
+
+    def write(self, dati):
+        dati = bytes(dati)
+        self._parti.append(dati)
+        self._posizione += len(dati)
+        return len(dati)
+
+    def tell(self):
+        return self._posizione
+
+    def ritira(self):
+        contenuto = b''.join(self._parti)
+        self._parti = []
+        return contenuto
+
+
+def genera_parquet(stmt, colonne, righe_per_gruppo=PARQUET_RIGHE_PER_GRUPPO):
+    """
+    Esegue stmt in streaming e produce il file Parquet a pezzi: un row group per ogni
+    blocco di righe letto dal database. Il file è valido solo dopo l'ultimo pezzo (footer).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = schema_arrow(colonne)
+    uscita = _Uscita()
+    writer = pq.ParquetWriter(uscita, schema, compression='snappy')
+    try:
+        risultato = db.session.execute(stmt.execution_options(yield_per=righe_per_gruppo))
+        for blocco in risultato.partitions():
+            valori = list(zip(*blocco))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(valori[i], type=campo.type) for i, campo in enumerate(schema)],
+                schema=schema
+            ), row_group_size=righe_per_gruppo)
+            yield uscita.ritira()
+    finally:
+        writer.close()
+    yield uscita.ritira()
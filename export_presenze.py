@@ -0,0 +1,164 @@
+# export_presenze.py
+
+# ====================================================================
+# RIGHE DELL'EXPORT CSV PRESENZE
+# ====================================================================
+# Intestazioni e formattazione delle righe dell'export CSV (vedi rotte/presenze.py, che lo
+# importa alla prima richiesta di export: il costo non ricade sull'avvio dell'app).
+from collections import defaultdict
+
+from sqlalchemy import select
+
+from models import db, Spesa
+
+INTESTAZIONI = [
+    'ID', 
+    'Dipendente', 
+    'Data Missione', 
+    'Destinazione', 
+    'Motivazione',
+    
+    # Pre-Missione
+    'Stato Pre-Missione',
+    'Ora Inizio Prevista',
+    'Mezzo Previsto',
+    'Aut. Extra Orario (Pre)',
+    'Timbratura Entrata Aut.',
+    'Timbratura Uscita Aut.',
+    'Motivo Timbratura',
+    'Note Pre-Missione',
+    'Approvatore Pre',
+    'Data Approvazione Pre',
+
+    # Post-Missione / Rendiconto
+    'Stato Post-Missione',
+    'Ora Inizio Effettiva', 
+    'Ora Fine Effettiva',
+    'Durata Totale (Ore)',
+    'Pernotto',
+    'Durata Viaggio A (min)',
+    'Durata Viaggio R (min)',
+    'Km Percorsi',
+    'Mezzo Utilizzato',
+    'Percorso Effettuato',
+    'Gestione Pausa Pranzo',
+    'Pausa Pranzo Dalle',
+    'Pausa Pranzo Alle',
+    'Gestione Extra Orario',
+    'Note Rendicontazione',
+    'Approvatore Post',
+    'Data Approvazione Post',
+    
+    # Presenze Check
+    'Gestito Presenze', 
+    'NBP',
+
+    # Spese
+    'Costo Totale Spese',
+    'Dettaglio Spese'
+]
+
+
+def riga(t, spese):
+    """Converte una Trasferta (con richiedente e approvatori già caricati) e le sue spese nella riga CSV."""
+    # --- Dipendente ---
+    nome_dipendente = "N/D"
+    if t.richiedente:
+        nome_dipendente = f"{t.richiedente.nome} {t.richiedente.cognome}"
+        
+    data_ms = t.giorno_missione.strftime('%d/%m/%Y') if t.giorno_missione else ""
+    
+    # --- Pre Missione helper ---
+    ora_inizio_prev = t.inizio_missione_ora.strftime('%H:%M') if t.inizio_missione_ora else ""
+    timb_in = t.aut_timbratura_entrata.strftime('%H:%M') if t.aut_timbratura_entrata else ""
+    timb_out = t.aut_timbratura_uscita.strftime('%H:%M') if t.aut_timbratura_uscita else ""
+    
+    app_pre_nome = f"{t.approvatore_pre.nome} {t.approvatore_pre.cognome}" if t.approvatore_pre else ""
+    dt_app_pre = t.data_approvazione_pre.strftime('%d/%m/%Y %H:%M') if t.data_approvazione_pre else ""
+
+    # --- Post Missione helper ---
+    ora_inizio_eff = t.ora_inizio_effettiva.strftime('%H:%M') if t.ora_inizio_effettiva else ""
+    ora_fine_eff = t.ora_fine_effettiva.strftime('%H:%M') if t.ora_fine_effettiva else ""
+    
+    pp_dalle = t.pausa_pranzo_dalle.strftime('%H:%M') if t.pausa_pranzo_dalle else ""
+    pp_alle = t.pausa_pranzo_alle.strftime('%H:%M') if t.pausa_pranzo_alle else ""
+    
+    # Note rendiconto pulite da newline
+    note_rend = t.note_rendicontazione.replace('\n', ' | ').replace('\r', '') if t.note_rendicontazione else ""
+    
+    app_post_nome = f"{t.approvatore_post.nome} {t.approvatore_post.cognome}" if t.approvatore_post else ""
+    dt_app_post = t.data_approvazione_post.strftime('%d/%m/%Y %H:%M') if t.data_approvazione_post else ""
+
+    # --- Spese ---
+    costo_totale = t.totale_spese or 0.0
+    dettaglio_spese_list = []
+    if spese:
+        for s in spese:
+            if s.importo:
+                d_spesa = s.data_spesa.strftime('%d/%m/%Y') if s.data_spesa else ""
+                dettaglio_spese_list.append(f"[{d_spesa} - {s.categoria} - {s.importo:.2f}€ - {s.descrizione or ''}]")
+    
+    dettaglio_spese_str = " | ".join(dettaglio_spese_list)
+
+    return [
+        t.id,
+        nome_dipendente,
+        data_ms,
+        t.missione_presso or "",
+        t.motivo_missione or "",
+        
+        # Pre
+        t.stato_pre_missione or "",
+        ora_inizio_prev,
+        t.utilizzo_mezzo or "",
+        t.aut_extra_orario or "",
+        timb_in,
+        timb_out,
+        t.motivo_timbratura or "",
+        t.note_premissione or "",
+        app_pre_nome,
+        dt_app_pre,
+
+        # Post
+        t.stato_post_missione or "N/A",
+        ora_inizio_eff,
+        ora_fine_eff,
+        t.durata_totale_ore or "",
+        'SI' if t.pernotto else 'NO',
+        t.durata_viaggio_andata_min or "",
+        t.durata_viaggio_ritorno_min or "",
+        t.km_percorsi or "",
+        t.mezzo_km_percorsi or "",
+        t.percorso_effettuato or "",
+        t.richiesta_pausa_pranzo or "",
+        pp_dalle,
+        pp_alle,
+        t.extra_orario or "",
+        note_rend,
+        app_post_nome,
+        dt_app_post,
+
+        # Presenze
+        'SI' if t.gestito_presenze else 'NO',
+        'SI' if t.nbp else 'NO',
+
+        # Spese
+        f"{costo_totale:.2f}".replace('.', ','),
+        dettaglio_spese_str
+    ]
+
+
+def spese_per_trasferta(ids_trasferte):
+    """
+    Spese di un blocco di trasferte con una sola query (solo le colonne usate dall'export),
+    raggruppate per id_trasferta nell'ordine di inserimento.
+    """
+    spese = defaultdict(list)
+    righe = db.session.execute(
+        select(Spesa.id_trasferta, Spesa.data_spesa, Spesa.categoria, Spesa.importo, Spesa.descrizione)
+        .where(Spesa.id_trasferta.in_(ids_trasferte))
+        .order_by(Spesa.id_trasferta, Spesa.id)
+    )
+    for riga in righe:
+        spese[riga.id_trasferta].append(riga)
+    return spese
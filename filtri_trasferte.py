@@ -0,0 +1,98 @@
+# filtri_trasferte.py
+
+# Filtri e paginazione della lista trasferte, condivisi da 'Mie trasferte' (rotte/workflow.py),
+# dagli export e dalla griglia di Presenze (rotte/presenze.py); mese_successivo serve anche
+# ai riepiloghi mensili dell'Amministrazione.
+from datetime import datetime, date
+
+from sqlalchemy import or_, and_, false
+
+from models import Trasferta
+import stati
+
+# ====================================================================
+# PAGINAZIONE KEYSET PER 'MIE TRASFERTE'
+# ====================================================================
+# La lista viene letta a pagine ordinate per (giorno_missione, id) decrescenti.
+# Il cursore è la coppia dell'ultima riga della pagina precedente, quindi ogni
+# pagina costa le stesse query indipendentemente dalla lunghezza dello storico.
+MIE_TRASFERTE_PER_PAGINA = 25
+
+STATI_FILTRO_MIE_TRASFERTE = [
+    'In attesa', 'Approvata', 'Rifiutata',
+    'Pronta per rimborso', 'Rifiutata post', 'Rimborso negato',
+    'Rimborsata', 'Non rimborsata', 'Conclusa',
+]
+
+
+def leggi_cursore(valore):
+    """Converte il parametro 'dopo' (es. '2025-03-01_42') in (data, id). None se assente o non valido."""
+    if not valore:
+        return None
+    try:
+        giorno_str, id_str = valore.split('_', 1)
+        return datetime.strptime(giorno_str, '%Y-%m-%d').date(), int(id_str)
+    except ValueError:
+        return None
+
+
+def scrivi_cursore(trasferta):
+    return f"{trasferta.giorno_missione.isoformat()}_{trasferta.id}"
+
+
+def leggi_filtri_mie_trasferte(args):
+    """Estrae dalla query string i filtri della lista (stato, intervallo date, richiedente)."""
+    def _data(nome):
+        try:
+            return datetime.strptime(args.get(nome, ''), '%Y-%m-%d').date()
+        except ValueError:
+            return None
+
+    return {
+        'stato': args.get('stato') or None,
+        'dal': _data('dal'),
+        'al': _data('al'),
+        'richiedente': args.get('richiedente', type=int),
+    }
+
+
+def applica_filtri_trasferte(query, filtri):
+    """Applica a una query su Trasferta i filtri letti da leggi_filtri_mie_trasferte."""
+    if filtri['stato']:
+        # Lo stesso nome può esistere in entrambe le fasi ('In attesa'): si confronta solo
+        # con le colonne che lo prevedono, uno stato sconosciuto non restituisce nulla
+        condizioni = [
+            colonna == filtri['stato']
+            for colonna, registro in ((Trasferta.stato_pre_missione, stati.PRE),
+                                      (Trasferta.stato_post_missione, stati.POST))
+            if filtri['stato'] in registro
+        ]
+        query = query.filter(or_(*condizioni) if condizioni else false())
+    if filtri['dal']:
+        query = query.filter(Trasferta.giorno_missione >= filtri['dal'])
+    if filtri['al']:
+        query = query.filter(Trasferta.giorno_missione <= filtri['al'])
+    if filtri['richiedente']:
+        query = query.filter(Trasferta.id_dipendente == filtri['richiedente'])
+    return query
+
+
+def applica_filtri_e_cursore(query, filtri, cursore, per_pagina):
+    """Applica filtri, cursore keyset, ordinamento e LIMIT a una query su Trasferta."""
+    query = applica_filtri_trasferte(query, filtri)
+
+    if cursore:
+        giorno, ultimo_id = cursore
+        query = query.filter(or_(
+            Trasferta.giorno_missione < giorno,
+            and_(Trasferta.giorno_missione == giorno, Trasferta.id < ultimo_id)
+        ))
+
+    # Una riga in più per sapere se esiste la pagina successiva
+    return query.order_by(
+        Trasferta.giorno_missione.desc(), Trasferta.id.desc()
+    ).limit(per_pagina + 1)
+
+
+def mese_successivo(giorno):
+    return date(giorno.year + giorno.month // 12, giorno.month % 12 + 1, 1)
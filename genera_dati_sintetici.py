@@ -0,0 +1,335 @@
+import io
+import os
+import csv
+import sys
+import time
+import random
+from datetime import date, datetime, timedelta, time as ora
+
+# Uso:
+#   python genera_dati_sintetici.py --dipendenti 5000 --trasferte 1000000 --seme 42 \
+#       --database sqlite:///benchmark.db --svuota
+#
+#   --database URL   database di destinazione (default: quello configurato, DATABASE_URL / POSTGRES_URL / SQLite)
+#   --svuota         cancella e ricrea le tabelle prima di generare (obbligatorio se il database contiene dati)
+#   --stati-legacy   include anche le vecchie grafie degli stati ('Pronto per Rimborso', 'In Attesa', ...);
+#                    con gli stati codificati (stati.py) vengono salvate come il codice dello stato canonico
+#   --oggi AAAA-MM-GG data di riferimento (a parità di seme e data il contenuto è identico)
+#
+# Tutti gli utenti generati hanno password 'password'. Le righe sono inserite a blocchi con INSERT
+# multi-riga (COPY su Postgres), senza passare dalla sessione ORM.
+if __name__ == "__main__" and '--database' in sys.argv:
+    os.environ['DATABASE_URL'] = sys.argv[sys.argv.index('--database') + 1]
+
+from sqlalchemy import insert, inspect, text
+from werkzeug.security import generate_password_hash
+
+from models import db, Dipendente, Trasferta, Delega, Spesa
+
+PASSWORD_SINTETICA = 'password'
+DIMENSIONE_BLOCCO = 20000
+# Dipendenti medi per dirigente
+AMPIEZZA_SQUADRA = 15
+
+NOMI = ['Marco', 'Giulia', 'Luca', 'Francesca', 'Andrea', 'Chiara', 'Matteo', 'Sara', 'Alessandro', 'Elena',
+        'Davide', 'Valentina', 'Simone', 'Martina', 'Federico', 'Laura', 'Stefano', 'Anna', 'Paolo', 'Silvia']
+COGNOMI = ['Rossi', 'Russo', 'Ferrari', 'Esposito', 'Bianchi', 'Romano', 'Colombo', 'Ricci', 'Marino', 'Greco',
+           'Bruno', 'Gallo', 'Conti', 'De Luca', 'Mancini', 'Costa', 'Giordano', 'Rizzo', 'Lombardi', 'Moretti']
+SEDI = ['Roma', 'Milano', 'Napoli', 'Torino', 'Bologna', 'Firenze', 'Bari', 'Palermo', 'Genova', 'Venezia',
+        'Verona', 'Padova', 'Trieste', 'Perugia', 'Ancona', 'Cagliari', 'Trento', 'Pescara', 'Catania', 'Lecce']
+MOTIVI = ['Riunione con il cliente', 'Convegno', 'Formazione', 'Sopralluogo', 'Audit', 'Incontro istituzionale']
+MEZZI = ['MEZZI GRATUITI', 'FERROVIA', 'MEZZI PROPRI', 'AUTO AZIENDALE']
+PAUSE = ['NESSUNA', 'BUONO PASTO', 'RIMBORSO SPESE']
+# Categoria -> intervallo realistico dell'importo in euro
+CATEGORIE_SPESA = {
+    'Vitto': (8, 35), 'Alloggio': (60, 180), 'Trasporto': (3, 120), 'Parcheggio': (2, 25), 'Altro': (5, 60),
+}
+
+# Ciclo di vita delle missioni: (stato pre, stato post, esito finale, peso, spese minime, spese massime)
+COMBINAZIONI_STATI = [
+    ('In attesa', 'N/A', None, 6, 0, 0),
+    ('Rifiutata', 'N/A', None, 3, 0, 0),
+    ('Approvata', 'N/A', None, 8, 0, 0),
+    ('Approvata', 'In attesa', None, 6, 0, 5),
+    ('Approvata', 'Rifiutata post', None, 2, 0, 5),
+    ('Approvata', 'Rimborso negato', None, 1, 1, 5),
+    ('Approvata', 'Da rimborsare', None, 1, 1, 5),
+    ('Approvata', 'Rimborso Richiesto', None, 1, 1, 5),
+    ('Approvata', 'Pronta per rimborso', None, 5, 1, 6),
+    ('Approvata', 'Conclusa', None, 20, 0, 0),
+    ('Approvata', 'Rimborsata', 'Rimborsata', 40, 1, 6),
+    ('Approvata', 'Non rimborsata', 'Non rimborsata', 2, 1, 4),
+]
+# Vecchie grafie ancora presenti nei database di produzione
+COMBINAZIONI_LEGACY = [
+    ('In Attesa', 'N/A', None, 1, 0, 0),
+    ('Approvata', 'Pronto per Rimborso', None, 1, 1, 4),
+    ('Approvata', 'Rimborso Concesso', None, 1, 1, 4),
+]
+
+
+def genera_utenti(n_dipendenti, rnd, primo_id=1, hash_password=None):
+    """
+    Organizzazione realistica: un direttore (dirigente di sé stesso), dirigenti che rispondono al
+    direttore, dipendenti distribuiti su squadre di ampiezza variabile, più gli account di servizio
+    (Amministrazione, Presenze, Superuser). Restituisce la lista di righe per la tabella dipendente.
+    """
+    hash_password = hash_password or generate_password_hash(PASSWORD_SINTETICA, method='pbkdf2:sha256:1000')
+    n_dirigenti = max(1, n_dipendenti // AMPIEZZA_SQUADRA)
+    n_servizio = max(1, n_dipendenti // 500)
+
+    direttore = primo_id
+    ids_dirigenti = list(range(primo_id + 1, primo_id + 1 + n_dirigenti))
+    # Squadre di ampiezza diversa: il peso di ogni dirigente varia da 1 a 4
+    pesi_squadre = [rnd.randint(1, 4) for _ in ids_dirigenti]
+
+    ruoli = [('Dirigente', direttore)] + [('Dirigente', direttore) for _ in ids_dirigenti]
+    ruoli += [('Amministrazione', None)] * n_servizio + [('Presenze', None)] * n_servizio + [('Superuser', None)]
+    while len(ruoli) < n_dipendenti:
+        ruoli.append(('Dipendente', rnd.choices(ids_dirigenti, weights=pesi_squadre)[0]))
+
+    utenti = []
+    for offset, (ruolo, id_dirigente) in enumerate(ruoli):
+        id_utente = primo_id + offset
+        nome, cognome = rnd.choice(NOMI), rnd.choice(COGNOMI)
+        utenti.append({
+            'id': id_utente, 'nome': nome, 'cognome': cognome,
+            'email': f'{nome.lower()}.{cognome.lower().replace(" ", "")}.{id_utente}@sintetico.it',
+            'password_hash': hash_password, 'ruolo': ruolo, 'id_dirigente': id_dirigente,
+        })
+    return utenti
+
+
+def genera_deleghe(utenti, rnd, oggi):
+    """Per ogni dirigente: deleghe permanenti, a finestra (sovrapposte), scadute e future verso la propria squadra."""
+    squadre = {}
+    for u in utenti:
+        if u['ruolo'] == 'Dipendente':
+            squadre.setdefault(u['id_dirigente'], []).append(u['id'])
+    dirigenti = [u['id'] for u in utenti if u['ruolo'] == 'Dirigente']
+
+    deleghe = []
+    for id_dirigente in dirigenti:
+        candidati = squadre.get(id_dirigente) or [d for d in dirigenti if d != id_dirigente]
+        if not candidati:
+            continue
+        if rnd.random() < 0.6:
+            # Permanente, attiva
+            deleghe.append((id_dirigente, rnd.choice(candidati), oggi - timedelta(days=rnd.randint(30, 700)), None))
+        if rnd.random() < 0.3:
+            # Finestra attiva oggi, sovrapposta alla permanente
+            inizio = oggi - timedelta(days=rnd.randint(1, 20))
+            deleghe.append((id_dirigente, rnd.choice(candidati), inizio, oggi + timedelta(days=rnd.randint(1, 20))))
+        if rnd.random() < 0.5:
+            # Scaduta (ferie passate)
+            inizio = oggi - timedelta(days=rnd.randint(60, 900))
+            deleghe.append((id_dirigente, rnd.choice(candidati), inizio, inizio + timedelta(days=rnd.randint(3, 30))))
+        if rnd.random() < 0.3:
+            # Futura
+            inizio = oggi + timedelta(days=rnd.randint(5, 90))
+            deleghe.append((id_dirigente, rnd.choice(candidati), inizio, inizio + timedelta(days=rnd.randint(3, 20))))
+
+    return [{'id_delegante': a, 'id_delegato': b, 'data_inizio': i, 'data_fine': f} for a, b, i, f in deleghe]
+
+
+def genera_trasferte(utenti, n_trasferte, rnd, oggi, primo_id=1, primo_id_spesa=1, richiedenti=None,
+                     stati_legacy=False, anni=3, dimensione_blocco=DIMENSIONE_BLOCCO):
+    """
+    Genera n_trasferte distribuite su tutte le combinazioni di stato, con le rispettive spese
+    (e totali denormalizzati coerenti). Produce blocchi (righe_trasferta, righe_spesa) senza
+    tenere in memoria l'intero volume.
+    """
+    dirigente_di = {u['id']: u['id_dirigente'] for u in utenti}
+    amministrazione = [u['id'] for u in utenti if u['ruolo'] == 'Amministrazione'] or [None]
+    if richiedenti is None:
+        richiedenti = [u['id'] for u in utenti if u['ruolo'] in ('Dipendente', 'Dirigente')]
+
+    combinazioni = COMBINAZIONI_STATI + (COMBINAZIONI_LEGACY if stati_legacy else [])
+    pesi = [c[3] for c in combinazioni]
+    categorie = list(CATEGORIE_SPESA)
+    giorni_storico = 365 * anni
+
+    trasferte, spese = [], []
+    id_spesa = primo_id_spesa
+    for id_trasferta in range(primo_id, primo_id + n_trasferte):
+        pre, post, finale, _, spese_min, spese_max = rnd.choices(combinazioni, weights=pesi)[0]
+        richiedente = rnd.choice(richiedenti)
+        approvatore = dirigente_di.get(richiedente) or richiedente
+
+        # Le richieste in attesa riguardano missioni future; le altre sono distribuite sullo storico
+        if pre in ('In attesa', 'In Attesa'):
+            giorno = oggi + timedelta(days=rnd.randint(1, 60))
+        elif post == 'N/A':
+            giorno = oggi + timedelta(days=rnd.randint(-30, 45))
+        else:
+            giorno = oggi - timedelta(days=rnd.randint(1, giorni_storico))
+        alle_nove = datetime.combine(giorno, ora(9, 0))
+        rendicontata = post != 'N/A'
+
+        importi = []
+        for _ in range(rnd.randint(spese_min, spese_max)):
+            categoria = rnd.choice(categorie)
+            minimo, massimo = CATEGORIE_SPESA[categoria]
+            importo = round(rnd.uniform(minimo, massimo), 2)
+            importi.append(importo)
+            spese.append({
+                'id': id_spesa, 'id_trasferta': id_trasferta, 'categoria': categoria,
+                'descrizione': 'Scontrino' if categoria != 'Altro' else 'Spesa varia',
+                'importo': importo, 'data_spesa': giorno,
+            })
+            id_spesa += 1
+
+        trasferte.append({
+            'id': id_trasferta,
+            'id_dipendente': richiedente,
+            'id_dirigente': approvatore,
+            'data_richiesta': alle_nove - timedelta(days=rnd.randint(2, 30)),
+            'giorno_missione': giorno,
+            'inizio_missione_ora': ora(rnd.randint(7, 10), rnd.choice((0, 30))),
+            'missione_presso': rnd.choice(SEDI),
+            'motivo_missione': rnd.choice(MOTIVI),
+            'utilizzo_mezzo': rnd.choice(('Si', 'No')),
+            'aut_extra_orario': rnd.choice(('Si', 'No')),
+            'stato_pre_missione': pre,
+            'id_approvatore_pre': approvatore if pre != 'In attesa' else None,
+            'data_approvazione_pre': alle_nove - timedelta(days=1) if pre != 'In attesa' else None,
+            'ora_inizio_effettiva': ora(rnd.randint(7, 10), rnd.choice((0, 15, 30, 45))) if rendicontata else None,
+            'ora_fine_effettiva': ora(rnd.randint(15, 19), rnd.choice((0, 15, 30, 45))) if rendicontata else None,
+            'durata_totale_ore': rnd.randint(5, 10) if rendicontata else None,
+            'km_percorsi': round(rnd.uniform(0, 400), 1) if rendicontata else None,
+            'mezzo_km_percorsi': rnd.choice(MEZZI) if rendicontata else None,
+            'richiesta_pausa_pranzo': rnd.choice(PAUSE) if rendicontata else None,
+            'stato_post_missione': post,
+            'id_approvatore_post': approvatore if post not in ('N/A', 'In attesa') else None,
+            'data_approvazione_post': alle_nove + timedelta(days=rnd.randint(1, 10)) if post not in ('N/A', 'In attesa') else None,
+            'stato_approvazione_finale': finale,
+            'id_approvatore_finale': rnd.choice(amministrazione) if finale else None,
+            'data_approvazione_finale': alle_nove + timedelta(days=rnd.randint(11, 40)) if finale else None,
+            'totale_spese': round(sum(importi), 2),
+            'numero_spese': len(importi),
+            'gestito_presenze': bool(finale) and rnd.random() < 0.8,
+            'nbp': rnd.random() < 0.05,
+        })
+
+        if len(trasferte) >= dimensione_blocco:
+            yield trasferte, spese
+            trasferte, spese = [], []
+    if trasferte:
+        yield trasferte, spese
+
+
+# --------------------------------------------------------------------
+# INSERIMENTO MASSIVO
+# --------------------------------------------------------------------
+
+def _valore_copy(valore):
+    if valore is None:
+        return '\\N'
+    if isinstance(valore, bool):
+        return 't' if valore else 'f'
+    return valore
+
+
+def inserisci(conn, modello, righe):
+    """Inserisce le righe a blocchi: COPY su Postgres, INSERT multi-riga (executemany) altrove."""
+    if not righe:
+        return
+    tabella = modello.__table__
+    if conn.dialect.name == 'postgresql':
+        colonne = list(righe[0])
+        # COPY non passa dai tipi SQLAlchemy: le conversioni (es. stati -> codici) vanno applicate qui
+        processori = [(c, tabella.c[c].type.bind_processor(conn.dialect)) for c in colonne]
+        buffer = io.StringIO()
+        scrittore = csv.writer(buffer)
+        for riga in righe:
+            scrittore.writerow([_valore_copy(p(riga[c]) if p else riga[c]) for c, p in processori])
+        buffer.seek(0)
+        cursore = conn.connection.cursor()
+        cursore.copy_expert(
+            f"COPY {tabella.name} ({', '.join(colonne)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')", buffer
+        )
+        return
+    conn.execute(insert(tabella), righe)
+
+
+def allinea_sequenze(conn):
+    """Dopo un inserimento con id espliciti le sequenze di Postgres vanno riportate al massimo id."""
+    if conn.dialect.name != 'postgresql':
+        return
+    for tabella in ('dipendente', 'trasferta', 'delega', 'spesa'):
+        conn.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{tabella}', 'id'), COALESCE((SELECT MAX(id) FROM {tabella}), 1))"
+        ))
+
+
+def genera(n_dipendenti, n_trasferte, seme=42, oggi=None, stati_legacy=False, log=print):
+    """
+    Popola il database dell'app corrente (tabelle vuote) con un'organizzazione sintetica.
+    Deterministico: a parità di seme e di 'oggi' produce esattamente le stesse righe.
+    """
+    rnd = random.Random(seme)
+    oggi = oggi or date.today()
+    inizio = time.perf_counter()
+
+    with db.engine.begin() as conn:
+        if conn.dialect.name == 'sqlite':
+            # Caricamento in un'unica transazione: niente fsync intermedi
+            conn.exec_driver_sql('PRAGMA synchronous = OFF')
+
+        utenti = genera_utenti(n_dipendenti, rnd)
+        inserisci(conn, Dipendente, utenti)
+        deleghe = genera_deleghe(utenti, rnd, oggi)
+        for posizione, delega in enumerate(deleghe, start=1):
+            delega['id'] = posizione
+        inserisci(conn, Delega, deleghe)
+        log(f"Dipendenti: {len(utenti)}, deleghe: {len(deleghe)}")
+
+        n_spese = 0
+        for trasferte, spese in genera_trasferte(utenti, n_trasferte, rnd, oggi, stati_legacy=stati_legacy):
+            inserisci(conn, Trasferta, trasferte)
+            inserisci(conn, Spesa, spese)
+            n_spese += len(spese)
+            ultimo = trasferte[-1]['id']
+            if ultimo % (DIMENSIONE_BLOCCO * 10) == 0 or ultimo == n_trasferte:
+                log(f"  trasferte {ultimo}/{n_trasferte} ({time.perf_counter() - inizio:.0f}s)")
+
+        allinea_sequenze(conn)
+
+    log(f"Generate {n_trasferte} trasferte e {n_spese} spese in {time.perf_counter() - inizio:.1f}s")
+    return {'dipendenti': len(utenti), 'deleghe': len(deleghe), 'trasferte': n_trasferte, 'spese': n_spese}
+
+
+def _argomento(nome, tipo=str, default=None):
+    if nome in sys.argv:
+        return tipo(sys.argv[sys.argv.index(nome) + 1])
+    return default
+
+
+if __name__ == "__main__":
+    from app import app, registra_migrazioni
+
+    n_dipendenti = _argomento('--dipendenti', int, 1000)
+    n_trasferte = _argomento('--trasferte', int, 100000)
+    seme = _argomento('--seme', int, 42)
+    oggi = _argomento('--oggi', lambda v: datetime.strptime(v, '%Y-%m-%d').date())
+
+    with app.app_context():
+        print(f"--- GENERAZIONE DATI SINTETICI ({db.engine.url.render_as_string(hide_password=True)}) ---")
+        ispettore = inspect(db.engine)
+        if '--svuota' in sys.argv:
+            print("Cancellazione e ricreazione delle tabelle...")
+            db.drop_all()
+        elif ispettore.has_table('trasferta') and (
+                db.session.query(Trasferta.id).first() or db.session.query(Dipendente.id).first()):
+            print("Errore: il database contiene già dati. Usa --svuota per ricrearlo (i dati saranno persi).")
+            sys.exit(1)
+        db.session.remove()
+
+        # Schema del modello corrente: se il database non era gestito da Alembic lo si marca all'ultima revisione
+        db.create_all()
+        if '--svuota' in sys.argv or not ispettore.has_table('alembic_version'):
+            from flask_migrate import stamp
+            registra_migrazioni(app)
+            stamp(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
+
+        genera(n_dipendenti, n_trasferte, seme=seme, oggi=oggi, stati_legacy='--stati-legacy' in sys.argv)
@@ -0,0 +1,15 @@
+# gunicorn.conf.py
+
+# Configurazione di gunicorn, letta automaticamente dalla cartella di avvio.
+# La modalità dei worker (sync, thread, green) si sceglie con WEB_WORKER_MODALITA,
+# il numero di processi con WEB_CONCURRENCY: vedi concorrenza.py.
+from concorrenza import impostazioni_gunicorn
+
+_impostazioni = impostazioni_gunicorn()
+
+workers = _impostazioni['workers']
+worker_class = _impostazioni['worker_class']
+if 'threads' in _impostazioni:
+    threads = _impostazioni['threads']
+if 'worker_connections' in _impostazioni:
+    worker_connections = _impostazioni['worker_connections']
@@ -1,18 +1,10 @@
-from app import app, db
-from models import Trasferta
-from sqlalchemy import text
+# Script storico: la rinomina 'Pronto per Rimborso' -> 'Pronta per rimborso' (e delle altre vecchie
+# grafie) è ora eseguita dalla migrazione 7b3e9f1c2a58, che converte gli stati in codici interi
+# (vedi stati.py). Il vecchio UPDATE testuale non è più applicabile alla colonna intera.
 
 def run_migration():
-    with app.app_context():
-        print("Inizio migrazione stato: 'Pronto per Rimborso' -> 'Pronta per rimborso'")
-        
-        # Method 1: Bulk Update via SQL for speed and safety
-        query = text("UPDATE trasferta SET stato_post_missione = 'Pronta per rimborso' WHERE stato_post_missione = 'Pronto per Rimborso'")
-        result = db.session.execute(query)
-        db.session.commit()
-        
-        rows_affected = result.rowcount
-        print(f"Migrazione completata. Aggiornate {rows_affected} trasferte.")
+    print("Nulla da fare: le vecchie grafie degli stati sono normalizzate da 'flask db upgrade' "
+          "(migrazione 7b3e9f1c2a58_stati_codificati).")
 
 if __name__ == "__main__":
     run_migration()
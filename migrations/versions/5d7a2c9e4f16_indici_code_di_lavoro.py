@@ -0,0 +1,64 @@
+"""Indici per le code di lavoro (trasferta, delega, spesa)
+
+Revision ID: 5d7a2c9e4f16
+Revises: c3e1f0a9b7d2
+Create Date: 2026-10-16 10:03:17.550932
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d7a2c9e4f16'
+down_revision = 'c3e1f0a9b7d2'
+branch_labels = None
+depends_on = None
+
+
+# Indici parziali: solo le righe pendenti delle code (supportati da Postgres e SQLite)
+INDICI_PARZIALI = [
+    ('ix_trasferta_pre_in_attesa', ['id_dirigente', 'giorno_missione'],
+     "stato_pre_missione = 'In attesa'"),
+    ('ix_trasferta_post_in_attesa', ['id_dirigente', 'giorno_missione'],
+     "stato_post_missione = 'In attesa'"),
+    ('ix_trasferta_pronte_rimborso', ['giorno_missione'],
+     "stato_post_missione = 'Pronta per rimborso' AND stato_approvazione_finale IS NULL"),
+    ('ix_trasferta_storico_finale', ['data_approvazione_finale'],
+     "stato_approvazione_finale IS NOT NULL"),
+]
+
+
+def upgrade():
+    op.create_index('ix_trasferta_dipendente_giorno', 'trasferta', ['id_dipendente', 'giorno_missione', 'id'])
+    op.create_index('ix_trasferta_dirigente_giorno', 'trasferta', ['id_dirigente', 'giorno_missione', 'id'])
+    op.create_index('ix_trasferta_giorno_missione', 'trasferta', ['giorno_missione', 'id'])
+    op.create_index('ix_trasferta_stato_post_finale', 'trasferta',
+                    ['stato_post_missione', 'stato_approvazione_finale', 'giorno_missione'])
+    op.create_index('ix_trasferta_finale_data', 'trasferta', ['stato_approvazione_finale', 'data_approvazione_finale'])
+
+    for nome, colonne, condizione in INDICI_PARZIALI:
+        op.create_index(nome, 'trasferta', colonne,
+                        postgresql_where=sa.text(condizione),
+                        sqlite_where=sa.text(condizione))
+
+    op.create_index('ix_delega_delegato_periodo', 'delega', ['id_delegato', 'data_inizio', 'data_fine'])
+    op.create_index('ix_delega_delegante_fine', 'delega', ['id_delegante', 'data_fine'])
+
+    op.create_index('ix_spesa_id_trasferta', 'spesa', ['id_trasferta'])
+
+
+def downgrade():
+    op.drop_index('ix_spesa_id_trasferta', table_name='spesa')
+
+    op.drop_index('ix_delega_delegante_fine', table_name='delega')
+    op.drop_index('ix_delega_delegato_periodo', table_name='delega')
+
+    for nome, _colonne, _condizione in reversed(INDICI_PARZIALI):
+        op.drop_index(nome, table_name='trasferta')
+
+    op.drop_index('ix_trasferta_finale_data', table_name='trasferta')
+    op.drop_index('ix_trasferta_stato_post_finale', table_name='trasferta')
+    op.drop_index('ix_trasferta_giorno_missione', table_name='trasferta')
+    op.drop_index('ix_trasferta_dirigente_giorno', table_name='trasferta')
+    op.drop_index('ix_trasferta_dipendente_giorno', table_name='trasferta')
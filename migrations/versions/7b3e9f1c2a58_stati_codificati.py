@@ -0,0 +1,189 @@
+"""Stati del workflow codificati come interi
+
+Revision ID: 7b3e9f1c2a58
+Revises: 5d7a2c9e4f16
+Create Date: 2026-10-17 09:21:44.108263
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b3e9f1c2a58'
+down_revision = '5d7a2c9e4f16'
+branch_labels = None
+depends_on = None
+
+
+# Tabelle congelate alla data della migrazione (copiate da stati.py): stati.py può evolvere,
+# quello che fa questa migrazione no.
+# colonna -> ({codice: etichetta canonica}, {vecchia grafia: etichetta canonica})
+STATI = {
+    'stato_pre_missione': ({
+        1: 'In attesa',
+        2: 'Approvata',
+        3: 'Rifiutata',
+    }, {}),
+    'stato_post_missione': ({
+        0: 'N/A',
+        10: 'Compilata',
+        11: 'Rifiutata post',
+        20: 'In attesa',
+        21: 'Da rimborsare',
+        30: 'Pronta per rimborso',
+        31: 'Rimborso Richiesto',
+        40: 'Conclusa',
+        41: 'Rimborso Chiuso (Zero Spese)',
+        42: 'Rimborsata',
+        43: 'Non rimborsata',
+        44: 'Rimborso negato',
+    }, {
+        'Pronto per Rimborso': 'Pronta per rimborso',
+        'Rimborso Concesso': 'Pronta per rimborso',
+        'Rifiutato Post': 'Rifiutata post',
+        'Rimborso Approvato e Liquidato': 'Rimborsata',
+    }),
+    'stato_approvazione_finale': ({
+        1: 'Rimborsata',
+        2: 'Non rimborsata',
+    }, {}),
+}
+
+# (colonna, nullable)
+COLONNE = [
+    ('stato_pre_missione', False),
+    ('stato_post_missione', False),
+    ('stato_approvazione_finale', True),
+]
+
+
+def _chiave(valore):
+    """Forma di confronto (come stati._chiave): spazi normalizzati, maiuscole/minuscole ignorate."""
+    return ' '.join(valore.split()).casefold()
+
+
+def _codici(colonna):
+    """Forma di confronto di ogni grafia nota (alias compresi) -> codice."""
+    etichette, alias = STATI[colonna]
+    codici = {_chiave(e): c for c, e in etichette.items()}
+    for vecchia, canonica in alias.items():
+        codici[_chiave(vecchia)] = codici[_chiave(canonica)]
+    return codici
+
+
+def _codice(colonna, valore):
+    return _codici(colonna).get(_chiave(valore))
+
+
+# Indici che contengono le colonne di stato (o le usano nel predicato): vanno ricreati
+# dopo la conversione, con i predicati espressi sui codici
+INDICI_COMPOSTI = [
+    ('ix_trasferta_stato_post_finale', ['stato_post_missione', 'stato_approvazione_finale', 'giorno_missione']),
+    ('ix_trasferta_finale_data', ['stato_approvazione_finale', 'data_approvazione_finale']),
+]
+
+
+def _indici_parziali(valore):
+    """Indici parziali delle code di lavoro; valore(colonna, etichetta) rende il letterale SQL dello stato."""
+    return [
+        ('ix_trasferta_pre_in_attesa', ['id_dirigente', 'giorno_missione'],
+         f"stato_pre_missione = {valore('stato_pre_missione', 'In attesa')}"),
+        ('ix_trasferta_post_in_attesa', ['id_dirigente', 'giorno_missione'],
+         f"stato_post_missione = {valore('stato_post_missione', 'In attesa')}"),
+        ('ix_trasferta_pronte_rimborso', ['giorno_missione'],
+         f"stato_post_missione = {valore('stato_post_missione', 'Pronta per rimborso')} "
+         "AND stato_approvazione_finale IS NULL"),
+        ('ix_trasferta_storico_finale', ['data_approvazione_finale'],
+         "stato_approvazione_finale IS NOT NULL"),
+    ]
+
+
+INDICI_PARZIALI_TESTO = _indici_parziali(lambda colonna, etichetta: f"'{etichetta}'")
+INDICI_PARZIALI_CODICI = _indici_parziali(_codice)
+
+
+def _elimina_indici(indici_parziali):
+    for nome, _colonne, _condizione in reversed(indici_parziali):
+        op.drop_index(nome, table_name='trasferta')
+    for nome, _colonne in reversed(INDICI_COMPOSTI):
+        op.drop_index(nome, table_name='trasferta')
+
+
+def _crea_indici(indici_parziali):
+    for nome, colonne in INDICI_COMPOSTI:
+        op.create_index(nome, 'trasferta', colonne)
+    for nome, colonne, condizione in indici_parziali:
+        op.create_index(nome, 'trasferta', colonne,
+                        postgresql_where=sa.text(condizione),
+                        sqlite_where=sa.text(condizione))
+
+
+def _sostituisci_colonne(tipo):
+    """Rimpiazza ogni colonna di stato con la sua copia '<colonna>_nuovo' già popolata."""
+    with op.batch_alter_table('trasferta', schema=None) as batch_op:
+        for colonna, nullable in COLONNE:
+            batch_op.drop_column(colonna)
+            batch_op.alter_column(f'{colonna}_nuovo', new_column_name=colonna,
+                                  existing_type=tipo, nullable=nullable)
+
+
+def upgrade():
+    conn = op.get_bind()
+
+    # 0. Ogni grafia presente nel database deve avere un codice: meglio fermarsi che perdere uno stato.
+    #    La stessa normalizzazione (_chiave) decide sia il controllo sia la conversione.
+    conversioni = {}
+    sconosciuti = []
+    for colonna, _nullable in COLONNE:
+        valori = conn.execute(sa.text(f"SELECT DISTINCT {colonna} FROM trasferta WHERE {colonna} IS NOT NULL")).scalars()
+        conversioni[colonna] = {}
+        for valore in valori:
+            codice = _codice(colonna, valore)
+            if codice is None:
+                sconosciuti.append(f"{colonna}={valore!r}")
+            conversioni[colonna][valore] = codice
+    if sconosciuti:
+        raise RuntimeError("Stati senza codice (aggiungerli come alias in stati.py e in questa migrazione): "
+                           + ", ".join(sconosciuti))
+
+    _elimina_indici(INDICI_PARZIALI_TESTO)
+
+    # 1. Colonne intere affiancate alle vecchie
+    with op.batch_alter_table('trasferta', schema=None) as batch_op:
+        for colonna, _nullable in COLONNE:
+            batch_op.add_column(sa.Column(f'{colonna}_nuovo', sa.SmallInteger(), nullable=True))
+
+    # 2. Conversione: un UPDATE per ogni grafia effettivamente presente, sul valore esatto salvato
+    for colonna, _nullable in COLONNE:
+        for valore, codice in conversioni[colonna].items():
+            conn.execute(sa.text(f"UPDATE trasferta SET {colonna}_nuovo = :codice WHERE {colonna} = :valore"),
+                         {'codice': codice, 'valore': valore})
+        non_convertite = conn.execute(sa.text(
+            f"SELECT COUNT(*) FROM trasferta WHERE {colonna} IS NOT NULL AND {colonna}_nuovo IS NULL"
+        )).scalar()
+        if non_convertite:
+            raise RuntimeError(f"{non_convertite} righe di {colonna} non convertite: migrazione interrotta")
+
+    # 3. Le nuove colonne prendono il posto delle vecchie
+    _sostituisci_colonne(sa.SmallInteger())
+    _crea_indici(INDICI_PARZIALI_CODICI)
+
+
+def downgrade():
+    conn = op.get_bind()
+    _elimina_indici(INDICI_PARZIALI_CODICI)
+
+    with op.batch_alter_table('trasferta', schema=None) as batch_op:
+        for colonna, _nullable in COLONNE:
+            batch_op.add_column(sa.Column(f'{colonna}_nuovo', sa.String(length=50), nullable=True))
+
+    # Le vecchie grafie non vengono ripristinate: ogni codice torna alla sua etichetta canonica
+    for colonna, _nullable in COLONNE:
+        etichette, _alias = STATI[colonna]
+        for codice, etichetta in etichette.items():
+            conn.execute(sa.text(f"UPDATE trasferta SET {colonna}_nuovo = :etichetta WHERE {colonna} = :codice"),
+                         {'etichetta': etichetta, 'codice': codice})
+
+    _sostituisci_colonne(sa.String(length=50))
+    _crea_indici(INDICI_PARZIALI_TESTO)
@@ -0,0 +1,26 @@
+"""Versione delle trasferte per la cache dei modali
+
+Revision ID: 9c4d1e7a3b62
+Revises: 7b3e9f1c2a58
+Create Date: 2026-10-17 14:05:12.731904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9c4d1e7a3b62'
+down_revision = '7b3e9f1c2a58'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('trasferta', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('versione', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('trasferta', schema=None) as batch_op:
+        batch_op.drop_column('versione')
@@ -0,0 +1,37 @@
+"""Totali spese denormalizzati su trasferta
+
+Revision ID: c3e1f0a9b7d2
+Revises: ab09b6a6991b
+Create Date: 2026-10-16 09:12:41.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3e1f0a9b7d2'
+down_revision = 'ab09b6a6991b'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('trasferta', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('totale_spese', sa.Float(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('numero_spese', sa.Integer(), server_default='0', nullable=False))
+
+    # Popolamento iniziale dai dati esistenti della tabella spesa
+    op.execute(
+        """
+        UPDATE trasferta SET
+            totale_spese = COALESCE((SELECT SUM(spesa.importo) FROM spesa WHERE spesa.id_trasferta = trasferta.id), 0),
+            numero_spese = (SELECT COUNT(spesa.id) FROM spesa WHERE spesa.id_trasferta = trasferta.id)
+        """
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('trasferta', schema=None) as batch_op:
+        batch_op.drop_column('numero_spese')
+        batch_op.drop_column('totale_spese')
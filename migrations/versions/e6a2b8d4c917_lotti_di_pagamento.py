@@ -0,0 +1,45 @@
+"""Lotti di pagamento per la chiusura multipla dei rimborsi
+
+Revision ID: e6a2b8d4c917
+Revises: 9c4d1e7a3b62
+Create Date: 2026-10-17 16:32:08.519377
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6a2b8d4c917'
+down_revision = '9c4d1e7a3b62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('lotto_pagamento',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('id_operatore', sa.Integer(), nullable=False),
+        sa.Column('data_creazione', sa.DateTime(), nullable=False),
+        # Codice di stati.FINALE (1 Rimborsata, 2 Non rimborsata)
+        sa.Column('esito', sa.SmallInteger(), nullable=False),
+        sa.Column('numero_trasferte', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('totale', sa.Float(), server_default='0', nullable=False),
+        sa.ForeignKeyConstraint(['id_operatore'], ['dipendente.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+    with op.batch_alter_table('trasferta', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('id_lotto_pagamento', sa.Integer(), nullable=True))
+        batch_op.create_index('ix_trasferta_id_lotto_pagamento', ['id_lotto_pagamento'], unique=False)
+        batch_op.create_foreign_key('fk_trasferta_lotto_pagamento', 'lotto_pagamento',
+                                    ['id_lotto_pagamento'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('trasferta', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_trasferta_lotto_pagamento', type_='foreignkey')
+        batch_op.drop_index('ix_trasferta_id_lotto_pagamento')
+        batch_op.drop_column('id_lotto_pagamento')
+
+    op.drop_table('lotto_pagamento')
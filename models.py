@@ -2,6 +2,10 @@ from datetime import datetime, date
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from sqlalchemy.ext.hybrid import hybrid_property
+from sqlalchemy import select, update, func, or_, event
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import flag_modified
+import stati
 
 db = SQLAlchemy()
 
@@ -92,6 +96,36 @@ class Dipendente(UserMixin, db.Model):
 
 class Trasferta(db.Model):
     __tablename__ = 'trasferta'
+    # Indici allineati alle code di lavoro (mie_trasferte, dashboard_amministrazione, presenze).
+    # Gli indici parziali coprono solo le righe "pendenti", quindi restano piccoli anche con anni di storico.
+    __table_args__ = (
+        db.Index('ix_trasferta_dipendente_giorno', 'id_dipendente', 'giorno_missione', 'id'),
+        db.Index('ix_trasferta_dirigente_giorno', 'id_dirigente', 'giorno_missione', 'id'),
+        db.Index('ix_trasferta_giorno_missione', 'giorno_missione', 'id'),
+        db.Index('ix_trasferta_stato_post_finale', 'stato_post_missione', 'stato_approvazione_finale', 'giorno_missione'),
+        db.Index('ix_trasferta_finale_data', 'stato_approvazione_finale', 'data_approvazione_finale'),
+        db.Index(
+            'ix_trasferta_pre_in_attesa', 'id_dirigente', 'giorno_missione',
+            postgresql_where=db.text(f"stato_pre_missione = {stati.PRE.codice('In attesa')}"),
+            sqlite_where=db.text(f"stato_pre_missione = {stati.PRE.codice('In attesa')}")
+        ),
+        db.Index(
+            'ix_trasferta_post_in_attesa', 'id_dirigente', 'giorno_missione',
+            postgresql_where=db.text(f"stato_post_missione = {stati.POST.codice('In attesa')}"),
+            sqlite_where=db.text(f"stato_post_missione = {stati.POST.codice('In attesa')}")
+        ),
+        db.Index(
+            'ix_trasferta_pronte_rimborso', 'giorno_missione',
+            postgresql_where=db.text(f"stato_post_missione = {stati.POST.codice('Pronta per rimborso')} AND stato_approvazione_finale IS NULL"),
+            sqlite_where=db.text(f"stato_post_missione = {stati.POST.codice('Pronta per rimborso')} AND stato_approvazione_finale IS NULL")
+        ),
+        db.Index(
+            'ix_trasferta_storico_finale', 'data_approvazione_finale',
+            postgresql_where=db.text("stato_approvazione_finale IS NOT NULL"),
+            sqlite_where=db.text("stato_approvazione_finale IS NOT NULL")
+        ),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     
     # Dati Missione
@@ -108,6 +142,12 @@ class Trasferta(db.Model):
     note_premissione = db.Column(db.Text, nullable=True)
     spese = db.relationship('Spesa', backref='trasferta_rel', lazy=True, primaryjoin="Trasferta.id == Spesa.id_trasferta")
 
+    # --- TOTALI SPESE (denormalizzati) ---
+    # Aggiornati nella stessa transazione in cui vengono riscritte le spese
+    # (vedi aggiorna_totali_spese); ricalcola_totali_spese() corregge eventuali derive.
+    totale_spese = db.Column(db.Float, default=0.0, server_default='0', nullable=False)
+    numero_spese = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+
 # --- CAMPI PER LA RENDICONTAZIONE (FASE 2: POST MISSIONE) ---
     
     # Orari della Missione (Data viene dalla Fase 1, qui si aggiungono solo gli orari effettivi)
@@ -173,15 +213,18 @@ class Trasferta(db.Model):
     rapporto_finale = db.Column(db.Text, nullable=True)
     
     # --- STATO DI APPROVAZIONE SPESA (Fase 2) ---
-    stato_post_missione = db.Column(db.String(50), default='N/A', nullable=False) # In attesa, Da rimborsare, Rimborso negato
+    # Stati codificati come interi: etichette e codici in stati.py
+    stato_post_missione = db.Column(stati.StatoCodificato(stati.POST), default='N/A', nullable=False) # In attesa, Da rimborsare, Rimborso negato
     data_approvazione_post = db.Column(db.DateTime, nullable=True)
     id_approvatore_post = db.Column(db.Integer, db.ForeignKey('dipendente.id'), nullable=True)
     note_approvazione_post = db.Column(db.Text, nullable=True)
     
     # --- STATO APPROVAZIONE FINANZIARIA (Fase 3: Amministrazione) ---
-    stato_approvazione_finale = db.Column(db.String(50), nullable=True) # Es: 'Rimborsata', 'Rifiutata'
+    stato_approvazione_finale = db.Column(stati.StatoCodificato(stati.FINALE), nullable=True) # Es: 'Rimborsata', 'Non rimborsata'
     id_approvatore_finale = db.Column(db.Integer, db.ForeignKey('dipendente.id'), nullable=True)
     data_approvazione_finale = db.Column(db.DateTime, nullable=True)
+    # Lotto di pagamento con cui l'Amministrazione ha chiuso la missione (solo elaborazioni multiple)
+    id_lotto_pagamento = db.Column(db.Integer, db.ForeignKey('lotto_pagamento.id'), nullable=True, index=True)
     
     # --------------------------------------------
     # ------------------------------------------------------------
@@ -190,7 +233,7 @@ class Trasferta(db.Model):
     id_dipendente = db.Column(db.Integer, db.ForeignKey('dipendente.id'), nullable=False)
     id_dirigente = db.Column(db.Integer, db.ForeignKey('dipendente.id'), nullable=False)
     # --- NUOVI CAMPI PER IL TRACCIAMENTO DEL WORKFLOW ---
-    stato_pre_missione = db.Column(db.String(50), default='In attesa', nullable=False)
+    stato_pre_missione = db.Column(stati.StatoCodificato(stati.PRE), default='In attesa', nullable=False)
     data_approvazione_pre = db.Column(db.DateTime, nullable=True) # Quando la decisione è stata presa
     
     # Chi ha approvato/rifiutato (puntiamo a Dipendente.id)
@@ -201,6 +244,12 @@ class Trasferta(db.Model):
     nbp = db.Column(db.Boolean, default=False)
     # --------------------------------------------------------
 
+    # --- VERSIONE ---
+    # Incrementata a ogni modifica della riga o delle sue spese (vedi _incrementa_versione):
+    # è la chiave con cui get_modale_content riconosce i frammenti ancora validi.
+    # Gli UPDATE "a mano" (update(Trasferta)...) devono incrementarla esplicitamente.
+    versione = db.Column(db.Integer, default=1, server_default='1', nullable=False)
+
     # Relazioni ORM (per le query Python)
     
     # Relazione con il richiedente
@@ -231,17 +280,34 @@ class Trasferta(db.Model):
         foreign_keys=[id_approvatore_finale]
     )
     
-    @property
-    def totale_spese(self):
-        """Calcola il totale delle spese associate alla trasferta."""
-        return sum(spesa.importo for spesa in self.spese if spesa.importo)
+    def aggiorna_totali_spese(self, spese):
+        """Allinea totale_spese e numero_spese alle spese appena scritte per questa trasferta."""
+        self.totale_spese = sum(spesa.importo for spesa in spese if spesa.importo)
+        self.numero_spese = len(spese)
+        # Anche a totali invariati le spese sono cambiate: la riga va comunque riscritta (e versionata)
+        flag_modified(self, 'numero_spese')
 
     def __repr__(self):
         return f"Trasferta(ID: {self.id}, Dipendente: {self.richiedente.nome}, Stato: {self.stato_pre_missione})"
 
 
+@event.listens_for(Trasferta, 'before_update')
+def _incrementa_versione(mapper, connection, target):
+    # before_update scatta anche per oggetti "sporchi" senza modifiche reali: in quel caso nessun UPDATE
+    if not object_session(target).is_modified(target, include_collections=False):
+        return
+    # Espressione SQL: l'incremento avviene nel database, corretto anche con più processi
+    target.versione = Trasferta.versione + 1
+
+
 class Delega(db.Model):
     __tablename__ = 'delega'
+    # (id_delegato, date): deleghe attive dell'utente loggato; (id_delegante, data_fine): gestione deleghe
+    __table_args__ = (
+        db.Index('ix_delega_delegato_periodo', 'id_delegato', 'data_inizio', 'data_fine'),
+        db.Index('ix_delega_delegante_fine', 'id_delegante', 'data_fine'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     
     id_delegante = db.Column(db.Integer, db.ForeignKey('dipendente.id'), nullable=False)
@@ -271,7 +337,7 @@ class Spesa(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     
     # Chiave esterna alla trasferta
-    id_trasferta = db.Column(db.Integer, db.ForeignKey('trasferta.id'), nullable=False)
+    id_trasferta = db.Column(db.Integer, db.ForeignKey('trasferta.id'), nullable=False, index=True)
     
     # NUOVO CAMPO: La categoria della spesa
     categoria = db.Column(db.String(50), nullable=False) # Es: 'Vitto', 'Alloggio', 'Trasporto', 'Altro'
@@ -288,4 +354,72 @@ class Spesa(db.Model):
     def __repr__(self):
         return f"Spesa(id={self.id}, trasferta_id={self.id_trasferta}, categoria={self.categoria}, importo={self.importo})"
 
-    
\ No newline at end of file
+
+# ====================================================================
+# LOTTI DI PAGAMENTO (Amministrazione)
+# ====================================================================
+
+class LottoPagamento(db.Model):
+    """
+    Chiusura multipla di rimborsi: tutte le missioni rimborsate (o rifiutate) insieme dallo stesso
+    operatore puntano allo stesso lotto. numero_trasferte e totale sono calcolati dal database
+    sulle missioni del lotto nella stessa transazione (ricalcola_lotto).
+    """
+    __tablename__ = 'lotto_pagamento'
+
+    id = db.Column(db.Integer, primary_key=True)
+    id_operatore = db.Column(db.Integer, db.ForeignKey('dipendente.id'), nullable=False)
+    data_creazione = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    esito = db.Column(stati.StatoCodificato(stati.FINALE), nullable=False) # 'Rimborsata' o 'Non rimborsata'
+    numero_trasferte = db.Column(db.Integer, default=0, server_default='0', nullable=False)
+    totale = db.Column(db.Float, default=0.0, server_default='0', nullable=False)
+
+    operatore = db.relationship('Dipendente', foreign_keys=[id_operatore])
+    trasferte = db.relationship('Trasferta', backref='lotto_pagamento', lazy=True)
+
+    def __repr__(self):
+        return f"LottoPagamento(id={self.id}, esito={self.esito}, trasferte={self.numero_trasferte}, totale={self.totale})"
+
+
+def ricalcola_lotto(id_lotto):
+    """
+    Ricalcola numero_trasferte e totale del lotto dalle missioni che vi puntano, con un unico UPDATE.
+    Restituisce la riga (id, numero_trasferte, totale); il commit è a carico del chiamante.
+    """
+    missioni_lotto = Trasferta.id_lotto_pagamento == LottoPagamento.id
+    return db.session.execute(
+        update(LottoPagamento)
+        .where(LottoPagamento.id == id_lotto)
+        .values(
+            numero_trasferte=select(func.count(Trasferta.id)).where(missioni_lotto).scalar_subquery(),
+            totale=select(func.coalesce(func.sum(Trasferta.totale_spese), 0.0)).where(missioni_lotto).scalar_subquery(),
+        )
+        .returning(LottoPagamento.id, LottoPagamento.numero_trasferte, LottoPagamento.totale)
+        .execution_options(synchronize_session=False)
+    ).one()
+
+
+# ====================================================================
+# MANUTENZIONE TOTALI SPESE
+# ====================================================================
+
+def ricalcola_totali_spese(solo_disallineate=True):
+    """
+    Ricalcola totale_spese e numero_spese di Trasferta dalla tabella spesa con un unico UPDATE.
+
+    Con solo_disallineate=True vengono toccate solo le righe che differiscono dal valore reale.
+    Restituisce il numero di trasferte aggiornate; il commit è a carico del chiamante.
+    """
+    somma = select(func.coalesce(func.sum(Spesa.importo), 0.0)).where(
+        Spesa.id_trasferta == Trasferta.id
+    ).scalar_subquery()
+    conteggio = select(func.count(Spesa.id)).where(
+        Spesa.id_trasferta == Trasferta.id
+    ).scalar_subquery()
+
+    stmt = update(Trasferta).values(totale_spese=somma, numero_spese=conteggio, versione=Trasferta.versione + 1)
+    if solo_disallineate:
+        stmt = stmt.where(or_(Trasferta.totale_spese != somma, Trasferta.numero_spese != conteggio))
+
+    risultato = db.session.execute(stmt.execution_options(synchronize_session=False))
+    return risultato.rowcount
@@ -0,0 +1,210 @@
+# monitoraggio.py
+
+# ====================================================================
+# STRUMENTAZIONE PER RICHIESTA (SQL, TEMPO DB, RENDER JINJA)
+# ====================================================================
+# Per ogni richiesta vengono misurati: numero di statement SQL, tempo totale sul DB,
+# lo statement più lento e il tempo di render dei template. I dati sono esposti
+# nell'header 'Server-Timing' e in un riepilogo in memoria (per processo) che il
+# Superuser consulta da /dashboard_superuser/prestazioni.
+import time
+import threading
+from collections import deque
+
+from flask import g, has_request_context, request, before_render_template, template_rendered
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Numero di richieste conservate nel riepilogo (finestra mobile)
+FINESTRA_DEFAULT = 500
+# Lunghezza massima del testo SQL conservato per lo statement più lento
+MAX_LUNGHEZZA_SQL = 300
+
+
+class RiepilogoRichieste:
+    """Finestra mobile, thread-safe, delle misure delle ultime richieste servite dal processo."""
+
+    def __init__(self, dimensione=FINESTRA_DEFAULT):
+        self._misure = deque(maxlen=dimensione)
+        self._lock = threading.Lock()
+
+    def registra(self, misura):
+        with self._lock:
+            self._misure.append(misura)
+
+    def misure(self):
+        with self._lock:
+            return list(self._misure)
+
+    def per_endpoint(self):
+        """Aggrega le misure per endpoint, ordinando per tempo totale speso (il più costoso in alto)."""
+        gruppi = {}
+        for m in self.misure():
+            gruppi.setdefault(m['endpoint'], []).append(m)
+
+        righe = []
+        for endpoint, misure in gruppi.items():
+            durate = sorted(m['durata_ms'] for m in misure)
+            piu_lenta = max(misure, key=lambda m: m['query_piu_lenta_ms'])
+            righe.append({
+                'endpoint': endpoint,
+                'budget': misure[-1]['budget'],
+                'richieste': len(misure),
+                'durata_media_ms': sum(durate) / len(durate),
+                'durata_p95_ms': durate[min(len(durate) - 1, int(len(durate) * 0.95))],
+                'query_medie': sum(m['n_query'] for m in misure) / len(misure),
+                'query_max': max(m['n_query'] for m in misure),
+                'db_medio_ms': sum(m['db_ms'] for m in misure) / len(misure),
+                'render_medio_ms': sum(m['render_ms'] for m in misure) / len(misure),
+                'query_piu_lenta_ms': piu_lenta['query_piu_lenta_ms'],
+                'query_piu_lenta_sql': piu_lenta['query_piu_lenta_sql'],
+                'tempo_totale_ms': sum(durate),
+            })
+        return sorted(righe, key=lambda r: r['tempo_totale_ms'], reverse=True)
+
+
+riepilogo = RiepilogoRichieste()
+
+
+def budget_query(massimo, per_blocco=0, righe_per_blocco=None):
+    """
+    Dichiara il numero massimo di statement SQL che la rotta può eseguire, per qualunque ruolo
+    e indipendentemente dal numero di righe nel database. Va posto subito sotto @bp.route,
+    così il budget è visibile accanto alla rotta; verify_query_budget.py lo verifica.
+
+    Le rotte che trasmettono in streaming (export) leggono i dati a blocchi: per queste
+    per_blocco indica gli statement ammessi per ogni blocco di righe_per_blocco trasferte,
+    oltre ai 'massimo' eseguiti prima dell'invio.
+    """
+    def decorator(f):
+        f.budget_query = massimo
+        f.budget_per_blocco = (per_blocco, righe_per_blocco) if per_blocco else None
+        return f
+    return decorator
+
+
+def budget_della_rotta(app, endpoint):
+    """Il budget dichiarato per l'endpoint (None se la rotta non ne dichiara uno)."""
+    vista = app.view_functions.get(endpoint)
+    return getattr(vista, 'budget_query', None)
+
+
+def budget_per_blocco(app, endpoint):
+    """(statement per blocco, righe per blocco) per le rotte in streaming, altrimenti None."""
+    vista = app.view_functions.get(endpoint)
+    return getattr(vista, 'budget_per_blocco', None)
+
+
+def misure_correnti():
+    """Le misure della richiesta in corso (None fuori da una richiesta strumentata)."""
+    if not has_request_context():
+        return None
+    return g.get('_monitoraggio')
+
+
+# --------------------------------------------------------------------
+# Eventi SQLAlchemy (registrati a livello di classe Engine: valgono per ogni engine)
+# --------------------------------------------------------------------
+
+def _prima_dello_statement(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_monitoraggio_inizio', []).append(time.perf_counter())
+
+
+def _dopo_lo_statement(conn, cursor, statement, parameters, context, executemany):
+    inizi = conn.info.get('_monitoraggio_inizio')
+    if not inizi:
+        return
+    durata_ms = (time.perf_counter() - inizi.pop()) * 1000
+
+    misure = misure_correnti()
+    if misure is None:
+        return
+    misure['n_query'] += 1
+    misure['db_ms'] += durata_ms
+    if durata_ms > misure['query_piu_lenta_ms']:
+        misure['query_piu_lenta_ms'] = durata_ms
+        misure['query_piu_lenta_sql'] = ' '.join(statement.split())[:MAX_LUNGHEZZA_SQL]
+
+
+# --------------------------------------------------------------------
+# Segnali Flask per il tempo di render dei template
+# --------------------------------------------------------------------
+
+def _prima_del_render(sender, template, context, **extra):
+    misure = misure_correnti()
+    if misure is not None:
+        misure['_render_inizi'].append(time.perf_counter())
+
+
+def _dopo_il_render(sender, template, context, **extra):
+    misure = misure_correnti()
+    if misure is not None and misure['_render_inizi']:
+        inizio = misure['_render_inizi'].pop()
+        # Solo il render più esterno viene sommato (i template annidati sono già inclusi)
+        if not misure['_render_inizi']:
+            misure['render_ms'] += (time.perf_counter() - inizio) * 1000
+
+
+def init_monitoraggio(app):
+    """Collega la strumentazione all'app. Disattivabile con MONITORAGGIO_ATTIVO=False."""
+    global riepilogo
+
+    if not app.config.get('MONITORAGGIO_ATTIVO', True):
+        return
+
+    riepilogo = RiepilogoRichieste(app.config.get('MONITORAGGIO_FINESTRA', FINESTRA_DEFAULT))
+
+    if not event.contains(Engine, 'before_cursor_execute', _prima_dello_statement):
+        event.listen(Engine, 'before_cursor_execute', _prima_dello_statement)
+        event.listen(Engine, 'after_cursor_execute', _dopo_lo_statement)
+
+    before_render_template.connect(_prima_del_render, app)
+    template_rendered.connect(_dopo_il_render, app)
+
+    @app.before_request
+    def _inizia_misura():
+        g._monitoraggio = {
+            'inizio': time.perf_counter(),
+            'n_query': 0,
+            'db_ms': 0.0,
+            'query_piu_lenta_ms': 0.0,
+            'query_piu_lenta_sql': None,
+            'render_ms': 0.0,
+            '_render_inizi': [],
+        }
+
+    @app.after_request
+    def _chiudi_misura(response):
+        misure = g.pop('_monitoraggio', None)
+        if misure is None:
+            return response
+
+        durata_ms = (time.perf_counter() - misure['inizio']) * 1000
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={misure["db_ms"]:.1f};desc="{misure["n_query"]} query", '
+            f'tpl;dur={misure["render_ms"]:.1f}, app;dur={durata_ms:.1f}'
+        )
+
+        # Le risorse statiche non entrano nel riepilogo
+        if request.endpoint and request.endpoint != 'static':
+            budget = budget_della_rotta(app, request.endpoint)
+            if budget is not None and misure['n_query'] > budget:
+                app.logger.warning(
+                    "Budget query superato su %s: %d statement (budget %d)",
+                    request.endpoint, misure['n_query'], budget
+                )
+            riepilogo.registra({
+                'endpoint': request.endpoint,
+                'metodo': request.method,
+                'status': response.status_code,
+                'durata_ms': durata_ms,
+                'n_query': misure['n_query'],
+                'db_ms': misure['db_ms'],
+                'query_piu_lenta_ms': misure['query_piu_lenta_ms'],
+                'query_piu_lenta_sql': misure['query_piu_lenta_sql'],
+                'render_ms': misure['render_ms'],
+                'budget': budget,
+                'timestamp': time.time(),
+            })
+        return response
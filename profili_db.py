@@ -0,0 +1,201 @@
+# profili_db.py
+
+# ====================================================================
+# PROFILI DELL'ENGINE DEL DATABASE (POOLED, SERVERLESS, SQLITE)
+# ====================================================================
+# La stessa app gira sotto gunicorn su Render (processi di lunga durata: conviene un pool
+# di connessioni riusate), come funzione serverless su Vercel (istanze effimere: un pool
+# per istanza lascia connessioni aperte verso Postgres a ogni avvio a freddo) e in locale
+# su SQLite. DB_PROFILO sceglie il profilo; se assente lo si deduce dall'URL e
+# dall'ambiente (Vercel imposta VERCEL=1).
+#
+# Le opzioni finiscono in SQLALCHEMY_ENGINE_OPTIONS, quindi init_profili_db va chiamato
+# prima di db.init_app. Gli eventi del pool alimentano 'statistiche' (per processo):
+# connessioni aperte e chiuse, checkout, attesa per ottenere una connessione dal pool
+# (pool a coda), timeout; il Superuser le consulta da /dashboard_superuser/prestazioni.
+# Con i worker a thread o green DB_POOL_SIZE viene dimensionato da concorrenza.py.
+import os
+import threading
+import time
+from collections import deque
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as TimeoutPool
+from sqlalchemy.pool import Pool, QueuePool, NullPool
+
+from concorrenza import attiva_attese_cooperative
+
+PROFILI = ('pooled', 'serverless', 'sqlite')
+# Numero di checkout conservati per le statistiche di attesa (finestra mobile)
+FINESTRA_ATTESE = 1000
+
+
+class StatistichePool:
+    """Contatori thread-safe degli eventi del pool di questo processo."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._attese = deque(maxlen=FINESTRA_ATTESE)
+        self.connessioni_create = 0
+        self.connessioni_chiuse = 0
+        self.checkout = 0
+        self.invalidate = 0
+        self.timeout = 0
+
+    def incrementa(self, contatore):
+        with self._lock:
+            setattr(self, contatore, getattr(self, contatore) + 1)
+
+    def registra_attesa(self, attesa_ms):
+        with self._lock:
+            self._attese.append(attesa_ms)
+
+    def riepilogo(self, pool):
+        with self._lock:
+            attese = sorted(self._attese)
+            contatori = {
+                'connessioni_create': self.connessioni_create,
+                'connessioni_chiuse': self.connessioni_chiuse,
+                'checkout': self.checkout,
+                'invalidate': self.invalidate,
+                'timeout': self.timeout,
+            }
+        riepilogo = {
+            'pool': type(pool).__name__,
+            'connessioni_aperte': contatori['connessioni_create'] - contatori['connessioni_chiuse'],
+            'attese_misurate': len(attese),
+            'attesa_media_ms': sum(attese) / len(attese) if attese else 0.0,
+            'attesa_p95_ms': attese[min(len(attese) - 1, int(len(attese) * 0.95))] if attese else 0.0,
+            'attesa_max_ms': attese[-1] if attese else 0.0,
+            # Stato istantaneo, solo per i pool a coda
+            'dimensione': None,
+            'in_uso': None,
+            'overflow': None,
+            **contatori,
+        }
+        if isinstance(pool, QueuePool):
+            # overflow() è negativo finché il pool non è pieno: conta solo le connessioni oltre pool_size
+            riepilogo.update(dimensione=pool.size(), in_uso=pool.checkedout(), overflow=max(pool.overflow(), 0))
+        return riepilogo
+
+
+statistiche = StatistichePool()
+
+
+class QueuePoolMisurato(QueuePool):
+    """QueuePool che misura quanto si attende una connessione (inclusa l'apertura in overflow)."""
+
+    def _do_get(self):
+        inizio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except TimeoutPool:
+            statistiche.incrementa('timeout')
+            raise
+        finally:
+            statistiche.registra_attesa((time.perf_counter() - inizio) * 1000)
+
+
+def scegli_profilo(db_url, ambiente=os.environ):
+    profilo = ambiente.get('DB_PROFILO')
+    if profilo:
+        if profilo not in PROFILI:
+            raise ValueError(f"DB_PROFILO non valido: '{profilo}' (ammessi: {', '.join(PROFILI)})")
+        return profilo
+    if db_url.startswith('sqlite'):
+        return 'sqlite'
+    if ambiente.get('VERCEL'):
+        return 'serverless'
+    return 'pooled'
+
+
+def _sqlite_in_memoria(db_url):
+    return db_url in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in db_url
+
+
+def opzioni_engine(profilo, db_url, ambiente=os.environ):
+    """Le opzioni di create_engine per il profilo, con i parametri sovrascrivibili da variabili d'ambiente."""
+    def intero(nome, default):
+        return int(ambiente.get(nome, default))
+
+    postgres = db_url.startswith('postgresql')
+
+    if profilo == 'pooled':
+        # Processi di lunga durata: connessioni riusate, verificate prima dell'uso e
+        # riciclate prima che il server (o un proxy) le chiuda per inattività
+        opzioni = {
+            'poolclass': QueuePoolMisurato,
+            'pool_size': intero('DB_POOL_SIZE', 5),
+            'max_overflow': intero('DB_POOL_OVERFLOW', 5),
+            'pool_timeout': intero('DB_POOL_TIMEOUT', 10),
+            'pool_pre_ping': True,
+            'pool_recycle': intero('DB_POOL_RECYCLE', 1800),
+        }
+        if postgres:
+            opzioni['connect_args'] = {'connect_timeout': intero('DB_CONNECT_TIMEOUT', 10)}
+
+    elif profilo == 'serverless':
+        # Istanze effimere: nessuna connessione sopravvive alla richiesta, a meno di
+        # chiedere esplicitamente un'unica connessione riusata dall'istanza calda
+        if ambiente.get('DB_SERVERLESS_CONNESSIONE_SINGOLA', '0') != '0':
+            opzioni = {
+                'poolclass': QueuePoolMisurato,
+                'pool_size': 1,
+                'max_overflow': 0,
+                'pool_timeout': intero('DB_POOL_TIMEOUT', 5),
+                'pool_pre_ping': True,
+                'pool_recycle': intero('DB_POOL_RECYCLE', 300),
+            }
+        else:
+            opzioni = {'poolclass': NullPool}
+        if postgres:
+            opzioni['connect_args'] = {'connect_timeout': intero('DB_CONNECT_TIMEOUT', 3)}
+
+    elif profilo == 'sqlite':
+        # 'timeout' è l'attesa del lock di scrittura del file, non della rete
+        opzioni = {'connect_args': {'timeout': intero('DB_SQLITE_TIMEOUT', 15)}}
+        if not _sqlite_in_memoria(db_url):
+            # Stesso pool che SQLAlchemy userebbe per un file, ma misurato
+            opzioni.update(poolclass=QueuePoolMisurato, pool_size=5, max_overflow=10)
+
+    else:
+        raise ValueError(f"Profilo del database sconosciuto: '{profilo}'")
+
+    return opzioni
+
+
+# --------------------------------------------------------------------
+# Eventi del pool (registrati a livello di classe Pool: valgono per ogni engine)
+# --------------------------------------------------------------------
+
+def _alla_connessione(dbapi_connection, connection_record):
+    statistiche.incrementa('connessioni_create')
+
+
+def _alla_chiusura(dbapi_connection, connection_record):
+    statistiche.incrementa('connessioni_chiuse')
+
+
+def _al_checkout(dbapi_connection, connection_record, connection_proxy):
+    statistiche.incrementa('checkout')
+
+
+def _all_invalidazione(dbapi_connection, connection_record, exception):
+    statistiche.incrementa('invalidate')
+
+
+def init_profili_db(app):
+    """Sceglie il profilo e imposta SQLALCHEMY_ENGINE_OPTIONS. Da chiamare prima di db.init_app."""
+    db_url = app.config['SQLALCHEMY_DATABASE_URI']
+    profilo = scegli_profilo(db_url)
+    app.config['DB_PROFILO'] = profilo
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opzioni_engine(profilo, db_url)
+    if db_url.startswith('postgresql'):
+        # Worker gevent: le attese di psycopg2 cedono il controllo agli altri greenlet
+        attiva_attese_cooperative()
+
+    if not event.contains(Pool, 'connect', _alla_connessione):
+        event.listen(Pool, 'connect', _alla_connessione)
+        event.listen(Pool, 'close', _alla_chiusura)
+        event.listen(Pool, 'checkout', _al_checkout)
+        event.listen(Pool, 'invalidate', _all_invalidazione)
@@ -0,0 +1,19 @@
+import sys
+from app import app, db
+from models import ricalcola_totali_spese
+
+def ricalcola(tutte=False):
+    """Riallinea totale_spese/numero_spese di ogni Trasferta alla tabella spesa."""
+    print("--- Ricalcolo Totali Spese ---")
+    with app.app_context():
+        aggiornate = ricalcola_totali_spese(solo_disallineate=not tutte)
+        db.session.commit()
+
+        if aggiornate:
+            print(f"Trasferte riallineate: {aggiornate}")
+        else:
+            print("Nessuna deriva: i totali salvati coincidono con le spese.")
+
+if __name__ == "__main__":
+    # --tutte: riscrive i totali di ogni trasferta, non solo di quelle disallineate
+    ricalcola(tutte='--tutte' in sys.argv[1:])
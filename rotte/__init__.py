@@ -0,0 +1,12 @@
+# rotte/__init__.py
+
+# Blueprint dell'applicazione, registrati da create_app nell'ordine indicato. Ogni modulo
+# espone 'bp'; gli URL restano quelli storici (nessun url_prefix), gli endpoint sono
+# qualificati dal blueprint (es. url_for('workflow.mie_trasferte')).
+BLUEPRINT = (
+    'rotte.autenticazione',
+    'rotte.workflow',
+    'rotte.amministrazione',
+    'rotte.presenze',
+    'rotte.superuser',
+)
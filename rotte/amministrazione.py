@@ -0,0 +1,289 @@
+# rotte/amministrazione.py
+
+# ====================================================================
+# ROTTE DELL'AMMINISTRAZIONE (RIMBORSI FINALI, LOTTI, STORICO)
+# ====================================================================
+from datetime import datetime, timedelta, date, time
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask_login import login_required, current_user
+from sqlalchemy import or_, and_, func, extract
+from sqlalchemy.orm import joinedload
+
+from models import db, Dipendente, Trasferta, LottoPagamento, ricalcola_lotto
+from monitoraggio import budget_query
+from autorizzazioni import amministrazione_required
+from filtri_trasferte import mese_successivo
+from transizioni import esegui_transizione, esegui_transizioni
+import stati
+
+bp = Blueprint('amministrazione', __name__)
+
+
+@bp.route('/approva_rimborso_finale/<int:trasferta_id>', methods=['POST'])
+@budget_query(3)
+@login_required
+@amministrazione_required
+def approva_rimborso_finale(trasferta_id):
+    # Approvazione finale: stato_approvazione_finale = 'Rimborsata' (importante per lo storico!)
+    esito, riga = esegui_transizione('approva_rimborso_finale', trasferta_id)
+    if esito == 'ok':
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Errore nel salvataggio dell\'approvazione finale: {e}', 'danger')
+            return redirect(url_for('amministrazione.dashboard_amministrazione'))
+
+    # Verifica che la trasferta fosse nello stato corretto (cioè pronta per essere rimborsata)
+    if esito != 'ok':
+        flash(f'Impossibile approvare: la missione non è nello stato corretto. Stato: {riga.stato_post_missione}', 'danger')
+        return redirect(url_for('amministrazione.dashboard_amministrazione'))
+
+    flash('Rimborso confermato e missione conclusa con stato "Rimborsata".', 'success')
+    # Reindirizza alla dashboard corretta
+    return redirect(url_for('amministrazione.dashboard_amministrazione'))
+
+@bp.route('/rifiuta_rimborso_finale/<int:trasferta_id>', methods=['POST'])
+@budget_query(3)
+@login_required
+@amministrazione_required
+def rifiuta_rimborso_finale(trasferta_id):
+    # Rifiuto finale: stato_approvazione_finale = 'Non rimborsata'
+    esito, riga = esegui_transizione('rifiuta_rimborso_finale', trasferta_id)
+    if esito == 'ok':
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Errore nel rifiuto del rimborso: {e}', 'danger')
+            return redirect(url_for('amministrazione.dashboard_amministrazione'))
+
+    if esito != 'ok':
+        flash(f'Impossibile rifiutare: la missione non è nello stato corretto. Stato: {riga.stato_post_missione}', 'danger')
+    else:
+        flash('Rimborso rifiutato. Stato missione impostato su "Non rimborsata".', 'warning')
+
+    return redirect(url_for('amministrazione.dashboard_amministrazione'))
+
+
+
+
+# --- CHIUSURA MULTIPLA DEI RIMBORSI (LOTTI DI PAGAMENTO) ---
+# Massimo numero di missioni per lotto: tiene limitata la lista IN (...) dell'UPDATE
+LOTTO_PAGAMENTO_MAX_TRASFERTE = 1000
+TRANSIZIONI_LOTTO = {'Rimborsata': 'approva_rimborso_finale', 'Non rimborsata': 'rifiuta_rimborso_finale'}
+
+
+@bp.route('/processa_rimborsi_finali', methods=['POST'])
+@budget_query(4)
+@login_required
+@amministrazione_required
+def processa_rimborsi_finali():
+    """
+    Rimborsa (o rifiuta) in blocco le missioni selezionate in dashboard_amministrazione.
+    In una sola transazione: crea il lotto di pagamento, sposta tutte le missioni ancora
+    'Pronta per rimborso' con un unico UPDATE che le collega al lotto, poi calcola nel
+    database numero di missioni e totale del lotto.
+    """
+    esito = request.form.get('esito')
+    transizione = TRANSIZIONI_LOTTO.get(esito)
+    if transizione is None:
+        flash('Esito non valido.', 'danger')
+        return redirect(url_for('amministrazione.dashboard_amministrazione'))
+
+    try:
+        trasferta_ids = sorted({int(v) for v in request.form.getlist('trasferta_ids')})
+    except ValueError:
+        flash('Selezione non valida.', 'danger')
+        return redirect(url_for('amministrazione.dashboard_amministrazione'))
+    if not trasferta_ids:
+        flash('Nessuna missione selezionata.', 'warning')
+        return redirect(url_for('amministrazione.dashboard_amministrazione'))
+    if len(trasferta_ids) > LOTTO_PAGAMENTO_MAX_TRASFERTE:
+        flash(f'Puoi processare al massimo {LOTTO_PAGAMENTO_MAX_TRASFERTE} missioni per lotto.', 'danger')
+        return redirect(url_for('amministrazione.dashboard_amministrazione'))
+
+    try:
+        lotto = LottoPagamento(id_operatore=current_user.id, esito=esito)
+        db.session.add(lotto)
+        db.session.flush()
+
+        righe = esegui_transizioni(transizione, trasferta_ids, id_lotto_pagamento=lotto.id)
+        if not righe:
+            # Tutte già processate (es. da un altro operatore): nessun lotto vuoto
+            db.session.rollback()
+            flash('Nessuna missione processata: le missioni selezionate non sono più in attesa di rimborso.', 'warning')
+            return redirect(url_for('amministrazione.dashboard_amministrazione'))
+
+        # Totali del lotto calcolati dal database sulle missioni appena collegate
+        riepilogo = ricalcola_lotto(lotto.id)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Errore durante l\'elaborazione del lotto: {e}', 'danger')
+        return redirect(url_for('amministrazione.dashboard_amministrazione'))
+
+    flash(f'Lotto #{riepilogo.id}: {riepilogo.numero_trasferte} missioni impostate su "{esito}", '
+          f'totale {riepilogo.totale:.2f} €.', 'success' if esito == 'Rimborsata' else 'warning')
+    escluse = len(trasferta_ids) - riepilogo.numero_trasferte
+    if escluse:
+        flash(f'{escluse} missioni non processate: non sono più in attesa di rimborso.', 'warning')
+    return redirect(url_for('amministrazione.dashboard_amministrazione'))
+
+
+# ====================================================================
+# STORICO AMMINISTRAZIONE (PAGINATO, TOTALI CALCOLATI IN SQL)
+# ====================================================================
+# Lo storico è letto a pagine ordinate per (data_approvazione_finale, id) decrescenti, con cursore
+# keyset come 'Mie trasferte'. I riepiloghi per mese e per dipendente sono GROUP BY sul totale spese
+# denormalizzato della trasferta, limitati a una finestra di mesi: il costo della pagina dipende
+# dalla finestra, non dagli anni di storico presenti.
+STORICO_AMMINISTRAZIONE_PER_PAGINA = 50
+STORICO_MESI_RIEPILOGO = 12
+STORICO_DIPENDENTI_RIEPILOGO = 20
+# Lotti di pagamento mostrati in cima alla dashboard
+LOTTI_RECENTI = 10
+
+
+def _leggi_filtri_storico(args):
+    """Filtri dello storico: mese (AAAA-MM), dipendente ed esito finale."""
+    try:
+        mese = datetime.strptime(args.get('mese', ''), '%Y-%m').date()
+    except ValueError:
+        mese = None
+    esito = args.get('esito') or None
+    return {
+        'mese': mese,
+        'richiedente': args.get('richiedente', type=int),
+        'esito': esito if esito in stati.FINALE else None,
+    }
+
+
+def _finestra_storico(filtri):
+    """Intervallo [inizio, fine) dei riepiloghi: i 12 mesi che terminano con il mese scelto (o il corrente)."""
+    ultimo_mese = filtri['mese'] or date.today().replace(day=1)
+    fine = mese_successivo(ultimo_mese)
+    inizio = ultimo_mese
+    for _ in range(STORICO_MESI_RIEPILOGO - 1):
+        inizio = (inizio - timedelta(days=1)).replace(day=1)
+    return inizio, fine
+
+
+def _leggi_cursore_storico(valore):
+    """Converte il parametro 'dopo' (es. '2025-03-01T10:30:00_42') in (datetime, id)."""
+    if not valore:
+        return None
+    try:
+        data_str, id_str = valore.rsplit('_', 1)
+        return datetime.fromisoformat(data_str), int(id_str)
+    except ValueError:
+        return None
+
+
+def _filtra_storico(query, filtri, dal=None, al=None):
+    """Condizioni comuni a lista e riepiloghi: solo trasferte con decisione finale datata."""
+    query = query.filter(
+        Trasferta.stato_approvazione_finale != None,
+        Trasferta.data_approvazione_finale != None
+    )
+    if filtri['esito']:
+        query = query.filter(Trasferta.stato_approvazione_finale == filtri['esito'])
+    if filtri['richiedente']:
+        query = query.filter(Trasferta.id_dipendente == filtri['richiedente'])
+    if dal:
+        query = query.filter(Trasferta.data_approvazione_finale >= datetime.combine(dal, time.min))
+    if al:
+        query = query.filter(Trasferta.data_approvazione_finale < datetime.combine(al, time.min))
+    return query
+
+
+@bp.route('/dashboard_amministrazione')
+@budget_query(7)
+@login_required
+@amministrazione_required # Proteggi l'accesso
+def dashboard_amministrazione():
+    from models import Trasferta # Assicurati che sia importato
+
+    # Le vecchie grafie ('Pronto per Rimborso', 'Rimborso Concesso') sono normalizzate una volta per
+    # tutte dalla migrazione 7b3e9f1c2a58 (stati codificati, vedi stati.py): nessuna correzione qui.
+
+    # 1. Recupera solo le missioni che il Dipartimento Finanziario deve approvare
+    # Solo "Pronta per rimborso" deve apparire qui.
+    trasferte_da_approvare = Trasferta.query.options(joinedload(Trasferta.richiedente)).filter(
+        Trasferta.stato_post_missione == 'Pronta per rimborso',
+        Trasferta.stato_approvazione_finale == None
+    ).order_by(Trasferta.giorno_missione.asc()).all()
+
+    # 2. Storico delle missioni GIA' processate: una pagina alla volta, filtrata dal database
+    filtri = _leggi_filtri_storico(request.args)
+    cursore = _leggi_cursore_storico(request.args.get('dopo'))
+    per_pagina = STORICO_AMMINISTRAZIONE_PER_PAGINA
+
+    dal_mese = filtri['mese']
+    al_mese = mese_successivo(filtri['mese']) if filtri['mese'] else None
+    query_storico = _filtra_storico(
+        Trasferta.query.options(joinedload(Trasferta.richiedente)), filtri, dal_mese, al_mese
+    )
+    if cursore:
+        data_finale, ultimo_id = cursore
+        query_storico = query_storico.filter(or_(
+            Trasferta.data_approvazione_finale < data_finale,
+            and_(Trasferta.data_approvazione_finale == data_finale, Trasferta.id < ultimo_id)
+        ))
+    risultati = query_storico.order_by(
+        Trasferta.data_approvazione_finale.desc(), Trasferta.id.desc()
+    ).limit(per_pagina + 1).all()
+
+    trasferte_storico = risultati[:per_pagina]
+    cursore_successivo = None
+    if len(risultati) > per_pagina:
+        ultima = trasferte_storico[-1]
+        cursore_successivo = f"{ultima.data_approvazione_finale.isoformat()}_{ultima.id}"
+
+    # 3. Riepiloghi calcolati dal database (GROUP BY), mai sommati in Python
+    inizio_finestra, fine_finestra = _finestra_storico(filtri)
+    anno = extract('year', Trasferta.data_approvazione_finale)
+    mese = extract('month', Trasferta.data_approvazione_finale)
+    riepilogo_mensile = _filtra_storico(
+        db.session.query(
+            anno.label('anno'), mese.label('mese'), Trasferta.stato_approvazione_finale.label('esito'),
+            func.count(Trasferta.id).label('missioni'),
+            func.coalesce(func.sum(Trasferta.totale_spese), 0).label('totale')
+        ),
+        filtri, inizio_finestra, fine_finestra
+    ).group_by(anno, mese, Trasferta.stato_approvazione_finale).order_by(anno.desc(), mese.desc()).all()
+
+    # Per dipendente: il mese scelto oppure l'intera finestra, i primi N per importo
+    riepilogo_dipendenti = _filtra_storico(
+        db.session.query(
+            Dipendente.id, Dipendente.nome, Dipendente.cognome,
+            func.count(Trasferta.id).label('missioni'),
+            func.coalesce(func.sum(Trasferta.totale_spese), 0).label('totale')
+        ).join(Dipendente, Dipendente.id == Trasferta.id_dipendente),
+        filtri, dal_mese or inizio_finestra, al_mese or fine_finestra
+    ).group_by(Dipendente.id, Dipendente.nome, Dipendente.cognome).order_by(
+        func.sum(Trasferta.totale_spese).desc()
+    ).limit(STORICO_DIPENDENTI_RIEPILOGO).all()
+
+    dipendenti_filtro = Dipendente.query.order_by(Dipendente.cognome, Dipendente.nome).all()
+
+    # 4. Ultimi lotti di pagamento (chiusure multiple)
+    lotti_recenti = LottoPagamento.query.options(joinedload(LottoPagamento.operatore)).order_by(
+        LottoPagamento.id.desc()
+    ).limit(LOTTI_RECENTI).all()
+
+    return render_template('dashboard_amministrazione.html', 
+                           lotti_recenti=lotti_recenti,
+                           esiti_lotto=list(TRANSIZIONI_LOTTO),
+                           trasferte_da_approvare=trasferte_da_approvare,
+                           trasferte_storico=trasferte_storico,
+                           filtri=filtri,
+                           esiti_filtro=stati.FINALE.etichette,
+                           dipendenti_filtro=dipendenti_filtro,
+                           cursore_corrente=cursore,
+                           cursore_successivo=cursore_successivo,
+                           riepilogo_mensile=riepilogo_mensile,
+                           riepilogo_dipendenti=riepilogo_dipendenti,
+                           inizio_finestra=inizio_finestra,
+                           ultimo_mese_finestra=fine_finestra - timedelta(days=1))
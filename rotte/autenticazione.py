@@ -0,0 +1,134 @@
+# rotte/autenticazione.py
+
+# ====================================================================
+# ROTTE DI AUTENTICAZIONE (HOME, LOGIN, REGISTRAZIONE, PASSWORD)
+# ====================================================================
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask_login import login_user, logout_user, login_required, current_user
+
+from models import db, Dipendente
+from monitoraggio import budget_query
+from utenti import incrementa_versione_utente
+import credenziali
+
+bp = Blueprint('autenticazione', __name__)
+
+
+@bp.route('/')
+@budget_query(1)
+def index():
+    if current_user.is_authenticated:
+        dirigente = None
+        
+        if current_user.ruolo == 'Dipendente':
+            
+            # --- TENTATIVO 1: VECCHIA RELAZIONE FALLITA ---
+            # if current_user.dirigente_responsabile:
+            #     dirigente = current_user.dirigente_responsabile
+            
+            # --- SOLUZIONE ATTUALE ---
+            # load_user carica già il dirigente con joinedload: nessuna query aggiuntiva
+            if current_user.id_dirigente:
+                dirigente = current_user.dirigente_responsabile
+            
+        # Passiamo l'oggetto Dirigente al template con il nome "dirigente_assegnato"
+        return render_template('index.html', user=current_user, dirigente_assegnato=dirigente) 
+        
+    return redirect(url_for('autenticazione.login'))
+
+@bp.route('/login', methods=['GET', 'POST'])
+@budget_query(2)
+def login():
+    if current_user.is_authenticated:
+        return redirect(url_for('autenticazione.index'))
+    
+    if request.method == 'POST':
+        email = request.form.get('email')
+        password = request.form.get('password')
+        
+        user = Dipendente.query.filter_by(email=email).first()
+        
+        if user and credenziali.verifica_password(user.password_hash, password):
+            login_user(user)
+            # Hash salvato con metodo o costo diversi dalla configurazione: lo si aggiorna ora
+            # (dopo login_user, che altrimenti rileggerebbe l'utente scaduto dal commit)
+            if credenziali.da_ricalcolare(user.password_hash):
+                user.password_hash = credenziali.genera_hash(password)
+                try:
+                    db.session.commit()
+                except Exception as e:
+                    db.session.rollback()
+                    current_app.logger.warning("Ricalcolo dell'hash non riuscito per l'utente %s: %s", email, e)
+            return redirect(url_for('autenticazione.index'))
+        else:
+            flash('Credenziali non valide. Riprova.', 'danger')
+            
+    return render_template('login.html')
+
+@bp.route('/logout')
+@budget_query(1)
+@login_required
+def logout():
+    logout_user()
+    flash('Sei stato disconnesso.', 'success')
+    return redirect(url_for('autenticazione.login'))
+
+@bp.route('/cambia_password', methods=['GET', 'POST'])
+@budget_query(3)
+@login_required
+def cambia_password():
+    if request.method == 'POST':
+        password_attuale = request.form.get('password_attuale')
+        nuova_password = request.form.get('nuova_password')
+        conferma_password = request.form.get('conferma_password')
+
+        # current_user è una copia in sola lettura (senza hash): si lavora sulla riga vera
+        utente = db.session.get(Dipendente, current_user.id)
+        if not credenziali.verifica_password(utente.password_hash, password_attuale):
+            flash('La password attuale non è corretta.', 'danger')
+            return redirect(url_for('autenticazione.cambia_password'))
+        
+        if nuova_password != conferma_password:
+            flash('Le nuove password non coincidono.', 'warning')
+            return redirect(url_for('autenticazione.cambia_password'))
+
+        utente.password_hash = credenziali.genera_hash(nuova_password)
+        
+        try:
+            db.session.commit()
+            incrementa_versione_utente(current_user.id)
+            flash('La tua password è stata aggiornata con successo!', 'success')
+            return redirect(url_for('autenticazione.index'))
+        except Exception as e:
+            db.session.rollback()
+            flash(f"Errore durante l'aggiornamento: {e}", 'danger')
+
+    return render_template('cambia_password.html')
+
+@bp.route('/register', methods=['GET', 'POST'])
+@budget_query(2)
+def register():
+    if request.method == 'POST':
+        nome = request.form.get('nome')
+        cognome = request.form.get('cognome')
+        email = request.form.get('email')
+        password = request.form.get('password')
+        ruolo = 'Dipendente' # request.form.get('ruolo', 'Dipendente') -> FORZATO A DIPENDENTE
+
+        if Dipendente.query.filter_by(email=email).first():
+            flash('Email già registrata.', 'warning')
+            return redirect(url_for('autenticazione.register'))
+
+        hashed_password = credenziali.genera_hash(password)
+        new_user = Dipendente(nome=nome, cognome=cognome, email=email, password_hash=hashed_password, ruolo=ruolo)
+        
+        try:
+            db.session.add(new_user)
+            db.session.commit()
+            flash(f'{ruolo} {nome} registrato con successo!', 'success')
+            return redirect(url_for('autenticazione.login'))
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Errore durante la registrazione: {e}', 'danger')
+            
+    return render_template('register.html')
@@ -0,0 +1,384 @@
+# rotte/presenze.py
+
+# ====================================================================
+# ROTTE DELL'UFFICIO PRESENZE (DASHBOARD, GRIGLIA, FLAG, EXPORT)
+# ====================================================================
+from collections import defaultdict
+from datetime import datetime, timedelta, date
+
+from flask import Blueprint, render_template, request, abort, jsonify
+from flask_login import login_required
+from sqlalchemy import and_, func, select, false, update
+from sqlalchemy.orm import joinedload, noload
+
+from models import db, Dipendente, Trasferta, Spesa
+from monitoraggio import budget_query
+from autorizzazioni import presenze_required
+from filtri_trasferte import (STATI_FILTRO_MIE_TRASFERTE, leggi_filtri_mie_trasferte, applica_filtri_trasferte,
+                              mese_successivo)
+import stati
+
+bp = Blueprint('presenze', __name__)
+
+# ====================================================================
+# EXPORT CSV PRESENZE (STREAMING)
+# ====================================================================
+# Le trasferte sono lette a blocchi (yield_per) e le righe CSV inviate man mano che vengono
+# prodotte: la memoria del worker resta costante e i primi byte partono subito.
+# Le spese di ogni blocco sono lette con un solo IN: 500 id restano sotto i limiti di parametri di ogni database.
+# csv, export_presenze ed export_colonnare (pyarrow) sono importati dalle rotte alla prima
+# richiesta di export, non all'avvio.
+EXPORT_RIGHE_PER_BLOCCO = 500
+
+
+@bp.route('/export_csv_presenze')
+@budget_query(2, per_blocco=1, righe_per_blocco=EXPORT_RIGHE_PER_BLOCCO)
+@login_required
+@presenze_required
+def export_csv_presenze():
+    import csv
+    import io
+    from flask import Response, stream_with_context
+    import export_presenze
+
+    # Stessi filtri della lista missioni (?dal=&al=&stato=&richiedente=), applicati in SQL:
+    # esportare un mese legge solo le righe di quel mese
+    filtri = leggi_filtri_mie_trasferte(request.args)
+
+    # Solo relazioni a un valore nello stesso SELECT: le spese, che moltiplicherebbero le righe,
+    # sono lette a parte con una query per blocco
+    query = applica_filtri_trasferte(Trasferta.query.options(
+        joinedload(Trasferta.richiedente),
+        joinedload(Trasferta.approvatore_pre),
+        joinedload(Trasferta.approvatore_post),
+        noload(Trasferta.spese)
+    ), filtri).order_by(Trasferta.giorno_missione.desc(), Trasferta.id.desc()).yield_per(EXPORT_RIGHE_PER_BLOCCO)
+
+    def genera_csv():
+        si = io.StringIO()
+        cw = csv.writer(si, delimiter=';') # Usa punto e virgola per compatibilità Excel IT
+
+        def svuota():
+            contenuto = si.getvalue()
+            si.seek(0)
+            si.truncate(0)
+            return contenuto
+
+        def scrivi_blocco(blocco):
+            spese = export_presenze.spese_per_trasferta([t.id for t in blocco])
+            for t in blocco:
+                cw.writerow(export_presenze.riga(t, spese.get(t.id)))
+            return svuota()
+
+        # Le intestazioni partono prima ancora di interrogare il database
+        cw.writerow(export_presenze.INTESTAZIONI)
+        yield svuota()
+
+        blocco = []
+        for t in query:
+            blocco.append(t)
+            if len(blocco) == EXPORT_RIGHE_PER_BLOCCO:
+                yield scrivi_blocco(blocco)
+                blocco = []
+        if blocco:
+            yield scrivi_blocco(blocco)
+
+    nome_file = "export_missioni_completo.csv"
+    if filtri['dal'] or filtri['al']:
+        nome_file = "export_missioni_{}_{}.csv".format(
+            filtri['dal'].isoformat() if filtri['dal'] else 'inizio',
+            filtri['al'].isoformat() if filtri['al'] else 'oggi'
+        )
+
+    output = Response(stream_with_context(genera_csv()))
+    output.headers["Content-Disposition"] = f"attachment; filename={nome_file}"
+    output.headers["Content-type"] = "text/csv; charset=utf-8-sig" # UTF-8 con BOM per Excel
+    return output
+
+@bp.route('/export_parquet_presenze')
+@budget_query(2)
+@login_required
+@presenze_required
+def export_parquet_presenze():
+    """
+    Export colonnare tipizzato (vedi export_colonnare.py). ?tabella=trasferte (default) o spese,
+    con gli stessi filtri dell'export CSV; le due tabelle si collegano su id_trasferta.
+    """
+    from flask import Response, stream_with_context
+    import export_colonnare
+
+    filtri = leggi_filtri_mie_trasferte(request.args)
+    tabella = request.args.get('tabella', 'trasferte')
+    if tabella == 'trasferte':
+        stmt = export_colonnare.select_trasferte()
+        colonne = export_colonnare.COLONNE_TRASFERTE
+        ordine = (Trasferta.giorno_missione.desc(), Trasferta.id.desc())
+    elif tabella == 'spese':
+        stmt = export_colonnare.select_spese()
+        colonne = export_colonnare.COLONNE_SPESE
+        ordine = (Spesa.id_trasferta, Spesa.id)
+    else:
+        abort(400)
+    stmt = applica_filtri_trasferte(stmt, filtri).order_by(*ordine)
+
+    nome_file = f"export_{tabella}"
+    if filtri['dal'] or filtri['al']:
+        nome_file += "_{}_{}".format(
+            filtri['dal'].isoformat() if filtri['dal'] else 'inizio',
+            filtri['al'].isoformat() if filtri['al'] else 'oggi'
+        )
+
+    output = Response(stream_with_context(export_colonnare.genera_parquet(stmt, colonne)),
+                      mimetype='application/vnd.apache.parquet')
+    output.headers["Content-Disposition"] = f"attachment; filename={nome_file}.parquet"
+    return output
+
+
+# =========================================================================================
+# DASHBOARD PRESENZE
+# =========================================================================================
+# La pagina non contiene più le righe: la tabella virtualizzata le chiede a blocchi a
+# /api/presenze/griglia, che ordina, filtra e conta nel database. Il browser riceve e
+# disegna solo le righe visibili, qualunque sia la dimensione dello storico.
+GRIGLIA_PRESENZE_MAX_RIGHE = 200
+
+_NOME_DIPENDENTE_GRIGLIA = Dipendente.cognome + ' ' + Dipendente.nome
+
+# Colonne ordinabili: chiave usata dal client -> espressioni ORDER BY (l'id chiude sempre i pari merito)
+ORDINAMENTI_GRIGLIA_PRESENZE = {
+    'id': [Trasferta.id],
+    'dipendente': [Dipendente.cognome, Dipendente.nome],
+    'giorno': [Trasferta.giorno_missione],
+    'destinazione': [Trasferta.missione_presso],
+    'motivo': [Trasferta.motivo_missione],
+    'spese': [Trasferta.totale_spese],
+    'extra_orario': [Trasferta.extra_orario],
+    'pasto': [Trasferta.richiesta_pausa_pranzo],
+    'stato': [Trasferta.stato_post_missione],
+}
+
+# Filtri testuali "contiene" (case-insensitive)
+FILTRI_TESTO_GRIGLIA_PRESENZE = {
+    'dipendente': _NOME_DIPENDENTE_GRIGLIA,
+    'destinazione': Trasferta.missione_presso,
+    'motivo': Trasferta.motivo_missione,
+    'extra_orario': Trasferta.extra_orario,
+    'pasto': Trasferta.richiesta_pausa_pranzo,
+}
+
+
+def _filtro_giorno_griglia(valore):
+    """'gg/mm/aaaa', 'mm/aaaa' o 'aaaa' -> intervallo su giorno_missione (usa l'indice per data)."""
+    for formato, fine in (('%d/%m/%Y', lambda d: d + timedelta(days=1)),
+                          ('%m/%Y', mese_successivo),
+                          ('%Y', lambda d: date(d.year + 1, 1, 1))):
+        try:
+            inizio = datetime.strptime(valore, formato).date()
+        except ValueError:
+            continue
+        return and_(Trasferta.giorno_missione >= inizio, Trasferta.giorno_missione < fine(inizio))
+    return false()
+
+
+def _condizioni_griglia_presenze(args):
+    """Filtri di colonna della griglia (parametri f_<colonna>) tradotti in condizioni SQL."""
+    condizioni = []
+    for chiave, colonna in FILTRI_TESTO_GRIGLIA_PRESENZE.items():
+        valore = (args.get(f'f_{chiave}') or '').strip()
+        if valore:
+            condizioni.append(colonna.icontains(valore, autoescape=True))
+
+    valore = (args.get('f_id') or '').strip()
+    if valore:
+        condizioni.append(Trasferta.id == int(valore) if valore.isdigit() else false())
+
+    valore = (args.get('f_giorno') or '').strip()
+    if valore:
+        condizioni.append(_filtro_giorno_griglia(valore))
+
+    valore = (args.get('f_spese') or '').strip().replace(',', '.')
+    if valore:
+        try:
+            condizioni.append(Trasferta.totale_spese >= float(valore))
+        except ValueError:
+            condizioni.append(false())
+
+    valore = args.get('f_stato') or ''
+    if valore:
+        condizioni.append(Trasferta.stato_post_missione == valore if valore in stati.POST else false())
+
+    for campo in ('gestito_presenze', 'nbp'):
+        valore = args.get(f'f_{campo}')
+        if valore in ('1', '0'):
+            condizioni.append(getattr(Trasferta, campo).is_(valore == '1'))
+    return condizioni
+
+
+@bp.route('/dashboard_presenze')
+@budget_query(2)
+@login_required
+@presenze_required
+def dashboard_presenze():
+    # Dipendenti selezionabili nel filtro dell'export
+    dipendenti_export = Dipendente.query.order_by(Dipendente.cognome, Dipendente.nome).all()
+    return render_template('dashboard_presenze.html',
+                           stati_filtro=STATI_FILTRO_MIE_TRASFERTE,
+                           stati_griglia=stati.POST.etichette,
+                           dipendenti_export=dipendenti_export,
+                           righe_per_blocco=GRIGLIA_PRESENZE_MAX_RIGHE,
+                           max_modifiche_flag=FLAG_PRESENZE_MAX_MODIFICHE)
+
+
+@bp.route('/api/presenze/griglia')
+@budget_query(3)
+@login_required
+@presenze_required
+def griglia_presenze():
+    """
+    Finestra di righe per la tabella virtualizzata di dashboard_presenze.
+    Parametri: offset, limit (max GRIGLIA_PRESENZE_MAX_RIGHE), ordina (chiave di
+    ORDINAMENTI_GRIGLIA_PRESENZE), verso (asc/desc) e i filtri f_<colonna>.
+    """
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), GRIGLIA_PRESENZE_MAX_RIGHE)
+    ordina = request.args.get('ordina', 'giorno')
+    if ordina not in ORDINAMENTI_GRIGLIA_PRESENZE:
+        return jsonify({'error': 'Colonna di ordinamento non valida'}), 400
+    discendente = request.args.get('verso', 'desc') != 'asc'
+
+    condizioni = _condizioni_griglia_presenze(request.args)
+
+    # Totale delle righe filtrate (serve al client per dimensionare lo scroll)
+    totale = db.session.execute(
+        select(func.count(Trasferta.id))
+        .join(Dipendente, Dipendente.id == Trasferta.id_dipendente)
+        .where(*condizioni)
+    ).scalar()
+
+    # Solo le colonne mostrate, solo la finestra richiesta
+    ordine = ORDINAMENTI_GRIGLIA_PRESENZE[ordina] + [Trasferta.id]
+    righe = db.session.execute(
+        select(
+            Trasferta.id, _NOME_DIPENDENTE_GRIGLIA.label('dipendente'), Trasferta.giorno_missione,
+            Trasferta.missione_presso, Trasferta.motivo_missione, Trasferta.totale_spese,
+            Trasferta.extra_orario, Trasferta.richiesta_pausa_pranzo, Trasferta.stato_post_missione,
+            Trasferta.gestito_presenze, Trasferta.nbp
+        )
+        .join(Dipendente, Dipendente.id == Trasferta.id_dipendente)
+        .where(*condizioni)
+        .order_by(*[c.desc() if discendente else c.asc() for c in ordine])
+        .offset(offset).limit(limit)
+    ).all()
+
+    return jsonify({
+        'totale': totale,
+        'offset': offset,
+        'righe': [{
+            'id': r.id,
+            'dipendente': r.dipendente,
+            'giorno': r.giorno_missione.strftime('%d/%m/%Y'),
+            'destinazione': r.missione_presso,
+            'motivo': r.motivo_missione,
+            'spese': r.totale_spese,
+            'extra_orario': r.extra_orario,
+            'pasto': r.richiesta_pausa_pranzo,
+            'stato': r.stato_post_missione,
+            'gestito_presenze': bool(r.gestito_presenze),
+            'nbp': bool(r.nbp),
+        } for r in righe],
+    })
+
+@bp.route('/api/update_presenze_status', methods=['POST'])
+@budget_query(3)
+@login_required
+@presenze_required
+def update_presenze_status():
+    data = request.get_json()
+    trasferta_id = data.get('trasferta_id')
+    field = data.get('field')
+    value = data.get('value')
+
+    if not all([trasferta_id, field]):
+        return jsonify({'error': 'Dati mancanti'}), 400
+
+    trasferta = Trasferta.query.get(trasferta_id)
+    if not trasferta:
+        return jsonify({'success': False, 'error': 'Trasferta non trovata'}), 404
+
+    try:
+        if field == 'gestito_presenze':
+            trasferta.gestito_presenze = bool(value)
+        elif field == 'nbp':
+            trasferta.nbp = bool(value)
+        else:
+            return jsonify({'success': False, 'error': 'Campo non valido'}), 400
+
+        db.session.commit()
+        return jsonify({'success': True})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# Flag di Presenze modificabili dalla dashboard, anche in blocco
+CAMPI_FLAG_PRESENZE = ('gestito_presenze', 'nbp')
+# Massimo numero di modifiche per richiesta: tiene limitate le liste IN (...) degli UPDATE
+FLAG_PRESENZE_MAX_MODIFICHE = 1000
+
+
+@bp.route('/api/presenze/flag_bulk', methods=['POST'])
+@budget_query(6)
+@login_required
+@presenze_required
+def update_presenze_status_bulk():
+    """
+    Applica in una sola transazione una lista di modifiche ai flag di Presenze:
+    {"modifiche": [{"trasferta_id": 12, "field": "nbp", "value": true}, ...]}.
+    Le modifiche sono raggruppate per (campo, valore): al massimo un UPDATE ... WHERE id IN (...)
+    per gruppo, quindi 4 statement qualunque sia il numero di caselle spuntate.
+    Se una trasferta non esiste non viene applicato nulla.
+    """
+    data = request.get_json(silent=True) or {}
+    modifiche = data.get('modifiche')
+    if not isinstance(modifiche, list) or not modifiche:
+        return jsonify({'success': False, 'error': 'Dati mancanti'}), 400
+    if len(modifiche) > FLAG_PRESENZE_MAX_MODIFICHE:
+        return jsonify({'success': False,
+                        'error': f'Troppe modifiche (massimo {FLAG_PRESENZE_MAX_MODIFICHE})'}), 400
+
+    # L'ultima modifica per (trasferta, campo) vince, come se i clic fossero arrivati uno alla volta
+    valori = {}
+    for modifica in modifiche:
+        if not isinstance(modifica, dict):
+            return jsonify({'success': False, 'error': 'Dati mancanti'}), 400
+        try:
+            trasferta_id = int(modifica.get('trasferta_id'))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'ID trasferta non valido'}), 400
+        field = modifica.get('field')
+        if field not in CAMPI_FLAG_PRESENZE:
+            return jsonify({'success': False, 'error': 'Campo non valido'}), 400
+        valori[(trasferta_id, field)] = bool(modifica.get('value'))
+
+    ids = {trasferta_id for trasferta_id, _ in valori}
+    esistenti = set(db.session.execute(select(Trasferta.id).where(Trasferta.id.in_(ids))).scalars())
+    mancanti = sorted(ids - esistenti)
+    if mancanti:
+        return jsonify({'success': False, 'error': 'Trasferta non trovata', 'mancanti': mancanti}), 404
+
+    gruppi = defaultdict(list)
+    for (trasferta_id, field), valore in valori.items():
+        gruppi[(field, valore)].append(trasferta_id)
+
+    try:
+        for (field, valore), ids_gruppo in gruppi.items():
+            db.session.execute(
+                update(Trasferta)
+                .where(Trasferta.id.in_(ids_gruppo))
+                .values({field: valore, 'versione': Trasferta.versione + 1})
+                .execution_options(synchronize_session=False)
+            )
+        db.session.commit()
+        return jsonify({'success': True, 'aggiornate': len(valori)})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
@@ -0,0 +1,344 @@
+# rotte/superuser.py
+
+# ====================================================================
+# ROTTE DEL SUPERUSER (UTENTI, RUOLI, MISSIONI, PRESTAZIONI)
+# ====================================================================
+from datetime import datetime
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, current_app
+from flask_login import login_required, current_user
+from sqlalchemy.orm import joinedload
+
+from models import db, Dipendente, Trasferta, ricalcola_lotto
+from monitoraggio import budget_query
+from autorizzazioni import superuser_required
+from cache_modali import invalida_cache_modali
+from utenti import incrementa_versione_utente
+import monitoraggio
+import credenziali
+import concorrenza
+import profili_db
+import stati
+
+bp = Blueprint('superuser', __name__)
+
+
+@bp.route('/associa_dirigente.html')
+@budget_query(6)
+def associa_dirigente_script():
+    # Trova gli utenti per ID
+    rossi = Dipendente.query.get(1) # Mario Rossi, ID 1 (Dirigente)
+    bianchi = Dipendente.query.get(2) # Luigi Bianchi, ID 2
+    verdi = Dipendente.query.get(3) # Andrea Verdi, ID 3 (Delegato)
+
+    if rossi and bianchi and verdi:
+        aggiornati = []
+        # Associazione Bianchi a Rossi (Dovrebbe essere già fatta)
+        if bianchi.id_dirigente != rossi.id:
+            bianchi.id_dirigente = rossi.id
+            db.session.add(bianchi)
+            aggiornati.append(bianchi.id)
+            
+        # *** ASSOCIAZIONE DI VERDI A ROSSI (NUOVA) ***
+        if verdi.id_dirigente != rossi.id:
+            verdi.id_dirigente = rossi.id
+            db.session.add(verdi)
+            aggiornati.append(verdi.id)
+        # **********************************************
+        
+        db.session.commit()
+        for dipendente_id in aggiornati:
+            incrementa_versione_utente(dipendente_id)
+        
+        return f"""
+            <h1>Configurazione Iniziale Completata</h1>
+            <p>✅ ASSEGNAZIONE RIUSCITA DEFINITIVA: Mario Rossi (ID: {rossi.id}) assegnato a Luigi Bianchi (ID: {bianchi.id}). VERIFICA: id_dirigente è ora {rossi.id}</p>
+            <p>✅ NUOVA ASSOCIAZIONE RIUSCITA: Mario Rossi (ID: {rossi.id}) assegnato a Andrea Verdi (ID: {verdi.id}). VERIFICA: id_dirigente è ora {rossi.id}</p>
+            <p><a href="/">Torna alla Home</a></p>
+        """
+    
+    return "Associazione Fallita o Utenti non trovati."
+
+
+@bp.route('/associa_dirigente', methods=['GET', 'POST'])
+@budget_query(3)
+@login_required
+# Utilizza il tuo decorator se definito: @ruolo_richiesto(['Amministrazione'])
+def associa_dirigente():
+    
+    # Controllo di Sicurezza (ridondante se il decorator è attivo, ma utile)
+    if current_user.ruolo != 'Superuser':
+        flash('Accesso negato: solo il Superuser può gestire le associazioni.', 'danger')
+        # Assicurati che 'dashboard' sia un endpoint valido
+        return redirect(url_for('workflow.mie_trasferte')) 
+
+    # --- CARICAMENTO DATI PER IL TEMPLATE (METODO GET) ---
+    
+    # 1. Dipendenti da listare e assegnare (tutti tranne Amministrazione)
+    # Usiamo joinedload per caricare in modo efficiente il dirigente attuale (d.dirigente_responsabile)
+    dipendenti = Dipendente.query.options(db.joinedload(Dipendente.dirigente_responsabile)).filter(
+        Dipendente.ruolo != 'Amministrazione'
+    ).order_by(Dipendente.cognome).all()
+    
+    # 2. Utenti che possono essere Dirigenti (Target della relazione)
+    # Carichiamo anche l'Amministrazione in questa lista, se può approvare
+    dirigenti = Dipendente.query.filter(
+        Dipendente.ruolo.in_(['Dirigente', 'Amministrazione'])
+    ).order_by(Dipendente.cognome).all()
+
+    # ----------------------------------------------------------------------
+    
+    if request.method == 'POST':
+        # 1. Ottieni e converti i dati dal form
+        dipendente_id = request.form.get('dipendente_id', type=int) 
+        dirigente_id_str = request.form.get('dirigente_id')
+        
+        dipendente = Dipendente.query.get(dipendente_id)
+        
+        # 2. Validazione base
+        if not dipendente:
+            flash('Dipendente selezionato non valido.', 'danger')
+            return redirect(url_for('superuser.associa_dirigente'))
+        
+        dipendente_assegnato_nome = f"{dipendente.nome} {dipendente.cognome}" # Nome completo del sottoposto
+
+        dirigente_nome = "Nessuno"
+        
+        # 3. Logica di Assegnazione/Rimozione
+        if dirigente_id_str == '0':
+            # Rimuovi l'assegnazione
+            dipendente.id_dirigente = None
+            # dirigente_nome è già "Nessuno"
+        else:
+            # Assegna un dirigente
+            dirigente_id = int(dirigente_id_str)
+            dirigente = Dipendente.query.get(dirigente_id)
+            
+            if dirigente:
+                # Controllo anti-ciclico: un dipendente non può supervisionare sé stesso
+                 
+                # *** MODIFICA QUI: CONSENTI L'AUTO-ASSEGNAZIONE AI DIRIGENTI ***
+                 # 1. L'ID del sottoposto è uguale all'ID del dirigente?
+                is_self_assignment = (dipendente.id == dirigente.id)
+
+                # 2. Se è auto-assegnazione, CONTROLLA IL RUOLO
+                if is_self_assignment:
+                    # Permetti l'auto-assegnazione SOLO se il sottoposto è un Dirigente
+                    if dipendente.ruolo == 'Dirigente':
+                        # Se è un Dirigente che si auto-assegna, permetti l'azione (Passa)
+                        pass 
+                    else:
+                        # Se è un normale Dipendente che cerca di auto-assegnarsi, blocca
+                        flash(f'Errore: {dipendente_assegnato_nome} non può essere il dirigente di sé stesso.', 'danger')
+                        return redirect(url_for('superuser.associa_dirigente'))
+
+                # Se non c'è stata interruzione, prosegui con l'assegnazione
+                dipendente.id_dirigente = dirigente.id
+                dirigente_nome = f"{dirigente.nome} {dirigente.cognome}" # Nome completo del dirigente
+            else:
+                flash('Dirigente selezionato non valido.', 'danger')
+                return redirect(url_for('superuser.associa_dirigente'))
+
+        # 4. Commit
+        try:
+            db.session.commit()
+            incrementa_versione_utente(dipendente_id)
+            flash(f'{dipendente_assegnato_nome} è stato assegnato al dirigente {dirigente_nome}.', 'success')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Errore di database durante l\'assegnazione: {e}', 'danger')
+
+        return redirect(url_for('superuser.associa_dirigente'))
+
+    # ----------------------------------------------------------------------
+
+    # Metodo GET: Rendering del template
+    return render_template('associa_dirigente.html', 
+                            dipendenti=dipendenti, 
+                            dirigenti=dirigenti)
+
+
+@bp.route('/dashboard_superuser')
+@budget_query(1)
+@login_required
+@superuser_required
+def dashboard_superuser():
+    # Dashboard principale: solo menu di navigazione
+    return render_template('dashboard_superuser.html')
+
+@bp.route('/dashboard_superuser/missioni')
+@budget_query(2)
+@login_required
+@superuser_required
+def dashboard_superuser_missioni():
+    from models import Trasferta
+    trasferte = Trasferta.query.options(joinedload(Trasferta.richiedente)).order_by(Trasferta.id.desc()).all()
+    return render_template('dashboard_superuser_missioni.html', trasferte=trasferte)
+
+# Compatibilità per URL errati/vecchi
+@bp.route('/dashboard_superuser_missioni')
+@budget_query(1)
+@login_required
+@superuser_required
+def dashboard_superuser_missioni_legacy():
+    return redirect(url_for('superuser.dashboard_superuser_missioni'))
+
+@bp.route('/dashboard_superuser/utenti')
+@budget_query(2)
+@login_required
+@superuser_required
+def dashboard_superuser_utenti():
+    from models import Dipendente
+    dipendenti = Dipendente.query.order_by(Dipendente.cognome.asc()).all()
+    return render_template('dashboard_superuser_utenti.html', dipendenti=dipendenti)
+
+@bp.route('/dashboard_superuser/prestazioni')
+@budget_query(1)
+@login_required
+@superuser_required
+def dashboard_superuser_prestazioni():
+    # Riepilogo delle ultime richieste servite da QUESTO processo (ogni worker ha il suo)
+    return render_template('dashboard_superuser_prestazioni.html',
+                           righe=monitoraggio.riepilogo.per_endpoint(),
+                           richieste_lente=sorted(monitoraggio.riepilogo.misure(),
+                                                  key=lambda m: m['durata_ms'], reverse=True)[:20],
+                           hashing=credenziali.pool.statistiche(),
+                           profilo_db=current_app.config['DB_PROFILO'],
+                           modalita_worker=concorrenza.modalita_worker(),
+                           pool_db=profili_db.statistiche.riepilogo(db.engine.pool),
+                           attivo=current_app.config['MONITORAGGIO_ATTIVO'])
+
+
+@bp.route('/aggiorna_ruolo/<int:dipendente_id>', methods=['POST'])
+@budget_query(3)
+@login_required
+@superuser_required
+def aggiorna_ruolo(dipendente_id):
+    from models import Dipendente
+    dipendente = Dipendente.query.get_or_404(dipendente_id)
+    
+    nuovo_ruolo = request.form.get('nuovo_ruolo')
+    if nuovo_ruolo in ['Dipendente', 'Dirigente', 'Amministrazione', 'Presenze', 'Superuser']:
+        dipendente.ruolo = nuovo_ruolo
+        try:
+            db.session.commit()
+            incrementa_versione_utente(dipendente_id)
+            flash(f'Ruolo di {dipendente.nome} {dipendente.cognome} aggiornato a {nuovo_ruolo}.', 'success')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Errore durante l\'aggiornamento: {e}', 'danger')
+    else:
+        flash('Ruolo non valido.', 'warning')
+        
+    return redirect(url_for('superuser.dashboard_superuser_utenti')) # Correggo anche il redirect qui per tornare alla lista
+
+@bp.route('/admin_reset_password/<int:dipendente_id>', methods=['POST'])
+@budget_query(4)
+@login_required
+@superuser_required
+def admin_reset_password(dipendente_id):
+    from models import Dipendente
+    dipendente = Dipendente.query.get_or_404(dipendente_id)
+    
+    nuova_password = request.form.get('nuova_password')
+    
+    if nuova_password and len(nuova_password) >= 4:
+        dipendente.password_hash = credenziali.genera_hash(nuova_password)
+        try:
+            db.session.commit()
+            incrementa_versione_utente(dipendente_id)
+            flash(f'Password per {dipendente.nome} {dipendente.cognome} reimpostata con successo.', 'success')
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Errore durante il reset password: {e}', 'danger')
+    else:
+        flash('Password troppo corta o mancante.', 'warning')
+        
+    return redirect(url_for('superuser.dashboard_superuser_utenti'))
+
+
+@bp.route('/superuser/modifica_stato_missione', methods=['POST'])
+@budget_query(5)
+@login_required
+@superuser_required
+def superuser_modifica_stato_missione():
+    trasferta_id = request.form.get('trasferta_id')
+    nuovo_stato_pre = request.form.get('stato_pre_missione')
+    nuovo_stato_post = request.form.get('stato_post_missione')
+
+    if not trasferta_id:
+        flash('ID Missione mancante.', 'danger')
+        return redirect(url_for('superuser.dashboard_superuser'))
+
+    if nuovo_stato_pre not in stati.PRE or nuovo_stato_post not in stati.POST:
+        flash('Stato non valido.', 'danger')
+        return redirect(url_for('superuser.dashboard_superuser_missioni'))
+    nuovo_stato_pre = stati.PRE.normalizza(nuovo_stato_pre)
+    nuovo_stato_post = stati.POST.normalizza(nuovo_stato_post)
+
+    trasferta = Trasferta.query.get(trasferta_id)
+    if not trasferta:
+        flash('Missione non trovata.', 'danger')
+        return redirect(url_for('superuser.dashboard_superuser'))
+
+    # Logica di aggiornamento
+    vecchio_pre = trasferta.stato_pre_missione
+    vecchio_post = trasferta.stato_post_missione
+    vecchio_finale = trasferta.stato_approvazione_finale
+    
+    trasferta.stato_pre_missione = nuovo_stato_pre
+    trasferta.stato_post_missione = nuovo_stato_post
+    
+    # ----------------------------------------------------
+    # FIX: Sincronizzazione stato_approvazione_finale
+    # ----------------------------------------------------
+    # Se il superuser imposta manualmente uno stato finale, aggiorniamo anche il flag finale.
+    # Se imposta uno stato intermedio (es. "Pronta per rimborso"), RESETTIAMO il flag finale
+    # affinché la missione riappaia nella dashboard Amministrazione come "Da Approvare".
+    
+    if nuovo_stato_post == 'Rimborsata':
+        trasferta.stato_approvazione_finale = 'Rimborsata'
+        # Se manca la data, la mettiamo ora
+        if not trasferta.data_approvazione_finale:
+             trasferta.data_approvazione_finale = datetime.now()
+             
+    elif nuovo_stato_post == 'Non rimborsata':
+        trasferta.stato_approvazione_finale = 'Non rimborsata'
+        if not trasferta.data_approvazione_finale:
+             trasferta.data_approvazione_finale = datetime.now()
+             
+    else:
+        # Qualsiasi altro stato (In attesa, Pronta per rimborso, N/A, ecc.)
+        # NON è considerato finale dal punto di vista dell'amministrazione.
+        # Quindi resettiamo i campi finali.
+        trasferta.stato_approvazione_finale = None
+        trasferta.data_approvazione_finale = None
+        trasferta.id_approvatore_finale = None
+
+    # Una missione che cambia esito esce dal lotto di pagamento con cui era stata chiusa:
+    # i totali del lotto vanno ricalcolati nella stessa transazione
+    lotto_da_ricalcolare = None
+    if trasferta.id_lotto_pagamento is not None and trasferta.stato_approvazione_finale != vecchio_finale:
+        lotto_da_ricalcolare = trasferta.id_lotto_pagamento
+        trasferta.id_lotto_pagamento = None
+
+    # Opzionale: Aggiungi una nota automatica
+    nota_audit = f"\n[SUPERUSER AUDIT {datetime.now().strftime('%Y-%m-%d %H:%M')}] Stati modificati manualmente da {current_user.nome} {current_user.cognome}. Pre: {vecchio_pre}->{nuovo_stato_pre}, Post: {vecchio_post}->{nuovo_stato_post}."
+    if trasferta.note_premissione:
+        trasferta.note_premissione += nota_audit
+    else:
+        trasferta.note_premissione = nota_audit
+
+    try:
+        if lotto_da_ricalcolare is not None:
+            db.session.flush()
+            ricalcola_lotto(lotto_da_ricalcolare)
+        db.session.commit()
+        # Libera subito i frammenti ormai superati (il controllo della versione li scarterebbe comunque)
+        invalida_cache_modali(trasferta.id)
+        flash(f'Stati missione #{trasferta.id} aggiornati con successo. (Pre: {nuovo_stato_pre}, Post: {nuovo_stato_post})', 'success')
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Errore aggiornamento stati: {e}', 'danger')
+
+    return redirect(url_for('superuser.dashboard_superuser_missioni'))
@@ -0,0 +1,1181 @@
+# rotte/workflow.py
+
+# ====================================================================
+# ROTTE DEL WORKFLOW DELLE TRASFERTE
+# ====================================================================
+# Richiesta, approvazione pre-missione, rendiconto e spese, approvazione post-missione,
+# deleghe, dettagli e report: tutto ciò che dipendenti, dirigenti e delegati usano.
+from datetime import datetime, timedelta, date, timezone
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, jsonify
+from flask_login import login_required, current_user
+from sqlalchemy import or_, and_, select
+from sqlalchemy.orm import joinedload, selectinload
+
+from models import db, Dipendente, Trasferta, Delega, Spesa
+from monitoraggio import budget_query
+from autorizzazioni import deleganti_coperti, is_authorized_approver, dirigente_required
+from cache_modali import (FASI_MODALE, leggi_cache_modale, salva_cache_modale, risposta_modale,
+                          revisione_template_modali)
+from filtri_trasferte import (MIE_TRASFERTE_PER_PAGINA, STATI_FILTRO_MIE_TRASFERTE, leggi_cursore, scrivi_cursore,
+                              leggi_filtri_mie_trasferte, applica_filtri_e_cursore)
+from transizioni import esegui_transizione, esegui_transizioni
+
+bp = Blueprint('workflow', __name__)
+
+
+@bp.route('/revoca_delega/<int:delega_id>', methods=['POST'])
+@budget_query(5)
+@login_required
+@dirigente_required
+def revoca_delega(delega_id):
+    from datetime import date, timedelta
+    from models import Delega, db 
+
+    delega = Delega.query.get_or_404(delega_id)
+
+    # 1. Autorizzazione (invariata)
+    if delega.id_delegante != current_user.id:
+        flash('Non sei autorizzato a revocare questa delega.', 'danger')
+        return redirect(url_for('workflow.gestisci_deleghe'))
+        
+    oggi = date.today()
+    ieri = oggi - timedelta(days=1)
+    
+    # ======================================================================
+    # 2. LOGICA DI GESTIONE E REVOCA
+    # ======================================================================
+
+    try:
+        if delega.data_inizio > oggi:
+            # CASO A: Delega futura (Non ancora iniziata) -> ANNULLAMENTO COMPLETO
+            
+            # Annulliamo/Cancelliamo la delega. Questo è più pulito che impostare date finte.
+            db.session.delete(delega)
+            messaggio = "Delega FUTURA (non ancora iniziata) annullata con successo."
+            
+        elif delega.data_fine is not None and delega.data_fine < oggi:
+            # CASO B: Delega già scaduta
+            messaggio = "Questa delega è già scaduta e non necessita di revoca manuale."
+            flash(messaggio, 'warning')
+            return redirect(url_for('workflow.gestisci_deleghe'))
+
+        else:
+            # CASO C: Delega Attiva (In corso o Permanente) -> REVOCA IMMEDIATA
+            
+            # Imposta la data di fine a IERI, in modo che la delega sia inattiva OGGI
+            delega.data_fine = ieri
+            db.session.commit()
+            messaggio = f"Delega a {delega.delegato.nome} revocata con successo e disattivata immediatamente."
+        
+        # Se siamo nel CASO A o CASO C, esegui il commit
+        db.session.commit()
+        flash(messaggio, 'success')
+
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Errore nel processo di revoca/annullamento della delega: {e}', 'danger')
+        
+    return redirect(url_for('workflow.gestisci_deleghe'))
+
+
+@bp.route('/get_modale_content/<int:trasferta_id>/<string:fase>')
+@budget_query(4)
+@login_required
+def get_modale_content(trasferta_id, fase):
+    if fase not in FASI_MODALE:
+        return jsonify({'error': 'Fase non riconosciuta.'}), 400
+
+    readonly_mode = request.args.get('readonly') == 'true'
+    chiave = (trasferta_id, fase, readonly_mode)
+
+    # 1. Basta la versione per sapere se il frammento in cache è ancora valido: anche una
+    #    missione conclusa può ricevere nuove spese o un nuovo stato, magari da un altro processo
+    versione = db.session.execute(
+        select(Trasferta.versione).where(Trasferta.id == trasferta_id)
+    ).scalar()
+    if versione is None:
+        abort(404)
+    voce = leggi_cache_modale(chiave)
+    if voce is not None and voce['versione'] == versione:
+        return risposta_modale(voce)
+
+    # 2. Generazione del frammento
+    trasferta = Trasferta.query.options(joinedload(Trasferta.richiedente)).get_or_404(trasferta_id)
+
+    if fase == 'pre':
+        corpo = render_template('_modale_pre.html', trasferta=trasferta, fase=fase, readonly_mode=readonly_mode)
+
+    else:
+        # rendiconto - per il dipendente: mostra dati effettivi e spese da completare/revisionare
+        # rimborso   - per il dirigente: mostra dati effettivi e spese per l'approvazione finale
+        spese = Spesa.query.filter_by(id_trasferta=trasferta_id).all()
+        # Calcolo del totale per la visualizzazione nel modale
+        totale_spese = sum(spesa.importo for spesa in spese)
+
+        corpo = render_template('_modale_rendiconto.html',
+                                trasferta=trasferta,
+                                spese=spese,
+                                totale_spese=totale_spese,
+                                fase=fase,
+                                readonly_mode=readonly_mode)
+
+    voce = {
+        'versione': versione,
+        'etag': f"modale-{trasferta_id}-{fase}-{int(readonly_mode)}-v{versione}-{revisione_template_modali()}",
+        # Last-Modified ha la risoluzione del secondo
+        'generato': datetime.now(timezone.utc).replace(microsecond=0),
+        'corpo': corpo,
+    }
+    salva_cache_modale(chiave, voce)
+    return risposta_modale(voce)
+
+
+@bp.route('/gestisci_deleghe', methods=['GET', 'POST'])
+@budget_query(5)
+@login_required
+def gestisci_deleghe():
+    # --- PREPARAZIONE DATI PER IL TEMPLATE (NECESSARI ANCHE IN CASO DI ERRORE POST) ---
+    oggi = date.today()
+    
+    # 1. Inizializzazione del Form
+    from forms import DelegaForm # Assicurati che il tuo form sia importato
+    form = DelegaForm() 
+
+    # 2. Dipendenti idonei a ricevere la delega (escludiamo se stesso)
+    from models import Dipendente 
+    potenziali_delegati = Dipendente.query.filter(Dipendente.id != current_user.id).all()
+    
+    # Popola il campo SelectField del form
+    form.delegato_id.choices = [(d.id, f"{d.nome} {d.cognome} ({d.ruolo})") for d in potenziali_delegati]
+
+    # 3. Query per Deleghe (Attive/Future e Scadute)
+    from models import Delega 
+    
+    # Deleghe attive o future
+    deleghe_attive = Delega.query.options(joinedload(Delega.delegato)).filter(
+        Delega.id_delegante == current_user.id,
+        (Delega.data_fine.is_(None) | (Delega.data_fine >= oggi))
+    ).order_by(Delega.data_inizio.asc()).all()
+    
+    # Deleghe scadute
+    deleghe_scadute = Delega.query.filter(
+        Delega.id_delegante == current_user.id,
+        Delega.data_fine < oggi
+    ).order_by(Delega.data_fine.desc()).all()
+
+
+    # --- LOGICA DI SICUREZZA e VALIDAZIONE ---
+    if current_user.ruolo != 'Dirigente':
+        flash('Accesso non autorizzato alla gestione delle deleghe.', 'danger')
+        return redirect(url_for('workflow.mie_trasferte'))
+
+    if form.validate_on_submit():
+        # Creazione nuova Delega
+        
+        id_delegato = form.delegato_id.data
+        data_inizio = form.data_inizio.data
+        data_fine = form.data_fine.data
+        
+        # Controllo base: Data fine deve essere successiva o uguale a data inizio
+        if data_fine and data_fine < data_inizio:
+            flash('La data di fine delega non può precedere la data di inizio.', 'danger')
+            # Non facciamo return, lasciamo che il template venga renderizzato con gli errori del form
+        else:
+            try:
+                nuova_delega = Delega(
+                    id_delegante=current_user.id,
+                    id_delegato=id_delegato,
+                    data_inizio=data_inizio,
+                    data_fine=data_fine
+                )
+                
+                db.session.add(nuova_delega)
+                db.session.commit()
+                flash('Nuova delega creata con successo.', 'success')
+                return redirect(url_for('workflow.gestisci_deleghe'))
+
+            except Exception as e:
+                db.session.rollback()
+                flash(f'Errore nel salvataggio della delega: {e}', 'danger')
+
+    # --- RENDER TEMPLATE ---
+    # Passiamo tutte le variabili necessarie
+    return render_template('gestisci_deleghe.html', 
+                            form=form, 
+                            deleghe_attive=deleghe_attive, 
+                            deleghe_scadute=deleghe_scadute,
+                            oggi=oggi)
+
+
+# ====================================================================
+# ROTTE APPLICATIVE (TRASFERTE)
+# ====================================================================
+
+@bp.route('/nuova_trasferta', methods=['GET', 'POST'])
+@budget_query(2)
+@login_required
+def nuova_trasferta():
+    if current_user.ruolo not in ['Dipendente', 'Dirigente']:
+        flash('Non sei autorizzato a richiedere trasferte.', 'danger')
+        return redirect(url_for('autenticazione.index'))
+
+    # Verifica che il dipendente abbia un dirigente assegnato prima di inviare
+    if not current_user.id_dirigente:
+        flash('Non puoi inviare una richiesta finché non ti è stato assegnato un dirigente responsabile.', 'warning')
+        return redirect(url_for('autenticazione.index'))
+
+    if request.method == 'POST':
+        # 1. Estrazione dei dati dal form
+        giorno_missione_str = request.form.get('giorno_missione')
+        missione_presso = request.form.get('missione_presso')
+        motivo_missione = request.form.get('motivo_missione') # <-- Campo aggiunto ora
+        utilizzo_mezzo = request.form.get('utilizzo_mezzo')
+        inizio_missione_ora_str = request.form.get('inizio_missione_ora')
+        aut_extra_orario = request.form.get('aut_extra_orario')
+        aut_timbratura_entrata_str = request.form.get('aut_timbratura_entrata')
+        aut_timbratura_uscita_str = request.form.get('aut_timbratura_uscita')
+        motivo_timbratura = request.form.get('motivo_timbratura')
+        note_premissione = request.form.get('note_premissione')
+        id_dirigente_richiesto = request.form.get('id_dirigente')
+
+        # 1. Validazione dei campi obbligatori
+        if not giorno_missione_str or not missione_presso:
+            flash('Per favore, compila tutti i campi obbligatori.', 'danger')
+            return redirect(url_for('workflow.nuova_trasferta'))
+
+        # 1.1 VALIDAZIONE TIMBRATURA (Richiesta User)
+        # Se c'è un orario di entrata O di uscita, il motivo è obbligatorio
+        if (aut_timbratura_entrata_str or aut_timbratura_uscita_str) and not motivo_timbratura:
+            flash("Attenzione: Se indichi un orario per la timbratura (entrata o uscita), devi obbligatoriamente compilare il campo 'Motivo Autorizzazione Timbratura'.", 'danger')
+            return redirect(url_for('workflow.nuova_trasferta'))
+
+        # 2. Conversione della data (CRUCIALE)
+        try:
+            # Converte la stringa nel formato YYYY-MM-DD in oggetto date
+            data_missione = datetime.strptime(giorno_missione_str, '%Y-%m-%d').date()
+            
+            # 2.1 CONTROLLO RETROATTIVITÀ
+            today = date.today()
+            if data_missione < today:
+                msg_retroattivo = "Questa trasferta si è svolta senza autorizzazione preventiva"
+                flash("Attenzione: La data della missione è antecedente a oggi. Verra' segnalata come 'Svolta senza autorizzazione preventiva'.", 'warning')
+                
+                # Aggiungi la nota al campo note_premissione
+                if note_premissione:
+                    note_premissione += f"\n[{msg_retroattivo}]"
+                else:
+                    note_premissione = f"[{msg_retroattivo}]"
+                    
+        except ValueError:
+            flash('Formato data non valido.', 'danger')
+            return redirect(url_for('workflow.nuova_trasferta'))
+
+        # 3. Conversione degli orari (CRUCIALE per db.Time)
+        def converti_ora(ora_str):
+            if ora_str:
+                try:
+                    # Assumiamo che il formato sia HH:MM (es. 09:30)
+                    return datetime.strptime(ora_str, '%H:%M').time()
+                except ValueError:
+                    # Gestione dell'errore di formato ora se necessario
+                    return None # O lanciare un errore
+            return None
+    
+        # Eseguiamo le conversioni sui campi orari
+        inizio_missione_ora = converti_ora(inizio_missione_ora_str)
+        aut_timbratura_entrata = converti_ora(aut_timbratura_entrata_str)
+        aut_timbratura_uscita = converti_ora(aut_timbratura_uscita_str)
+
+        # =========================================================================
+        # 3.5. LOGICA DI AUTO-APPROVAZIONE (Dirigente)
+        # =========================================================================
+        stato_iniziale = 'In attesa'
+        id_approvatore_pre = current_user.id_dirigente # Default: il dirigente assegnato
+        data_app = None
+        final_flash_message = 'Richiesta di trasferta inviata con successo per l\'approvazione.'
+
+        # === VERO O FALSO: Auto-approvazione? ===
+        # Verifichiamo se l'utente è un Dirigente E se è il suo proprio dirigente responsabile.
+        is_auto_approving_dirigente = (current_user.ruolo == 'Dirigente' and 
+                                    current_user.id == current_user.id_dirigente)
+
+        if is_auto_approving_dirigente:
+            # Se il dirigente si sta auto-approvando
+            stato_iniziale = 'Approvata'
+            id_approvatore_pre = current_user.id_dirigente # L'approvatore pre è se stesso
+            data_app = datetime.now()
+            final_flash_message = 'Richiesta di trasferta creata e auto-approvata (Dirigente).'
+
+        # Se non è auto-approvazione, l'approvatore pre è già impostato a current_user.id_dirigente (default)
+        # ========================================================================
+
+        # 4. Creazione e Salvataggio dell'oggetto Trasferta
+        try:
+            nuova_trasferta = Trasferta(
+                id_dipendente=current_user.id,
+                # Utilizza id_approvatore (che è current_user.id in caso di auto-approvazione)
+                # Se nel tuo modello 'id_dirigente' è il dirigente RESPONSABILE (e non l'approvatore pre):
+                # * Se Dirigente, id_dirigente è se stesso.
+                # * Se Dipendente, id_dirigente è il suo capo.
+                id_dirigente=current_user.id_dirigente, # Mantieni il dirigente assegnato
+                
+                # USA LE VARIABILI CONDIZIONALI:
+                stato_pre_missione=stato_iniziale,
+                id_approvatore_pre=id_approvatore_pre, # Aggiungi questo campo per registrare chi ha approvato
+                data_approvazione_pre=data_app, # Aggiungi questo campo per registrare la data di approvazione
+                giorno_missione=data_missione,
+                inizio_missione_ora=inizio_missione_ora,
+                missione_presso=missione_presso,
+                motivo_missione=motivo_missione,
+                utilizzo_mezzo=utilizzo_mezzo,
+                aut_extra_orario=aut_extra_orario,
+                aut_timbratura_entrata=aut_timbratura_entrata,
+                aut_timbratura_uscita=aut_timbratura_uscita,
+                motivo_timbratura=motivo_timbratura,
+                note_premissione=note_premissione,
+            )
+            
+            db.session.add(nuova_trasferta)
+            db.session.commit()
+            
+            # USA IL MESSAGGIO CONDIZIONALE
+            flash(final_flash_message, 'success') 
+            
+            return redirect(url_for('workflow.mie_trasferte'))
+            
+        except Exception as e:
+            db.session.rollback()
+            # Questo era l'errore precedente ('motivo_missione' is an invalid keyword argument)
+            # Ora dovrebbe gestire altri errori di DB
+            flash(f"Errore sconosciuto durante l'invio: {e}", 'danger')
+            
+    # GET request
+    return render_template('nuova_trasferta.html')
+
+
+@bp.route('/modifica_trasferta/<int:trasferta_id>', methods=['GET', 'POST'])
+@budget_query(3)
+@login_required
+def modifica_trasferta(trasferta_id):
+    trasferta = Trasferta.query.get_or_404(trasferta_id)
+    
+    # Check ownership and state
+    if trasferta.id_dipendente != current_user.id:
+        flash('Non puoi modificare una trasferta che non ti appartiene.', 'danger')
+        return redirect(url_for('workflow.mie_trasferte'))
+        
+    if trasferta.stato_pre_missione != 'In attesa':
+        flash(f'Impossibile modificare: la missione è già in stato {trasferta.stato_pre_missione}.', 'danger')
+        return redirect(url_for('workflow.mie_trasferte'))
+
+    if request.method == 'POST':
+        # 1. Estrazione form (similar logic to nuova_trasferta)
+        giorno_missione_str = request.form.get('giorno_missione')
+        missione_presso = request.form.get('missione_presso')
+        motivo_missione = request.form.get('motivo_missione')
+        utilizzo_mezzo = request.form.get('utilizzo_mezzo')
+        inizio_missione_ora_str = request.form.get('inizio_missione_ora')
+        aut_extra_orario = request.form.get('aut_extra_orario')
+        aut_timbratura_entrata_str = request.form.get('aut_timbratura_entrata')
+        aut_timbratura_uscita_str = request.form.get('aut_timbratura_uscita')
+        motivo_timbratura = request.form.get('motivo_timbratura')
+        note_premissione = request.form.get('note_premissione')
+
+        # Validation
+        if not giorno_missione_str or not missione_presso:
+            flash('Compila i campi obbligatori.', 'danger')
+            return render_template('nuova_trasferta.html', trasferta=trasferta)
+
+        try:
+            # Update fields
+            trasferta.giorno_missione = datetime.strptime(giorno_missione_str, '%Y-%m-%d').date()
+            trasferta.missione_presso = missione_presso
+            trasferta.motivo_missione = motivo_missione
+            trasferta.utilizzo_mezzo = utilizzo_mezzo
+            trasferta.extra_orario = aut_extra_orario
+            trasferta.note_premissione = note_premissione
+            trasferta.motivo_autorizzazione_timbratura = motivo_timbratura
+            
+            # Helper for time
+            def convert_time(t_str):
+                return datetime.strptime(t_str, '%H:%M').time() if t_str else None
+                
+            if inizio_missione_ora_str:
+                 trasferta.inizio_missione_ora = convert_time(inizio_missione_ora_str)
+            
+            trasferta.aut_timbratura_entrata = convert_time(aut_timbratura_entrata_str)
+            trasferta.aut_timbratura_uscita = convert_time(aut_timbratura_uscita_str)
+            
+            db.session.commit()
+            flash('Modifiche alla richiesta di trasferta salvate con successo.', 'success')
+            return redirect(url_for('workflow.mie_trasferte'))
+            
+        except ValueError as e:
+            flash(f'Errore nei dati: {e}', 'danger')
+            return render_template('nuova_trasferta.html', trasferta=trasferta)
+
+    return render_template('nuova_trasferta.html', trasferta=trasferta)
+
+
+# Stati in cui una missione del proprio perimetro resta visibile al dirigente/delegato
+STATI_PRE_VISIBILI_APPROVATORE = ['In attesa', 'Approvata', 'Rifiutata']
+STATI_POST_VISIBILI_APPROVATORE = ['In attesa', 'Da rimborsare', 'Rimborso negato']
+
+
+@bp.route('/mie_trasferte')
+@budget_query(5)
+@login_required
+def mie_trasferte():
+    filtri = leggi_filtri_mie_trasferte(request.args)
+    cursore = leggi_cursore(request.args.get('dopo'))
+    per_pagina = MIE_TRASFERTE_PER_PAGINA
+
+    # 1. PERIMETRO APPROVATIVO: se stesso (se Dirigente) + deleganti attivi (letti una volta per richiesta)
+    ids_dirigenti_approvatori = set(deleganti_coperti())
+    if current_user.ruolo == 'Dirigente':
+        ids_dirigenti_approvatori.add(current_user.id)
+    ids_dirigenti_approvatori = sorted(ids_dirigenti_approvatori)
+
+    # 2. UNICA QUERY: trasferte personali OPPURE missioni del perimetro in uno degli stati di interesse.
+    # Ordinamento, filtri e paginazione sono eseguiti dal database; il richiedente arriva nello stesso SELECT.
+    condizione_lista = Trasferta.id_dipendente == current_user.id
+    if ids_dirigenti_approvatori:
+        condizione_lista = or_(
+            condizione_lista,
+            and_(
+                Trasferta.id_dirigente.in_(ids_dirigenti_approvatori),
+                or_(
+                    Trasferta.stato_pre_missione.in_(STATI_PRE_VISIBILI_APPROVATORE),
+                    Trasferta.stato_post_missione.in_(STATI_POST_VISIBILI_APPROVATORE)
+                )
+            )
+        )
+
+    risultati = applica_filtri_e_cursore(
+        Trasferta.query.options(joinedload(Trasferta.richiedente)).filter(condizione_lista),
+        filtri, cursore, per_pagina
+    ).all()
+
+    # 3. CARICAMENTO MISSIONI DA APPROVARE PER L'AMMINISTRAZIONE
+    missioni_da_approvare_finale = []
+    if current_user.ruolo == 'Amministrazione':
+        missioni_da_approvare_finale = Trasferta.query.filter(
+            Trasferta.stato_post_missione == 'Pronta per rimborso'
+        ).order_by(Trasferta.data_approvazione_post).all()
+
+    # 4. Taglio della pagina e cursore per la successiva
+    trasferte = risultati[:per_pagina]
+    cursore_successivo = None
+    if len(risultati) > per_pagina:
+        cursore_successivo = scrivi_cursore(trasferte[-1])
+
+    # Richiedenti selezionabili nel filtro: se stessi più i dipendenti dei dirigenti coperti
+    condizione_richiedenti = Dipendente.id == current_user.id
+    if ids_dirigenti_approvatori:
+        condizione_richiedenti = or_(
+            condizione_richiedenti,
+            Dipendente.id_dirigente.in_(ids_dirigenti_approvatori)
+        )
+    richiedenti_filtro = Dipendente.query.filter(condizione_richiedenti).order_by(
+        Dipendente.cognome, Dipendente.nome
+    ).all()
+
+    # Esegui il render_template con la lista corretta:
+    return render_template('mie_trasferte.html', 
+                        trasferte=trasferte, # USA SOLO LA LISTA PULITA 'trasferte'
+                        ids_approvatori_autorizzati=ids_dirigenti_approvatori,
+                        missioni_da_approvare_finale=missioni_da_approvare_finale,
+                        filtri=filtri,
+                        stati_filtro=STATI_FILTRO_MIE_TRASFERTE,
+                        richiedenti_filtro=richiedenti_filtro,
+                        cursore_corrente=request.args.get('dopo'),
+                        cursore_successivo=cursore_successivo
+                        )
+
+
+
+
+
+# --- ROTTA APPROVAZIONE ---
+@bp.route('/approva_trasferta/<int:trasferta_id>', methods=['POST'])
+@budget_query(3)
+@login_required
+def approva_trasferta(trasferta_id):
+    # 1. Recupero i dati inviati dal MODALE
+    azione = request.form.get('azione') # 'approva' o 'rifiuta'
+    commento = request.form.get('commento') # Le note del dirigente
+
+    transizione = {'approva': 'approva_pre', 'rifiuta': 'rifiuta_pre'}.get(azione)
+    if transizione is None:
+        # Azione non riconosciuta
+        flash('Azione non valida.', 'danger')
+        return redirect(url_for('workflow.mie_trasferte'))
+
+    # 2. APPROVAZIONE O RIFIUTO: autorizzazione, stato e tracciamento in un solo UPDATE
+    #    (il commento viene salvato nel campo note_premissione)
+    esito, riga = esegui_transizione(transizione, trasferta_id, note_premissione=commento)
+    if esito == 'ok':
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            flash(f"Errore durante il salvataggio: {e}", 'danger')
+            return redirect(url_for('workflow.mie_trasferte'))
+
+    if esito == 'non_autorizzato':
+        flash('Non sei autorizzato ad approvare/rifiutare questa richiesta.', 'danger')
+    elif esito == 'stato':
+        flash('La trasferta è già stata processata.', 'warning')
+    elif azione == 'approva':
+        flash(f'Trasferta di {riga.nome_richiedente} approvata con successo.', 'success')
+    else:
+        flash(f'Trasferta di {riga.nome_richiedente} rifiutata.', 'warning')
+
+    return redirect(url_for('workflow.mie_trasferte'))
+        
+
+
+
+
+
+
+# --- APPROVAZIONE PRE-MISSIONE MULTIPLA ---
+# Massimo numero di trasferte per invio: tiene limitata la lista IN (...) dell'UPDATE
+APPROVAZIONE_MULTIPLA_MAX = 500
+
+
+@bp.route('/approva_trasferte', methods=['POST'])
+@budget_query(2)
+@login_required
+def approva_trasferte():
+    """
+    Approva o rifiuta in blocco le richieste pre-missione selezionate in mie_trasferte, con un
+    unico commento. Un solo UPDATE in una sola transazione: l'ambito dell'utente (missioni di
+    cui è dirigente, più quelle dei deleganti attivi) è verificato nella WHERE per l'intero insieme.
+    """
+    azione = request.form.get('azione')
+    commento = request.form.get('commento') or None
+    transizione = {'approva': 'approva_pre', 'rifiuta': 'rifiuta_pre'}.get(azione)
+    if transizione is None:
+        flash('Azione non valida.', 'danger')
+        return redirect(url_for('workflow.mie_trasferte'))
+
+    try:
+        trasferta_ids = sorted({int(v) for v in request.form.getlist('trasferta_ids')})
+    except ValueError:
+        flash('Selezione non valida.', 'danger')
+        return redirect(url_for('workflow.mie_trasferte'))
+    if not trasferta_ids:
+        flash('Nessuna trasferta selezionata.', 'warning')
+        return redirect(url_for('workflow.mie_trasferte'))
+    if len(trasferta_ids) > APPROVAZIONE_MULTIPLA_MAX:
+        flash(f'Puoi processare al massimo {APPROVAZIONE_MULTIPLA_MAX} trasferte alla volta.', 'danger')
+        return redirect(url_for('workflow.mie_trasferte'))
+
+    righe = esegui_transizioni(transizione, trasferta_ids, note_premissione=commento)
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        flash(f"Errore durante il salvataggio: {e}", 'danger')
+        return redirect(url_for('workflow.mie_trasferte'))
+
+    processate = len(righe)
+    if processate:
+        verbo = 'approvate' if azione == 'approva' else 'rifiutate'
+        flash(f'{processate} trasferte {verbo}.', 'success' if azione == 'approva' else 'warning')
+    escluse = len(trasferta_ids) - processate
+    if escluse:
+        flash(f'{escluse} trasferte non processate: già processate o fuori dalla tua competenza.', 'warning')
+
+    return redirect(url_for('workflow.mie_trasferte'))
+
+
+@bp.route('/rendiconta_trasferta/<int:trasferta_id>', methods=['GET', 'POST'])
+@budget_query(7)
+@login_required
+def rendiconta_trasferta(trasferta_id):
+    # Definizione delle funzioni helper locali (o assicurati che siano globali/importate)
+    def safe_float(valore):
+        try:
+            return float(str(valore).replace(',', '.')) if valore else 0.0
+        except ValueError:
+            return 0.0
+            
+    def safe_int(valore):
+        try:
+            return int(valore) if valore else 0
+        except ValueError:
+            return 0
+            
+    trasferta = Trasferta.query.get_or_404(trasferta_id)
+
+    # Controlli preliminari (utente corretto, missione approvata)
+    if trasferta.id_dipendente != current_user.id or trasferta.stato_pre_missione != 'Approvata':
+        flash('Non puoi rendicontare questa missione o non è nello stato corretto.', 'danger')
+        return redirect(url_for('workflow.mie_trasferte'))
+
+    # Se la rendicontazione è già stata inviata, si reindirizza (sebbene il GET sia utile per la visualizzazione)
+    if trasferta.stato_post_missione == 'In attesa':
+        flash(f'Rendicontazione già inviata ({trasferta.stato_post_missione}). Puoi comunque modificarla e reinviarla.', 'warning')
+        # In questo caso, lasciamo che la logica POST gestisca il reinvio
+
+    if request.method == 'POST':
+        try:
+            # --- 1. SALVATAGGIO DATI EFFETTIVI e LOGISTICA ---
+            
+            ora_inizio_str = request.form.get('ora_inizio_effettiva')
+            ora_fine_str = request.form.get('ora_fine_effettiva')
+            pausa_dalle_str = request.form.get('pausa_pranzo_dalle')
+            pausa_alle_str = request.form.get('pausa_pranzo_alle')
+            
+            # Conversione Orari (gestione None/vuoto per i Time)
+            ora_inizio = datetime.strptime(ora_inizio_str, '%H:%M').time() if ora_inizio_str else None
+            ora_fine = datetime.strptime(ora_fine_str, '%H:%M').time() if ora_fine_str else None
+
+            # Calcolo Durata Netta (basato solo sugli orari se la missione è giornaliera)
+            durata_netta = timedelta(0)
+            if ora_inizio and ora_fine:
+                dt_inizio = datetime.combine(date.today(), ora_inizio)
+                dt_fine = datetime.combine(date.today(), ora_fine)
+                durata_netta = dt_fine - dt_inizio
+
+                # Sottrazione Pausa Pranzo
+                if pausa_dalle_str and pausa_alle_str:
+                    dt_pausa_inizio = datetime.combine(date.today(), datetime.strptime(pausa_dalle_str, '%H:%M').time())
+                    dt_pausa_fine = datetime.combine(date.today(), datetime.strptime(pausa_alle_str, '%H:%M').time())
+                    pausa_pranzo_durata = dt_pausa_fine - dt_pausa_inizio
+                    durata_netta -= pausa_pranzo_durata
+
+                durata_totale_ore_int = int(durata_netta.total_seconds() / 3600)
+                trasferta.durata_totale_ore = durata_totale_ore_int
+            
+            # AGGIORNAMENTO CAMPI TRASFERTA
+            trasferta.ora_inizio_effettiva = ora_inizio
+            trasferta.ora_fine_effettiva = ora_fine
+            trasferta.km_percorsi = safe_float(request.form.get('km_percorsi'))
+            trasferta.mezzo_km_percorsi = request.form.get('mezzo_km_percorsi')
+            trasferta.note_rendicontazione = request.form.get('note_rendicontazione')
+            
+            # Salvataggio Durata Viaggio (usa i setter del Modello per convertire HH:MM -> min)
+            trasferta.durata_viaggio_andata_str = request.form.get('durata_viaggio_andata')
+            trasferta.durata_viaggio_ritorno_str = request.form.get('durata_viaggio_ritorno')
+            
+            # Dati Pausa e Extra Orario
+            trasferta.pausa_pranzo_dalle = datetime.strptime(pausa_dalle_str, '%H:%M').time() if pausa_dalle_str else None
+            trasferta.pausa_pranzo_alle = datetime.strptime(pausa_alle_str, '%H:%M').time() if pausa_alle_str else None
+            trasferta.richiesta_pausa_pranzo = request.form.get('richiesta_pausa_pranzo')
+            trasferta.extra_orario = request.form.get('extra_orario')
+            
+            # --- 2. GESTIONE SPESE (Cancellazione e Reinserimento) ---
+            
+            # B. Gestione Spese:
+            # Se il form contiene i dati delle spese (array), allora aggiorniamo (cancella e riscrivi).
+            # Se il form NON contiene dati (es. invia da modale), preserviamo le spese esistenti.
+            categorie = request.form.getlist('spesa_categoria[]')
+            
+            totale_spese = 0.0
+
+            # Senza dati spesa nel form le spese esistenti, e i loro totali già salvati, restano invariate
+            if categorie:
+                # CI SONO NUOVI DATI: Cancelliamo le vecchie e inseriamo le nuove
+                Spesa.query.filter_by(id_trasferta=trasferta_id).delete()
+                
+                descrizioni = request.form.getlist('spesa_descrizione[]')
+                importi = request.form.getlist('spesa_importo[]')
+                date_spesa = request.form.getlist('spesa_data[]')
+                spese_scritte = []
+
+                for i in range(len(categorie)):
+                    # Validazione base: ignora righe vuote se necessario
+                    if not categorie[i] or not importi[i]:
+                        continue
+                        
+                    valore_importo = float(importi[i])
+                    totale_spese += valore_importo
+                    
+                    # Gestione data (se presente o usa quella della missione)
+                    data_s = trasferta.giorno_missione
+                    if i < len(date_spesa) and date_spesa[i]:
+                        try:
+                            data_s = datetime.strptime(date_spesa[i], '%Y-%m-%d').date()
+                        except ValueError:
+                            pass # Mantieni default
+
+                    nuova_spesa = Spesa(
+                        id_trasferta=trasferta_id,
+                        categoria=categorie[i],
+                        descrizione=descrizioni[i] if i < len(descrizioni) else '',
+                        importo=valore_importo,
+                        data_spesa=data_s
+                    )
+                    db.session.add(nuova_spesa)
+                    spese_scritte.append(nuova_spesa)
+                
+                # Totali denormalizzati aggiornati nella stessa transazione delle spese
+                trasferta.aggiorna_totali_spese(spese_scritte)
+                
+            # --- 3. LOGICA DI AUTO-APPROVAZIONE POST-MISSIONE E AGGIORNAMENTO STATO ---
+            
+            # Totale Spese per la logica (colonna denormalizzata)
+            totale_spese = trasferta.totale_spese
+
+            # Valori Default
+            stato_post_finale = 'In attesa'
+            final_flash_message = 'Rendicontazione (Dati e Spese) salvata e inviata con successo per l\'approvazione del rimborso.'
+            
+            # Condizione Auto-Approvazione
+            if current_user.ruolo == 'Dirigente' and current_user.id == current_user.id_dirigente:
+                if totale_spese > 0:
+                    stato_post_finale = 'Pronta per rimborso'
+                    final_flash_message = 'Rendiconto salvato e auto-approvato (Dirigente). Ora è pronto per il rimborso finanziario.'
+                else:
+                    stato_post_finale = 'Conclusa'
+                    final_flash_message = 'Rendiconto salvato e auto-approvato (Dirigente). Nessuna spesa da rimborsare. Missione conclusa.'
+                
+                trasferta.id_approvatore_post = current_user.id
+                trasferta.data_approvazione_post = datetime.now()
+
+            # AGGIORNAMENTO STATO E COMMIT
+            trasferta.stato_post_missione = stato_post_finale
+            
+            db.session.commit()
+            flash(final_flash_message, 'success')
+            return redirect(url_for('workflow.mie_trasferte'))
+
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Errore nel salvataggio della rendicontazione: {e}', 'danger')
+            # Lascia la possibilità di riprovare nella stessa pagina (GET)
+
+    # --- LOGICA GET (Visualizzazione) ---
+    spese_esistenti = Spesa.query.filter_by(id_trasferta=trasferta_id).all()
+    totale_spese = sum(spesa.importo for spesa in spese_esistenti)
+
+    return render_template('rendiconta_trasferta.html', 
+                           trasferta=trasferta, 
+                           spese_esistenti=spese_esistenti,
+                           totale_spese=totale_spese)
+
+
+@bp.route('/invia_rendiconto/<int:trasferta_id>', methods=['POST'])
+@budget_query(6)
+@login_required
+def invia_rendiconto(trasferta_id):
+    trasferta = Trasferta.query.get_or_404(trasferta_id)
+    # ... (Controlli di autorizzazione) ...
+
+    try:
+        # --- 1. SALVATAGGIO DATI EFFETTIVI (già fatto) ---
+        # ... (Logica per salvare km, orari, pause, extra_orario) ...
+        
+        # --- 2. GESTIONE SPESE (NUOVA LOGICA) ---
+        
+        # B. Gestione Spese:
+        # Se il form contiene i dati delle spese (array), allora aggiorniamo (cancella e riscrivi).
+        # Se il form NON contiene dati (es. invia da modale), preserviamo le spese esistenti.
+        categorie = request.form.getlist('spesa_categoria[]')
+        
+        totale_spese = 0.0
+
+        if categorie:
+            # CI SONO NUOVI DATI: Cancelliamo le vecchie e inseriamo le nuove
+            Spesa.query.filter_by(id_trasferta=trasferta_id).delete()
+            db.session.flush()
+            
+            descrizioni = request.form.getlist('spesa_descrizione[]')
+            importi = request.form.getlist('spesa_importo[]')
+            date_spesa = request.form.getlist('spesa_data[]')
+            
+            if len(categorie) != len(importi):
+                raise Exception("Dati spesa non allineati.")
+
+            spese_scritte = []
+            for i in range(len(categorie)):
+                # Validazione base: ignora righe vuote se necessario
+                if not categorie[i] or not importi[i]:
+                    continue
+                    
+                valore_importo = float(importi[i])
+                totale_spese += valore_importo
+                
+                # Gestione data (se presente o usa quella della missione)
+                data_s = trasferta.giorno_missione
+                if i < len(date_spesa) and date_spesa[i]:
+                    try:
+                        data_s = datetime.strptime(date_spesa[i], '%Y-%m-%d').date()
+                    except ValueError:
+                        pass # Mantieni default
+
+                nuova_spesa = Spesa(
+                    id_trasferta=trasferta_id,
+                    categoria=categorie[i],
+                    descrizione=descrizioni[i] if i < len(descrizioni) else '',
+                    importo=valore_importo,
+                    data_spesa=data_s
+                )
+                db.session.add(nuova_spesa)
+                spese_scritte.append(nuova_spesa)
+            
+            # Totali denormalizzati aggiornati nella stessa transazione delle spese
+            trasferta.aggiorna_totali_spese(spese_scritte)
+        else:
+            # NESSUN DATO SPESA RICEVUTO:
+            # Le spese esistenti sono preservate: il totale è quello già salvato sulla trasferta.
+            totale_spese = trasferta.totale_spese
+            
+        # ===================================================================================
+        # --- 3. LOGICA DI AUTO-APPROVAZIONE POST-MISSIONE E AGGIORNAMENTO STATO ---
+        # ===================================================================================
+        
+        # 3.1. Valori di default (per Dipendenti normali)
+        stato_post_finale = 'In attesa'
+        id_approvatore_post_finale = None
+        data_app_post_finale = None
+        final_flash_message = 'Rendiconto salvato e inviato con successo per l\'approvazione post-missione.'
+
+        # 3.2. Condizione di Auto-Approvazione (Dirigente = Proprio Dirigente)
+        is_auto_approving_dirigente = (
+            current_user.ruolo == 'Dirigente' and 
+            current_user.id == current_user.id_dirigente
+        )
+
+        if is_auto_approving_dirigente:
+            # Sovrascrive i valori di default
+            id_approvatore_post_finale = current_user.id
+            data_app_post_finale = datetime.now()
+            
+            # NUOVO: Distinzione basata sulle spese
+            if totale_spese > 0:
+                stato_post_finale = 'Pronta per rimborso' 
+                final_flash_message = 'Rendiconto salvato e auto-approvato (Dirigente). Ora è pronto per il rimborso finanziario.'
+            else:
+                stato_post_finale = 'Conclusa'
+                final_flash_message = 'Rendiconto salvato e auto-approvato (Dirigente). Nessuna spesa da rimborsare. Missione conclusa.'
+
+        # 3.3. Aggiornamento dei campi sulla Trasferta
+        trasferta.stato_post_missione = stato_post_finale
+        trasferta.id_approvatore_post = id_approvatore_post_finale
+        trasferta.data_approvazione_post = data_app_post_finale
+
+        # ===================================================================================
+
+        db.session.commit()
+        # Usa il messaggio condizionale
+        flash(final_flash_message, 'success')
+
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Errore nel salvataggio del rendiconto e delle spese: {e}', 'danger')
+    
+    return redirect(url_for('workflow.mie_trasferte'))
+
+@bp.route('/approva_rendiconto/<int:trasferta_id>', methods=['POST'])
+@budget_query(3)
+@login_required
+def approva_rendiconto(trasferta_id):
+    commento_dirigente = request.form.get('commento_approva')
+
+    # ==========================================================
+    # LOGICA DI BIFORCAZIONE: CON SPESE VS. SENZA SPESE
+    # ==========================================================
+    # Decisa nell'UPDATE (transizione 'approva_rendiconto') dalla colonna denormalizzata
+    # numero_spese: con spese -> 'Pronta per rimborso' (Approvazione Amministrativa),
+    # senza spese -> 'Conclusa' (l'iter di rimborso è concluso).
+    esito, riga = esegui_transizione('approva_rendiconto', trasferta_id,
+                                     note_approvazione_post=commento_dirigente)
+    if esito == 'ok':
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Errore durante l\'aggiornamento: {e}', 'danger')
+            return redirect(url_for('workflow.mie_trasferte'))
+
+    if esito == 'non_autorizzato':
+        flash('Accesso negato: Non sei autorizzato ad approvare il rendiconto per questa missione.', 'danger')
+    elif esito == 'stato':
+        flash(f'Impossibile approvare: il rendiconto non è in stato di attesa. Stato attuale: {riga.stato_post_missione}', 'danger')
+    elif riga.stato_post_missione == 'Pronta per rimborso':
+        flash('Rendiconto approvato. Missione in attesa di Approvazione Finanziaria.', 'success')
+    else:
+        flash('Rendiconto approvato. Nessuna spesa da rimborsare. Missione conclusa.', 'success')
+
+    return redirect(url_for('workflow.mie_trasferte'))
+
+# Funzione per il rifiuto del rendiconto (Fase Post)
+@bp.route('/rifiuta_rendiconto/<int:trasferta_id>', methods=['POST'])
+@budget_query(3)
+@login_required
+def rifiuta_rendiconto(trasferta_id):
+    # Recupero il commento del Dirigente (Motivo del rifiuto)
+    commento_dirigente = request.form.get('commento_rifiuta')
+
+    # Ritorna al dipendente per la correzione ('Rifiutata post')
+    esito, riga = esegui_transizione('rifiuta_rendiconto', trasferta_id,
+                                     note_approvazione_post=commento_dirigente)
+    if esito == 'ok':
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Errore durante l\'aggiornamento dello stato: {e}', 'danger')
+            return redirect(url_for('workflow.mie_trasferte'))
+
+    if esito == 'non_autorizzato':
+        flash('Accesso negato: Non sei autorizzato ad approvare il rendiconto per questa missione.', 'danger')
+    elif esito == 'stato':
+        flash(f'Impossibile rifiutare: il rendiconto non è in stato di attesa. Stato attuale: {riga.stato_post_missione}', 'danger')
+    else:
+        flash(f'Rendiconto della trasferta ID {trasferta_id} rifiutato. Lo stato è stato aggiornato a "Rifiutata post".', 'success')
+
+    return redirect(url_for('workflow.mie_trasferte'))
+
+@bp.route('/richiedi_rimborso/<int:trasferta_id>')
+@budget_query(3)
+@login_required
+def richiedi_rimborso(trasferta_id):
+    # Solo il richiedente, e solo da 'Pronta per rimborso'
+    esito, riga = esegui_transizione('richiedi_rimborso', trasferta_id)
+    if esito != 'ok':
+        flash('Non puoi richiedere il rimborso in questo stato o per questa missione.', 'danger')
+        return redirect(url_for('workflow.mie_trasferte'))
+
+    db.session.commit()
+    
+    flash('Richiesta di rimborso inviata con successo all\'ufficio finanziario.', 'success')
+    return redirect(url_for('workflow.mie_trasferte'))
+
+
+@bp.route('/rifiuta_rimborso/<int:trasferta_id>')
+@budget_query(3)
+@login_required
+def rifiuta_rimborso(trasferta_id):
+    # Dirigente o delegato, solo da 'In attesa' di approvazione post-missione
+    esito, riga = esegui_transizione('nega_rimborso', trasferta_id)
+    if esito == 'ok':
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            flash(f"Errore durante il rifiuto del rimborso: {e}", 'danger')
+            return redirect(url_for('workflow.mie_trasferte'))
+
+    if esito == 'non_autorizzato':
+        flash('Non sei autorizzato a rifiutare questo rimborso.', 'danger')
+    elif esito == 'stato':
+        flash(f'La richiesta di rimborso è già stata processata (Stato: {riga.stato_post_missione}).', 'warning')
+    else:
+        flash(f'Rimborso della trasferta del giorno {riga.giorno_missione.strftime("%Y-%m-%d")} negato con successo.', 'success')
+
+    return redirect(url_for('workflow.mie_trasferte'))
+
+
+@bp.route('/report_trasferta/<int:trasferta_id>')
+@budget_query(4)
+@login_required
+def report_trasferta(trasferta_id):
+    # Usiamo joinedload per caricare in modo efficiente tutte le relazioni necessarie 
+    # per il report (richiedente, approvatore pre, approvatore post)
+    trasferta = db.session.execute(
+        db.select(Trasferta)
+        .filter_by(id=trasferta_id)
+        .options(
+            joinedload(Trasferta.richiedente),
+            joinedload(Trasferta.approvatore_pre),
+            joinedload(Trasferta.approvatore_post),
+            selectinload(Trasferta.spese)
+        )
+    ).scalar_one_or_none()
+    
+    if trasferta is None:
+        abort(404) # Missione non trovata
+
+    # LOGICA DI AUTORIZZAZIONE (Già corretta)
+    # L'utente deve essere il richiedente OPPURE un approvatore autorizzato
+    if trasferta.id_dipendente != current_user.id and not is_authorized_approver(trasferta):
+        flash('Accesso negato al report.', 'danger')
+        return redirect(url_for('workflow.mie_trasferte'))
+
+    # CONTROLLO STATO (Report disponibile solo a missione finalizzata)
+    STATI_FINALIZZATI = [
+        'Da rimborsare', 
+        'Rimborso negato',
+        'Pronta per rimborso', # <--- AGGIUNTO SU RICHIESTA UTENTE
+        'Rimborsata',
+        'Conclusa'
+    ]
+    
+    if trasferta.stato_post_missione not in STATI_FINALIZZATI:
+        flash('Report non disponibile finché la missione non è finalizzata (stato post-missione: {}).'.format(trasferta.stato_post_missione), 'warning')
+        return redirect(url_for('workflow.mie_trasferte'))
+        
+    return render_template('report_trasferta.html', trasferta=trasferta)
+
+@bp.route('/get_dettagli_trasferta/<int:trasferta_id>')
+@budget_query(2)
+@login_required
+def get_dettagli_trasferta(trasferta_id):
+    from models import Trasferta, Spesa # Assumi che Trasferta sia importato
+    
+    trasferta = Trasferta.query.get_or_404(trasferta_id)
+    
+    # 1. LOGICA PER I DETTAGLI DI APPROVAZIONE (ROSSI)
+    
+    # Se la missione è in uno stato post-missione che richiede approvazione (Rimborso Richiesto)
+    # o è stata approvata post (Pronta per rimborso), carichiamo i dati delle spese.
+    stati_con_rendiconto = ['Pronta per rimborso', 'Rimborso Richiesto', 'Rimborso negato', 'Rifiutata post']
+    
+    if trasferta.stato_post_missione in stati_con_rendiconto:
+        
+        # Recupera tutte le spese associate
+        spese = Spesa.query.filter_by(id_trasferta=trasferta_id).all()
+        totale_spese = sum(spesa.importo for spesa in spese)
+        
+        # 🎯 Ritorna il template specifico per la visualizzazione/approvazione del RENDICONTO
+        # (Qui dovresti usare il template che mostra la TABELLA delle SPESE)
+        return render_template('_dettagli_modale_rendiconto.html', 
+                               trasferta=trasferta, 
+                               spese=spese, 
+                               totale_spese=totale_spese)
+
+    # 2. LOGICA PER L'APPROVAZIONE PRE-MISSIONE (o altri stati non rendicontati)
+    elif trasferta.stato_pre_missione == 'In attesa': # Aggiungi altri stati pre-missione se necessario
+        
+        # 🎯 Ritorna il template specifico per la PRE-MISSIONE
+        # (Qui non passiamo le spese, usiamo il template base)
+        return render_template('_dettagli_modale_pre.html', trasferta=trasferta)
+        
+    # 3. FALLBACK
+    else:
+        # Se lo stato non è riconosciuto, potresti mostrare un messaggio di errore
+        return f"<p class='text-danger'>Errore: Stato missione non gestito per la visualizzazione: {trasferta.stato_post_missione}</p>"
+
+    
+
+
+
+
+@bp.route('/trasferta/<int:trasferta_id>/gestisci_spese', methods=['GET', 'POST'])
+@budget_query(7)
+@login_required
+# Il richiedente (Dirigente o Dipendente) deve poter accedere
+def gestisci_spese(trasferta_id):
+    trasferta = Trasferta.query.get_or_404(trasferta_id)
+    
+    # 1. Controllo di sicurezza e stato: Solo il richiedente può gestire le spese.
+    # Inoltre, la missione deve essere stata Approvata (pre-missione) per poter procedere.
+    if trasferta.id_dipendente != current_user.id:
+        flash('Accesso negato: puoi gestire solo le tue richieste.', 'danger')
+        return redirect(url_for('dashboard'))
+    
+    if trasferta.stato_pre_missione != 'Approvata':
+        flash('Non puoi gestire le spese di una missione non ancora approvata (o già rifiutata).', 'warning')
+        return redirect(url_for('dashboard'))
+
+    # 2. Transizione di stato iniziale (solo se la rendicontazione è già stata chiusa)
+    if trasferta.stato_post_missione in ['N/A', 'Compilata']: 
+        # Assumiamo che se arriva qui, il rendiconto orario/km sia già stato chiuso.
+        # Possiamo forzare lo stato 'Da rimborsare' se non lo è già.
+        trasferta.stato_post_missione = 'Da rimborsare'
+        db.session.commit()
+
+    # --- METODO GET: Visualizza le spese esistenti e il form ---
+    spese_esistenti = Spesa.query.filter_by(id_trasferta=trasferta_id).all()
+    
+    # Calcolo del totale
+    totale_spese = sum(s.importo for s in spese_esistenti)
+
+    if request.method == 'POST':
+        # 3. Logica POST: Salva le nuove spese e aggiorna lo stato
+
+        # Le spese sono inviate come liste di campi (es. spesa_categoria[], spesa_importo[], ecc.)
+        categorie = request.form.getlist('spesa_categoria[]')
+        importi_str = request.form.getlist('spesa_importo[]')
+        date_str = request.form.getlist('spesa_data[]')
+        descrizioni = request.form.getlist('spesa_descrizione[]')
+        
+        nuove_spese = []
+        
+        # Svuotiamo le spese esistenti per sovrascrivere o permettere la cancellazione
+        # È più sicuro eliminare e ricreare che fare un update complesso riga per riga
+        Spesa.query.filter_by(id_trasferta=trasferta_id).delete()
+        
+        try:
+            for cat, imp_str, data_s_str, desc in zip(categorie, importi_str, date_str, descrizioni):
+                # Pulizia e conversione dei dati
+                imp = float(imp_str.replace(',', '.')) if imp_str else 0.0
+                data_s = datetime.strptime(data_s_str, '%Y-%m-%d').date() if data_s_str else date.today()
+                
+                if imp > 0:
+                    nuova_spesa = Spesa(
+                        id_trasferta=trasferta_id,
+                        categoria=cat,
+                        descrizione=desc,
+                        importo=imp,
+                        data_spesa=data_s
+                    )
+                    nuove_spese.append(nuova_spesa)
+                    db.session.add(nuova_spesa)
+            
+            # Totali denormalizzati aggiornati nella stessa transazione delle spese
+            trasferta.aggiorna_totali_spese(nuove_spese)
+
+            # 4. Aggiornamento dello Stato Trasferta
+            if len(nuove_spese) > 0:
+                # Se ci sono spese, l'ultima transizione è "Rimborso Richiesto"
+                trasferta.stato_post_missione = 'Rimborso Richiesto'
+                trasferta.data_richiesta_rimborso = datetime.now()
+                flash('Spese salvate. La richiesta di rimborso è stata inviata all\'Amministrazione.', 'success')
+            else:
+                # Se non ci sono spese (ma il dipendente ha salvato il form), chiudiamo la pratica
+                trasferta.stato_post_missione = 'Rimborso Chiuso (Zero Spese)'
+                trasferta.data_richiesta_rimborso = datetime.now()
+                flash('Nessuna spesa dichiarata. Rendiconto post-missione chiuso.', 'info')
+
+            db.session.commit()
+            
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Errore durante il salvataggio delle spese: {e}', 'danger')
+
+        return redirect(url_for('workflow.report_trasferta', trasferta_id=trasferta_id))
+
+    # --- Ritorno GET ---
+    return render_template('gestisci_spese.html', 
+                           trasferta=trasferta, 
+                           spese_esistenti=spese_esistenti,
+                           totale_spese=totale_spese)
+
+
+@bp.route('/dettagli_trasferta/<int:trasferta_id>')
+@budget_query(5)
+@login_required
+def dettagli_trasferta(trasferta_id):
+    trasferta = Trasferta.query.get_or_404(trasferta_id)
+    
+    # Controllo di Sicurezza (chi può vedere i dettagli?)
+    # Solo il richiedente, il dirigente/delegato, l'Amministrazione O IL SUPERUSER.
+    is_admin = current_user.ruolo == 'Amministrazione'
+    is_superuser = current_user.ruolo == 'Superuser'
+    is_approver = is_authorized_approver(trasferta) 
+    is_requester = trasferta.id_dipendente == current_user.id
+    
+    if not (is_admin or is_superuser or is_approver or is_requester):
+        flash('Accesso negato. Non sei autorizzato a visualizzare i dettagli di questa trasferta.', 'danger')
+        # Reindirizza alla dashboard Amministrazione se è un admin e non ha i permessi per altro
+        if is_admin:
+             return redirect(url_for('amministrazione.dashboard_amministrazione'))
+        return redirect(url_for('workflow.mie_trasferte'))
+
+    # Se l'utente ha i permessi, recuperiamo le spese (tramite la relazione ORM)
+    spese_associate = trasferta.spese # Accede alla collezione di Spese collegate
+    
+    # Calcolo del totale (utile per l'Amministrazione)
+    totale_rimborso = sum(spesa.importo for spesa in spese_associate)
+    
+    return render_template('dettagli_trasferta.html', 
+                           trasferta=trasferta, 
+                           spese=spese_associate,
+                           totale_rimborso=totale_rimborso)
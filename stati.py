@@ -0,0 +1,132 @@
+# stati.py
+#
+# Registro unico degli stati del workflow delle trasferte.
+#
+# Nel database gli stati sono salvati come codici interi (SmallInteger): indici più piccoli e
+# confronti su interi. Il resto dell'applicazione continua a lavorare con le etichette leggibili
+# ('In attesa', 'Pronta per rimborso', ...): la conversione avviene nel tipo StatoCodificato,
+# sia quando si scrive un valore sia nei filtri SQL (==, in_, ...).
+#
+# I codici sono raggruppati per fase, così che "tutti gli stati finali" sia anche un intervallo.
+# Un codice assegnato non va MAI rinumerato né riutilizzato: è il valore salvato nelle righe.
+# Le vecchie grafie ('In Attesa', 'Pronto per Rimborso', ...) sono alias: accettate in scrittura
+# e nei filtri, ma sempre lette come etichetta canonica.
+from sqlalchemy.types import TypeDecorator, SmallInteger
+
+
+def _chiave(etichetta):
+    """Forma di confronto: spazi normalizzati, maiuscole/minuscole ignorate."""
+    return ' '.join(etichetta.split()).casefold()
+
+
+class Registro:
+    """Stati ammessi per una colonna: codice <-> etichetta canonica, più gli alias storici."""
+
+    def __init__(self, colonna, stati, alias=None):
+        self.colonna = colonna
+        self._etichette = dict(stati)
+        self._codici = {_chiave(e): c for c, e in self._etichette.items()}
+        for vecchia, canonica in (alias or {}).items():
+            self._codici[_chiave(vecchia)] = self._codici[_chiave(canonica)]
+
+    @property
+    def etichette(self):
+        """Etichette canoniche nell'ordine dei codici (per select e filtri)."""
+        return [self._etichette[c] for c in sorted(self._etichette)]
+
+    def __contains__(self, etichetta):
+        return isinstance(etichetta, str) and _chiave(etichetta) in self._codici
+
+    def codice(self, etichetta):
+        try:
+            return self._codici[_chiave(etichetta)]
+        except KeyError:
+            raise ValueError(f"Stato non valido per {self.colonna}: {etichetta!r}") from None
+
+    def etichetta(self, codice):
+        return self._etichette[codice]
+
+    def normalizza(self, etichetta):
+        """Etichetta canonica di una grafia qualsiasi (alias compresi)."""
+        return self.etichetta(self.codice(etichetta))
+
+    def varianti(self):
+        """Coppie (forma di confronto, codice) di tutte le grafie note: usate dalle migrazioni di dati."""
+        return sorted(self._codici.items(), key=lambda v: (v[1], v[0]))
+
+
+class StatoCodificato(TypeDecorator):
+    """Colonna SmallInteger esposta come etichetta del registro indicato."""
+
+    impl = SmallInteger
+    cache_ok = True
+
+    def __init__(self, registro):
+        super().__init__()
+        self.registro = registro
+
+    def process_bind_param(self, value, dialect):
+        if value is None or isinstance(value, int):
+            return value
+        return self.registro.codice(value)
+
+    def process_literal_param(self, value, dialect):
+        return str(self.process_bind_param(value, dialect))
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return self.registro.etichetta(value)
+
+    @property
+    def python_type(self):
+        return str
+
+
+# --------------------------------------------------------------------
+# FASE 1: approvazione pre-missione
+# --------------------------------------------------------------------
+PRE = Registro('stato_pre_missione', {
+    1: 'In attesa',
+    2: 'Approvata',
+    3: 'Rifiutata',
+})
+
+# --------------------------------------------------------------------
+# FASE 2: rendiconto, approvazione post-missione e rimborso
+# --------------------------------------------------------------------
+POST = Registro('stato_post_missione', {
+    0: 'N/A',
+    # In mano al dipendente
+    10: 'Compilata',
+    11: 'Rifiutata post',
+    # In attesa del dirigente / delegato
+    20: 'In attesa',
+    21: 'Da rimborsare',
+    # In attesa dell'Amministrazione
+    30: 'Pronta per rimborso',
+    31: 'Rimborso Richiesto',
+    # Stati finali
+    40: 'Conclusa',
+    41: 'Rimborso Chiuso (Zero Spese)',
+    42: 'Rimborsata',
+    43: 'Non rimborsata',
+    44: 'Rimborso negato',
+}, alias={
+    'Pronto per Rimborso': 'Pronta per rimborso',
+    # Le missioni 'Rimborso Concesso' venivano già riportate in coda all'Amministrazione
+    # dalla vecchia auto-migrazione di dashboard_amministrazione
+    'Rimborso Concesso': 'Pronta per rimborso',
+    'Rifiutato Post': 'Rifiutata post',
+    'Rimborso Approvato e Liquidato': 'Rimborsata',
+})
+
+# --------------------------------------------------------------------
+# FASE 3: esito dell'Amministrazione (NULL finché non c'è una decisione)
+# --------------------------------------------------------------------
+FINALE = Registro('stato_approvazione_finale', {
+    1: 'Rimborsata',
+    2: 'Non rimborsata',
+})
+
+REGISTRI = {r.colonna: r for r in (PRE, POST, FINALE)}
@@ -0,0 +1,298 @@
+// Tabella virtualizzata e flag di dashboard_presenze. URL e limiti arrivano dagli attributi
+// data-* di #griglia-contenitore, così il file resta statico e memorizzabile dal browser.
+(function () {
+    document.addEventListener('DOMContentLoaded', function () {
+        // =====================================================================
+        // 1. Tabella virtualizzata
+        // =====================================================================
+        const contenitore = document.getElementById('griglia-contenitore');
+        if (!contenitore) return;
+        const URL_GRIGLIA = contenitore.dataset.urlGriglia;
+        const RIGHE_PER_BLOCCO = Number(contenitore.dataset.righePerBlocco);
+        const ALTEZZA_RIGA = 41;     // px, fissa: permette di calcolare le righe visibili dallo scroll
+        const RIGHE_EXTRA = 10;      // righe disegnate sopra e sotto l'area visibile
+        const BLOCCHI_IN_MEMORIA = 20;
+
+        const corpo = document.getElementById('griglia-corpo');
+        const conteggio = document.getElementById('griglia-conteggio');
+
+        const griglia = {
+            totale: null,
+            blocchi: new Map(),      // indice blocco -> righe
+            inCorso: new Set(),
+            ordina: 'giorno',
+            verso: 'desc',
+            filtri: {},
+            generazione: 0           // invalida le risposte arrivate dopo un cambio di filtri/ordinamento
+        };
+
+        function urlBlocco(indice) {
+            const parametri = new URLSearchParams({
+                offset: indice * RIGHE_PER_BLOCCO,
+                limit: RIGHE_PER_BLOCCO,
+                ordina: griglia.ordina,
+                verso: griglia.verso
+            });
+            for (const [chiave, valore] of Object.entries(griglia.filtri)) {
+                if (valore !== '') parametri.append('f_' + chiave, valore);
+            }
+            return URL_GRIGLIA + '?' + parametri.toString();
+        }
+
+        function caricaBlocco(indice) {
+            if (griglia.blocchi.has(indice) || griglia.inCorso.has(indice)) return;
+            const generazione = griglia.generazione;
+            griglia.inCorso.add(indice);
+
+            fetch(urlBlocco(indice))
+                .then(response => {
+                    if (!response.ok) throw new Error(`Errore HTTP ${response.status}`);
+                    return response.json();
+                })
+                .then(dati => {
+                    if (generazione !== griglia.generazione) return;
+                    griglia.totale = dati.totale;
+                    griglia.blocchi.set(indice, dati.righe);
+                    liberaBlocchiLontani(indice);
+                    disegna();
+                })
+                .catch(error => {
+                    console.error('Fetch error:', error);
+                    conteggio.textContent = 'Errore nel caricamento: ' + error.message;
+                })
+                .finally(() => griglia.inCorso.delete(indice));
+        }
+
+        function liberaBlocchiLontani(vicino) {
+            if (griglia.blocchi.size <= BLOCCHI_IN_MEMORIA) return;
+            const ordinati = [...griglia.blocchi.keys()].sort((a, b) => Math.abs(b - vicino) - Math.abs(a - vicino));
+            ordinati.slice(0, griglia.blocchi.size - BLOCCHI_IN_MEMORIA).forEach(i => griglia.blocchi.delete(i));
+        }
+
+        function riga(indice) {
+            const blocco = griglia.blocchi.get(Math.floor(indice / RIGHE_PER_BLOCCO));
+            return blocco ? blocco[indice % RIGHE_PER_BLOCCO] : null;
+        }
+
+        function cella(testo, classi) {
+            const td = document.createElement('td');
+            td.className = 'text-truncate' + (classi ? ' ' + classi : '');
+            td.textContent = testo;
+            td.title = testo;
+            return td;
+        }
+
+        function classeBadge(stato) {
+            if (['Conclusa', 'Rimborsata'].includes(stato)) return 'bg-success';
+            if (['Rimborso negato', 'Rifiutata', 'Rifiutata post'].includes(stato)) return 'bg-danger';
+            return 'bg-secondary';
+        }
+
+        function casella(t, campo) {
+            const td = document.createElement('td');
+            td.className = 'text-center';
+            const input = document.createElement('input');
+            input.type = 'checkbox';
+            input.className = 'form-check-input presenze-check';
+            input.dataset.id = t.id;
+            input.dataset.field = campo;
+            input.checked = t[campo];
+            td.appendChild(input);
+            return td;
+        }
+
+        function creaRiga(t) {
+            const tr = document.createElement('tr');
+            tr.dataset.id = t.id;
+            tr.style.height = ALTEZZA_RIGA + 'px';
+            tr.appendChild(cella(t.id));
+            tr.appendChild(cella(t.dipendente));
+            tr.appendChild(cella(t.giorno));
+            tr.appendChild(cella(t.destinazione));
+            tr.appendChild(cella(t.motivo || '-'));
+            tr.appendChild(cella(t.spese.toFixed(2)));
+            tr.appendChild(cella(t.extra_orario || '-'));
+            tr.appendChild(cella(t.pasto || '-'));
+
+            const tdStato = document.createElement('td');
+            const badge = document.createElement('span');
+            badge.className = 'badge ' + classeBadge(t.stato);
+            badge.textContent = t.stato;
+            tdStato.appendChild(badge);
+            tr.appendChild(tdStato);
+
+            // Pulsante Dettagli: apre sempre il modale completo (rendiconto, vedi modale_trasferta.js)
+            const tdAzioni = document.createElement('td');
+            const bottone = document.createElement('button');
+            bottone.type = 'button';
+            bottone.className = 'btn btn-outline-dark btn-sm open-approvazione-modal';
+            bottone.dataset.id = t.id;
+            bottone.dataset.fase = 'rendiconto';
+            bottone.dataset.readonly = 'true';
+            bottone.dataset.titolo = 'Dettagli Rendiconto';
+            bottone.textContent = 'Dettagli';
+            tdAzioni.appendChild(bottone);
+            tr.appendChild(tdAzioni);
+
+            tr.appendChild(casella(t, 'gestito_presenze'));
+            tr.appendChild(casella(t, 'nbp'));
+            return tr;
+        }
+
+        function spaziatore(altezza) {
+            const tr = document.createElement('tr');
+            const td = document.createElement('td');
+            td.colSpan = 12;
+            td.style.height = altezza + 'px';
+            td.style.padding = '0';
+            td.style.border = '0';
+            tr.appendChild(td);
+            return tr;
+        }
+
+        function disegna() {
+            if (griglia.totale === null) {
+                caricaBlocco(0);
+                return;
+            }
+            conteggio.textContent = `${griglia.totale} missioni`;
+
+            const primo = Math.max(0, Math.floor(contenitore.scrollTop / ALTEZZA_RIGA) - RIGHE_EXTRA);
+            const ultimo = Math.min(griglia.totale,
+                Math.ceil((contenitore.scrollTop + contenitore.clientHeight) / ALTEZZA_RIGA) + RIGHE_EXTRA);
+
+            const frammento = document.createDocumentFragment();
+            frammento.appendChild(spaziatore(primo * ALTEZZA_RIGA));
+            for (let i = primo; i < ultimo; i++) {
+                const t = riga(i);
+                if (t) {
+                    frammento.appendChild(creaRiga(t));
+                } else {
+                    caricaBlocco(Math.floor(i / RIGHE_PER_BLOCCO));
+                    const attesa = spaziatore(ALTEZZA_RIGA);
+                    attesa.firstChild.textContent = '…';
+                    attesa.firstChild.className = 'text-muted text-center';
+                    frammento.appendChild(attesa);
+                }
+            }
+            frammento.appendChild(spaziatore((griglia.totale - ultimo) * ALTEZZA_RIGA));
+            corpo.replaceChildren(frammento);
+        }
+
+        function ricarica() {
+            griglia.generazione++;
+            griglia.totale = null;
+            griglia.blocchi.clear();
+            contenitore.scrollTop = 0;
+            conteggio.textContent = 'Caricamento...';
+            disegna();
+        }
+
+        let ridisegnoProgrammato = false;
+        contenitore.addEventListener('scroll', () => {
+            if (ridisegnoProgrammato) return;
+            ridisegnoProgrammato = true;
+            requestAnimationFrame(() => {
+                ridisegnoProgrammato = false;
+                disegna();
+            });
+        });
+
+        // Ordinamento: clic sull'intestazione, secondo clic inverte il verso
+        document.querySelectorAll('th[data-ordina]').forEach(th => {
+            th.addEventListener('click', function () {
+                const chiave = this.dataset.ordina;
+                griglia.verso = (griglia.ordina === chiave && griglia.verso === 'asc') ? 'desc' : 'asc';
+                griglia.ordina = chiave;
+                document.querySelectorAll('th[data-ordina]').forEach(h => h.textContent = h.textContent.replace(/ [▲▼]$/, ''));
+                this.textContent += griglia.verso === 'asc' ? ' ▲' : ' ▼';
+                ricarica();
+            });
+        });
+
+        // Filtri: inviati al server dopo una breve pausa nella digitazione
+        let timerFiltri = null;
+        document.querySelectorAll('.griglia-filtro').forEach(filtro => {
+            filtro.addEventListener(filtro.tagName === 'SELECT' ? 'change' : 'input', function () {
+                griglia.filtri[this.dataset.filtro] = this.value.trim();
+                clearTimeout(timerFiltri);
+                timerFiltri = setTimeout(ricarica, 300);
+            });
+        });
+
+        ricarica();
+
+        // =====================================================================
+        // 2. Gestione click sui checkbox (delegata: le righe vengono ricreate durante lo scroll)
+        //    I clic vengono accumulati e inviati insieme a /api/presenze/flag_bulk, che li applica
+        //    con pochi UPDATE in una sola transazione.
+        // =====================================================================
+        const URL_FLAG_BULK = contenitore.dataset.urlFlagBulk;
+        const ATTESA_INVIO_MS = 800;
+        const MAX_MODIFICHE_PER_INVIO = Number(contenitore.dataset.maxModifiche);
+        const modificheInAttesa = new Map();   // "id:campo" -> {trasferta_id, field, value}
+        let timerInvio = null;
+
+        // Aggiorna la copia in memoria, così la riga resta coerente quando viene ridisegnata
+        function aggiornaCache(trasfertaId, field, valore) {
+            for (const righe of griglia.blocchi.values()) {
+                const t = righe.find(r => String(r.id) === String(trasfertaId));
+                if (t) t[field] = valore;
+            }
+        }
+
+        function inviaModifiche(uscita = false) {
+            clearTimeout(timerInvio);
+            timerInvio = null;
+            if (modificheInAttesa.size === 0) return;
+            const modifiche = [...modificheInAttesa.values()].slice(0, MAX_MODIFICHE_PER_INVIO);
+            modifiche.forEach(m => modificheInAttesa.delete(`${m.trasferta_id}:${m.field}`));
+            if (modificheInAttesa.size > 0) timerInvio = setTimeout(inviaModifiche, 0);
+
+            fetch(URL_FLAG_BULK, {
+                method: 'POST',
+                keepalive: uscita,   // permette di completare l'invio anche chiudendo la pagina
+                headers: {
+                    'Content-Type': 'application/json',
+                    'X-CSRFToken': contenitore.dataset.csrf || ''
+                },
+                body: JSON.stringify({ modifiche: modifiche })
+            })
+                .then(response => response.json().catch(() => ({})).then(data => {
+                    if (!response.ok || !data.success) {
+                        throw new Error(data.error || `Server error: ${response.status}`);
+                    }
+                    console.log(`Update riuscito (${data.aggiornate} modifiche)`);
+                }))
+                .catch(err => {
+                    console.error('Fetch error:', err);
+                    alert('Errore nell\'aggiornamento: ' + err.message);
+                    // Revert delle modifiche non salvate (se nel frattempo non sono state ricliccate)
+                    modifiche.forEach(m => {
+                        if (!modificheInAttesa.has(`${m.trasferta_id}:${m.field}`)) {
+                            aggiornaCache(m.trasferta_id, m.field, !m.value);
+                        }
+                    });
+                    disegna();
+                });
+        }
+
+        corpo.addEventListener('change', function (evento) {
+            const chk = evento.target.closest('.presenze-check');
+            if (!chk) return;
+            const modifica = { trasferta_id: Number(chk.dataset.id), field: chk.dataset.field, value: chk.checked };
+            aggiornaCache(modifica.trasferta_id, modifica.field, modifica.value);
+            modificheInAttesa.set(`${modifica.trasferta_id}:${modifica.field}`, modifica);
+
+            clearTimeout(timerInvio);
+            timerInvio = setTimeout(inviaModifiche,
+                modificheInAttesa.size >= MAX_MODIFICHE_PER_INVIO ? 0 : ATTESA_INVIO_MS);
+        });
+
+        // Non perdere gli ultimi clic se l'utente lascia la pagina prima dell'invio
+        document.addEventListener('visibilitychange', () => {
+            if (document.visibilityState === 'hidden') inviaModifiche(true);
+        });
+        window.addEventListener('pagehide', () => inviaModifiche(true));
+    });
+})();
@@ -0,0 +1,38 @@
+// Filtri per colonna: ogni tabella con campi .column-filter (data-col = indice della colonna)
+// nell'intestazione filtra solo le proprie righe, senza richieste al server.
+(function () {
+    function collegaFiltri(tabella) {
+        const filtri = tabella.querySelectorAll('thead .column-filter');
+        if (filtri.length === 0) return;
+        const righe = tabella.querySelectorAll('tbody tr');
+
+        function filtra() {
+            const attivi = {};
+            filtri.forEach(filtro => {
+                const valore = filtro.value.toLowerCase().trim();
+                if (valore !== '') attivi[filtro.dataset.col] = valore;
+            });
+
+            righe.forEach(riga => {
+                let visibile = true;
+                for (const colonna in attivi) {
+                    const cella = riga.cells[colonna];
+                    if (cella && !cella.textContent.toLowerCase().includes(attivi[colonna])) {
+                        visibile = false;
+                        break;
+                    }
+                }
+                riga.style.display = visibile ? '' : 'none';
+            });
+        }
+
+        filtri.forEach(filtro => {
+            filtro.addEventListener('keyup', filtra);
+            filtro.addEventListener('change', filtra);
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('table').forEach(collegaFiltri);
+    });
+})();
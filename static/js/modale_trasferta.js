@@ -0,0 +1,46 @@
+// Modale di dettaglio/approvazione di una trasferta (#approvazioneModal). I pulsanti
+// .open-approvazione-modal, anche quelli creati dopo il caricamento della pagina, ne caricano
+// il contenuto da /get_modale_content/<id>/<fase>; data-readonly="true" apre la sola lettura,
+// data-titolo sostituisce il titolo predefinito della fase.
+(function () {
+    const TITOLI = {
+        'pre': 'Dettagli e Approvazione Pre-Missione',
+        'rendiconto': 'Dettagli e Approvazione Rendiconto (Fase Post)',
+        'rimborso': 'Approvazione Rendiconto Finale'
+    };
+
+    document.addEventListener('click', function (evento) {
+        const bottone = evento.target.closest('.open-approvazione-modal');
+        const modale = document.getElementById('approvazioneModal');
+        if (!bottone || !modale) return;
+
+        const fase = bottone.dataset.fase;
+        const solaLettura = bottone.dataset.readonly === 'true';
+        const contenuto = document.getElementById('modale-body-content');
+        const titolo = bottone.dataset.titolo || TITOLI[fase] || 'Dettagli';
+
+        document.getElementById('approvazioneModalLabel').textContent = titolo + (solaLettura ? ' (Sola Lettura)' : '');
+        contenuto.innerHTML = '<div class="text-center p-3"><div class="spinner-border text-primary" role="status"></div><br>Caricamento dati...</div>';
+        bootstrap.Modal.getOrCreateInstance(modale).show();
+
+        let url = `/get_modale_content/${bottone.dataset.id}/${fase}`;
+        if (solaLettura) {
+            url += '?readonly=true';
+        }
+
+        fetch(url)
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`Errore HTTP ${response.status}: Impossibile caricare il contenuto.`);
+                }
+                return response.text();
+            })
+            .then(html => {
+                contenuto.innerHTML = html;
+            })
+            .catch(error => {
+                console.error('Fetch error:', error);
+                contenuto.innerHTML = `<p class="text-danger">Errore durante il caricamento: ${error.message}</p>`;
+            });
+    });
+})();
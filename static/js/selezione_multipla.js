@@ -0,0 +1,42 @@
+// Selezione multipla per le azioni di gruppo (approvazione multipla, lotto di pagamento):
+// caselle .seleziona-trasferta, "seleziona tutte" #seleziona-tutte (solo sulle righe visibili
+// con i filtri attivi), conteggio in #conteggio-selezionate e, se presente, somma dei
+// data-importo in #totale-selezionate.
+(function () {
+    document.addEventListener('DOMContentLoaded', function () {
+        const selezionaTutte = document.getElementById('seleziona-tutte');
+        const caselle = document.querySelectorAll('.seleziona-trasferta');
+        if (caselle.length === 0) return;
+        const conteggio = document.getElementById('conteggio-selezionate');
+        const totale = document.getElementById('totale-selezionate');
+
+        function visibile(casella) {
+            const riga = casella.closest('tr');
+            return !riga || riga.style.display !== 'none';
+        }
+
+        function aggiorna() {
+            const selezionate = [...caselle].filter(c => c.checked);
+            if (conteggio) conteggio.textContent = selezionate.length;
+            if (totale) {
+                totale.textContent = selezionate
+                    .reduce((somma, c) => somma + parseFloat(c.dataset.importo || 0), 0)
+                    .toFixed(2);
+            }
+            if (selezionaTutte) {
+                selezionaTutte.checked = selezionate.length > 0 && selezionate.length === caselle.length;
+                selezionaTutte.indeterminate = selezionate.length > 0 && selezionate.length < caselle.length;
+            }
+        }
+
+        if (selezionaTutte) {
+            selezionaTutte.addEventListener('change', function () {
+                caselle.forEach(c => {
+                    if (visibile(c)) c.checked = this.checked;
+                });
+                aggiorna();
+            });
+        }
+        caselle.forEach(c => c.addEventListener('change', aggiorna));
+    });
+})();
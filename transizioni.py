@@ -0,0 +1,177 @@
+# transizioni.py
+
+# ====================================================================
+# MOTORE DELLE TRANSIZIONI DI STATO
+# ====================================================================
+# Ogni passaggio di stato del workflow è descritto in TRANSIZIONI ed eseguito con un solo
+# UPDATE condizionale (compare-and-set):
+#   UPDATE trasferta SET <stato> = <nuovo>, ... WHERE id = :id AND <stato> IN (<attesi>) AND <autorizzazione>
+# Stato atteso e diritto di agire stanno nella WHERE: se dirigente e delegato agiscono insieme,
+# il secondo UPDATE non trova più la riga nello stato atteso e non tocca nulla. Nessuna SELECT
+# preliminare e nessun lock di riga; i dati per il messaggio tornano con RETURNING.
+# Solo se l'UPDATE non aggiorna nulla una SELECT spiega il perché (per i messaggi all'utente).
+#
+# Chiavi di ogni transizione:
+#   colonna        colonna di stato controllata e aggiornata
+#   da             stati di partenza ammessi
+#   a              nuovo stato (etichetta o espressione SQL)
+#   autorizzazione 'approvatore' (dirigente o delegato attivo, vedi is_authorized_approver),
+#                  'richiedente', oppure None se il ruolo è già verificato dal decoratore della rotta
+#   traccia        (colonna id approvatore, colonna data) da valorizzare con utente e ora correnti
+#   anche          altre colonne fisse da scrivere insieme allo stato
+from datetime import datetime, date
+
+from flask import abort
+from flask_login import current_user
+from sqlalchemy import or_, and_, select, true, update, case, literal
+
+from models import db, Dipendente, Trasferta, Delega
+from autorizzazioni import filtro_deleghe_attive
+
+
+def _stato_post(etichetta):
+    """Letterale tipizzato come stato_post_missione (serve dentro a CASE, dove il tipo non si deduce)."""
+    return literal(etichetta, Trasferta.stato_post_missione.type)
+
+
+TRANSIZIONI = {
+    # --- Fase 1: pre-missione ---
+    'approva_pre': {
+        'colonna': 'stato_pre_missione', 'da': ('In attesa',), 'a': 'Approvata',
+        'autorizzazione': 'approvatore',
+        'traccia': ('id_approvatore_pre', 'data_approvazione_pre'),
+    },
+    'rifiuta_pre': {
+        'colonna': 'stato_pre_missione', 'da': ('In attesa',), 'a': 'Rifiutata',
+        'autorizzazione': 'approvatore',
+        'traccia': ('id_approvatore_pre', 'data_approvazione_pre'),
+    },
+    # --- Fase 2: rendiconto ---
+    'approva_rendiconto': {
+        # Con spese si passa all'Amministrazione, senza spese l'iter è concluso
+        'colonna': 'stato_post_missione', 'da': ('In attesa',),
+        'a': case((Trasferta.numero_spese > 0, _stato_post('Pronta per rimborso')), else_=_stato_post('Conclusa')),
+        'autorizzazione': 'approvatore',
+        'traccia': ('id_approvatore_post', 'data_approvazione_post'),
+    },
+    'rifiuta_rendiconto': {
+        # Torna al dipendente per la correzione
+        'colonna': 'stato_post_missione', 'da': ('In attesa',), 'a': 'Rifiutata post',
+        'autorizzazione': 'approvatore',
+        'traccia': ('id_approvatore_post', 'data_approvazione_post'),
+    },
+    'nega_rimborso': {
+        'colonna': 'stato_post_missione', 'da': ('In attesa',), 'a': 'Rimborso negato',
+        'autorizzazione': 'approvatore',
+        'traccia': ('id_approvatore_post', 'data_approvazione_post'),
+    },
+    'richiedi_rimborso': {
+        'colonna': 'stato_post_missione', 'da': ('Pronta per rimborso',), 'a': 'Rimborso Richiesto',
+        'autorizzazione': 'richiedente',
+    },
+    # --- Fase 3: Amministrazione ---
+    'approva_rimborso_finale': {
+        'colonna': 'stato_post_missione', 'da': ('Pronta per rimborso',), 'a': 'Rimborsata',
+        'autorizzazione': None,
+        'traccia': ('id_approvatore_finale', 'data_approvazione_finale'),
+        'anche': {'stato_approvazione_finale': 'Rimborsata'},
+    },
+    'rifiuta_rimborso_finale': {
+        'colonna': 'stato_post_missione', 'da': ('Pronta per rimborso',), 'a': 'Non rimborsata',
+        'autorizzazione': None,
+        'traccia': ('id_approvatore_finale', 'data_approvazione_finale'),
+        'anche': {'stato_approvazione_finale': 'Non rimborsata'},
+    },
+}
+
+# Colonne restituite dopo la transizione (o lette per spiegarne il fallimento)
+COLONNE_ESITO_TRANSIZIONE = (
+    Trasferta.id,
+    Trasferta.stato_pre_missione,
+    Trasferta.stato_post_missione,
+    Trasferta.giorno_missione,
+    select(Dipendente.nome).where(Dipendente.id == Trasferta.id_dipendente)
+    .scalar_subquery().label('nome_richiedente'),
+)
+
+
+def _condizione_autorizzazione(tipo):
+    """Traduzione in SQL delle regole di autorizzazione, valutata dal database nella WHERE."""
+    if tipo == 'approvatore':
+        # Stesse regole di is_authorized_approver: dirigente diretto, oppure delegato attivo
+        # ma mai sulle missioni richieste dal proprio delegante
+        deleganti = select(Delega.id_delegante).where(*filtro_deleghe_attive(current_user.id, date.today()))
+        return or_(
+            Trasferta.id_dirigente == current_user.id,
+            and_(Trasferta.id_dirigente.in_(deleganti), Trasferta.id_dipendente != Trasferta.id_dirigente),
+        )
+    if tipo == 'richiedente':
+        return Trasferta.id_dipendente == current_user.id
+    return true()
+
+
+def _update_transizione(nome, condizione_id, valori):
+    """UPDATE condizionale della transizione `nome` e condizione SQL di autorizzazione usata nella WHERE."""
+    transizione = TRANSIZIONI[nome]
+    colonna = getattr(Trasferta, transizione['colonna'])
+    autorizzato = _condizione_autorizzazione(transizione['autorizzazione'])
+
+    nuovi_valori = {
+        transizione['colonna']: transizione['a'],
+        # Core UPDATE: la versione (cache dei modali) va incrementata qui
+        'versione': Trasferta.versione + 1,
+        **transizione.get('anche', {}),
+        **valori,
+    }
+    if transizione.get('traccia'):
+        colonna_approvatore, colonna_data = transizione['traccia']
+        nuovi_valori[colonna_approvatore] = current_user.id
+        nuovi_valori[colonna_data] = datetime.now()
+
+    stmt = (
+        update(Trasferta)
+        .where(condizione_id, colonna.in_(transizione['da']), autorizzato)
+        .values(nuovi_valori)
+        .returning(*COLONNE_ESITO_TRANSIZIONE)
+        .execution_options(synchronize_session=False)
+    )
+    return stmt, autorizzato
+
+
+def esegui_transizione(nome, trasferta_id, **valori):
+    """
+    Esegue la transizione `nome` sulla trasferta con un solo UPDATE condizionale.
+    valori: colonne aggiuntive da scrivere insieme allo stato (es. le note dell'approvatore).
+
+    Restituisce (esito, riga) con esito:
+      'ok'              transizione avvenuta, riga = COLONNE_ESITO_TRANSIZIONE dopo l'UPDATE
+      'non_autorizzato' l'utente non può agire su questa trasferta
+      'stato'           la trasferta non è (più) in uno degli stati di partenza; riga = stato attuale
+    Se la trasferta non esiste risponde 404. Il commit è a carico del chiamante.
+    """
+    stmt, autorizzato = _update_transizione(nome, Trasferta.id == trasferta_id, valori)
+    riga = db.session.execute(stmt).first()
+    if riga is not None:
+        return 'ok', riga
+
+    # Nessuna riga aggiornata: lettura solo per scegliere il messaggio
+    riga = db.session.execute(
+        select(*COLONNE_ESITO_TRANSIZIONE, case((autorizzato, True), else_=False).label('autorizzato'))
+        .where(Trasferta.id == trasferta_id)
+    ).first()
+    if riga is None:
+        abort(404)
+    return ('non_autorizzato' if not riga.autorizzato else 'stato'), riga
+
+
+def esegui_transizioni(nome, trasferta_ids, **valori):
+    """
+    Versione a insiemi di esegui_transizione: un solo UPDATE ... WHERE id IN (...) per tutte le
+    trasferte indicate. Stato atteso e autorizzazione sono valutati riga per riga nella stessa WHERE,
+    quindi vengono aggiornate solo le trasferte ammesse; le altre restano invariate.
+    Restituisce le righe aggiornate (COLONNE_ESITO_TRANSIZIONE). Il commit è a carico del chiamante.
+    """
+    if not trasferta_ids:
+        return []
+    stmt, _ = _update_transizione(nome, Trasferta.id.in_(trasferta_ids), valori)
+    return db.session.execute(stmt).all()
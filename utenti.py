@@ -0,0 +1,104 @@
+# utenti.py
+
+# ====================================================================
+# CACHE DEGLI UTENTI AUTENTICATI
+# ====================================================================
+# load_user viene chiamato a ogni richiesta autenticata, comprese le chiamate AJAX dei
+# modali e delle caselle di Presenze. Il Dipendente viene quindi conservato in memoria
+# (per processo) come copia in sola lettura, valida per UTENTI_CACHE_TTL secondi e finché
+# la sua versione non cambia: le rotte che modificano ruolo, password o dirigente chiamano
+# incrementa_versione_utente() dopo il commit, così la modifica vale subito nel processo
+# che la esegue; gli altri processi si allineano al più tardi alla scadenza del TTL.
+# La copia non è legata alla sessione SQLAlchemy: chi deve modificare l'utente loggato
+# carica la riga vera (vedi cambia_password).
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from flask_login import LoginManager, UserMixin
+from sqlalchemy.orm import joinedload
+
+from models import Dipendente
+
+# Collegato all'app da create_app (login_manager.init_app)
+login_manager = LoginManager()
+login_manager.login_view = 'autenticazione.login'
+
+
+UTENTI_CACHE_MAX_VOCI = 5000
+CAMPI_UTENTE_IN_CACHE = ('id', 'nome', 'cognome', 'email', 'ruolo', 'id_dirigente')
+
+_cache_utenti = {}       # id -> (versione, scadenza, UtenteInCache)
+_versioni_utenti = {}    # id -> contatore incrementato a ogni modifica dell'utente
+_cache_utenti_lock = threading.Lock()
+
+
+class UtenteInCache(UserMixin):
+    """Copia immutabile e staccata dalla sessione di un Dipendente (senza password_hash)."""
+
+    __slots__ = CAMPI_UTENTE_IN_CACHE + ('dirigente_responsabile',)
+
+    def __init__(self, dipendente, dirigente_responsabile=None):
+        for campo in CAMPI_UTENTE_IN_CACHE:
+            object.__setattr__(self, campo, getattr(dipendente, campo))
+        object.__setattr__(self, 'dirigente_responsabile', dirigente_responsabile)
+
+    def __setattr__(self, nome, valore):
+        raise AttributeError(
+            f"L'utente in cache è in sola lettura: caricare il Dipendente {self.id} per modificarlo.")
+
+    __delattr__ = __setattr__
+
+    def get_id(self):
+        return str(self.id)
+
+    def __repr__(self):
+        return f"UtenteInCache('{self.nome}', '{self.ruolo}')"
+
+
+def _copia_utente(dipendente):
+    dirigente = dipendente.dirigente_responsabile
+    return UtenteInCache(dipendente, UtenteInCache(dirigente) if dirigente is not None else None)
+
+
+def incrementa_versione_utente(user_id):
+    """Rende obsoleta la copia in cache dell'utente: la prossima richiesta lo rilegge dal DB."""
+    with _cache_utenti_lock:
+        _versioni_utenti[user_id] = _versioni_utenti.get(user_id, 0) + 1
+        _cache_utenti.pop(user_id, None)
+
+
+def invalida_cache_utenti():
+    """Svuota l'intera cache degli utenti (usata dagli script di verifica dopo un reseed)."""
+    with _cache_utenti_lock:
+        _cache_utenti.clear()
+
+
+# Funzione per il caricamento dell'utente di Flask-Login
+@login_manager.user_loader
+def load_user(user_id):
+    user_id = int(user_id)
+    adesso = datetime.now()
+    with _cache_utenti_lock:
+        versione = _versioni_utenti.get(user_id, 0)
+        voce = _cache_utenti.get(user_id)
+    if voce is not None and voce[0] == versione and voce[1] > adesso:
+        return voce[2]
+
+    # Carica il Dipendente e contemporaneamente la sua relazione 'dirigente_responsabile'
+    dipendente = Dipendente.query.options(
+        joinedload(Dipendente.dirigente_responsabile)
+    ).get(user_id)
+    if dipendente is None:
+        return None
+
+    utente = _copia_utente(dipendente)
+    ttl = current_app.config['UTENTI_CACHE_TTL']
+    if ttl > 0:
+        with _cache_utenti_lock:
+            # La versione letta prima della query: se nel frattempo l'utente è stato
+            # modificato, la voce salvata risulta già obsoleta e verrà riletta.
+            if len(_cache_utenti) >= UTENTI_CACHE_MAX_VOCI and user_id not in _cache_utenti:
+                _cache_utenti.pop(next(iter(_cache_utenti)))
+            _cache_utenti[user_id] = (versione, adesso + timedelta(seconds=ttl), utente)
+    return utente
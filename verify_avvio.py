@@ -0,0 +1,107 @@
+import os
+import sys
+import json
+import tempfile
+import subprocess
+import statistics
+from datetime import datetime
+
+# Uso:
+#   python verify_avvio.py                         -> 7 avvii a freddo, soglia 1500 ms sulla mediana
+#   python verify_avvio.py --avvii 15 --soglia 1200
+#   python verify_avvio.py --salva avvio.jsonl     -> aggiunge il risultato (con commit e data) al file
+#
+# Ogni avvio è un processo Python nuovo, come un worker gunicorn o un'istanza Vercel a freddo:
+# si misura il tempo da 'import app' (factory compresa) alla prima risposta servita
+# (GET /login, che non tocca il database). Si verifica inoltre che all'avvio non vengano
+# importati i moduli pesanti che l'app carica solo quando servono (alembic, export, pyarrow).
+AVVII = 7
+SOGLIA_MS = 1500
+if '--avvii' in sys.argv:
+    AVVII = int(sys.argv[sys.argv.index('--avvii') + 1])
+if '--soglia' in sys.argv:
+    SOGLIA_MS = float(sys.argv[sys.argv.index('--soglia') + 1])
+FILE_STORICO = sys.argv[sys.argv.index('--salva') + 1] if '--salva' in sys.argv else None
+
+# Moduli che non devono essere importati per rispondere alla prima richiesta
+MODULI_DIFFERITI = ('flask_migrate', 'alembic', 'pyarrow', 'export_colonnare', 'export_presenze', 'forms')
+
+CODICE_AVVIO = '''
+import sys, json, time
+inizio = time.perf_counter()
+import app
+importata = time.perf_counter()
+risposta = app.app.test_client().get('/login')
+risposta.get_data()
+fine = time.perf_counter()
+print(json.dumps({
+    'import_ms': (importata - inizio) * 1000,
+    'prima_risposta_ms': (fine - importata) * 1000,
+    'totale_ms': (fine - inizio) * 1000,
+    'status': risposta.status_code,
+    'moduli_differiti': [m for m in %r if m in sys.modules],
+}))
+''' % (MODULI_DIFFERITI,)
+
+
+def avvio_a_freddo(ambiente):
+    esito = subprocess.run([sys.executable, '-c', CODICE_AVVIO], capture_output=True, text=True,
+                           cwd=os.path.dirname(os.path.abspath(__file__)), env=ambiente)
+    if esito.returncode != 0:
+        raise RuntimeError(esito.stderr)
+    return json.loads(esito.stdout.strip().splitlines()[-1])
+
+
+def commit_corrente():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def verify_avvio():
+    print("--- VERIFICA AVVIO A FREDDO (IMPORT -> PRIMA RISPOSTA) ---")
+    ambiente = dict(os.environ)
+    # Database temporaneo: l'avvio non deve creare né toccare il database locale
+    ambiente['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'verify_avvio.db')
+    ambiente.pop('FLASK_RUN_FROM_CLI', None)
+
+    # Il primo avvio compila i .pyc: non conta, come il primo deploy
+    avvio_a_freddo(ambiente)
+    misure = [avvio_a_freddo(ambiente) for _ in range(AVVII)]
+
+    falliti = []
+    riepilogo = {}
+    print(f"\n{'Fase':<20} {'Mediana':>9} {'Min':>9} {'Max':>9}")
+    for fase in ('import_ms', 'prima_risposta_ms', 'totale_ms'):
+        valori = [m[fase] for m in misure]
+        riepilogo[fase] = statistics.median(valori)
+        print(f"{fase[:-3]:<20} {statistics.median(valori):>9.1f} {min(valori):>9.1f} {max(valori):>9.1f}")
+
+    for m in misure:
+        if m['status'] != 200:
+            falliti.append(f"GET /login ha risposto {m['status']}")
+        if m['moduli_differiti']:
+            falliti.append(f"moduli importati all'avvio: {', '.join(m['moduli_differiti'])}")
+    if riepilogo['totale_ms'] > SOGLIA_MS:
+        falliti.append(f"mediana import -> prima risposta {riepilogo['totale_ms']:.0f} ms, soglia {SOGLIA_MS:.0f} ms")
+
+    if FILE_STORICO:
+        with open(FILE_STORICO, 'a') as f:
+            f.write(json.dumps({'data': datetime.now().isoformat(timespec='seconds'), 'commit': commit_corrente(),
+                                'avvii': AVVII, **{k: round(v, 1) for k, v in riepilogo.items()}}) + '\n')
+        print(f"\nRisultato aggiunto a {FILE_STORICO}")
+
+    if falliti:
+        for f in sorted(set(falliti)):
+            print(f"[FAILURE] {f}")
+        print(f"\nCRITICAL: {len(set(falliti))} problemi all'avvio.")
+        return False
+    print(f"\n[SUCCESS] Avvio a freddo in {riepilogo['totale_ms']:.0f} ms (mediana su {AVVII}), "
+          f"nessun modulo differito importato.")
+    return True
+
+
+if __name__ == '__main__':
+    sys.exit(0 if verify_avvio() else 1)
@@ -0,0 +1,239 @@
+import os
+import sys
+import time
+import random
+import socket
+import tempfile
+import threading
+import subprocess
+import http.client
+from urllib.parse import urlencode
+
+# Uso:
+#   python verify_concorrenza.py                      -> sync, thread e green; 2 worker, 16 client, 10 s per modalità
+#   python verify_concorrenza.py --modalita sync thread --workers 4 --client 32 --durata 30 --trasferte 20000
+#
+# Confronta le modalità dei worker gunicorn (concorrenza.py) sullo stesso mix di rotte. Per ogni
+# modalità avvia gunicorn con gunicorn.conf.py su un SQLite temporaneo popolato con
+# genera_dati_sintetici, fa un riscaldamento e poi tiene occupato il server con N client per
+# la durata indicata. Riporta richieste al secondo, p50 e p99 delle latenze, e il p99 delle sole
+# rotte veloci: con i worker sync un export lento blocca un processo e fa attendere anche loro.
+# La modalità green richiede gevent; se non è installato viene saltata.
+MODALITA = ['sync', 'thread', 'green']
+WORKERS = 2
+CLIENT = 16
+DURATA = 10
+RISCALDAMENTO = 2
+TRASFERTE = 5000
+DIPENDENTI = 300
+SEME = 42
+
+
+def _argomento(nome, tipo, default):
+    if nome in sys.argv:
+        return tipo(sys.argv[sys.argv.index(nome) + 1])
+    return default
+
+
+if '--modalita' in sys.argv:
+    MODALITA = []
+    for valore in sys.argv[sys.argv.index('--modalita') + 1:]:
+        if valore.startswith('--'):
+            break
+        MODALITA.append(valore)
+WORKERS = _argomento('--workers', int, WORKERS)
+CLIENT = _argomento('--client', int, CLIENT)
+DURATA = _argomento('--durata', float, DURATA)
+TRASFERTE = _argomento('--trasferte', int, TRASFERTE)
+
+_cartella = tempfile.mkdtemp()
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_cartella, 'verify_concorrenza.db')
+
+from app import app, db
+from models import Dipendente, Trasferta
+from genera_dati_sintetici import genera, PASSWORD_SINTETICA
+
+CARTELLA_APP = os.path.dirname(os.path.abspath(__file__))
+
+
+def prepara_database():
+    """Popola il database e restituisce, per ruolo, l'email di un utente e una sua trasferta."""
+    with app.app_context():
+        db.create_all()
+        genera(DIPENDENTI, TRASFERTE, seme=SEME, log=lambda *args: None)
+        utenti = {}
+        for ruolo in ('Dipendente', 'Dirigente', 'Amministrazione', 'Presenze'):
+            utente = (Dipendente.query.join(Trasferta, Trasferta.id_dipendente == Dipendente.id)
+                      .filter(Dipendente.ruolo == ruolo).first()
+                      or Dipendente.query.filter_by(ruolo=ruolo).first())
+            trasferta = Trasferta.query.filter_by(id_dipendente=utente.id).first()
+            utenti[ruolo] = (utente.email, trasferta.id if trasferta else None)
+        db.session.remove()
+    return utenti
+
+
+def mix_di_rotte(utenti):
+    """(ruolo, percorso, peso, lenta): le proporzioni approssimano il traffico di una giornata."""
+    id_trasferta = utenti['Dipendente'][1]
+    return [
+        ('Dipendente', '/', 20, False),
+        ('Dipendente', '/mie_trasferte', 20, False),
+        ('Dipendente', f'/dettagli_trasferta/{id_trasferta}', 15, False),
+        ('Dirigente', '/', 15, False),
+        ('Amministrazione', '/dashboard_amministrazione', 10, False),
+        ('Presenze', '/dashboard_presenze', 8, False),
+        ('Presenze', '/api/presenze/griglia?offset=0&limit=100', 8, False),
+        ('Presenze', '/export_csv_presenze', 2, True),
+    ]
+
+
+def porta_libera():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def richiesta(porta, metodo, percorso, cookie=None, corpo=None):
+    connessione = http.client.HTTPConnection('127.0.0.1', porta, timeout=120)
+    try:
+        intestazioni = {'Connection': 'close'}
+        if cookie:
+            intestazioni['Cookie'] = cookie
+        if corpo is not None:
+            intestazioni['Content-Type'] = 'application/x-www-form-urlencoded'
+        connessione.request(metodo, percorso, body=corpo, headers=intestazioni)
+        risposta = connessione.getresponse()
+        risposta.read()
+        return risposta
+    finally:
+        connessione.close()
+
+
+def accedi(porta, email):
+    risposta = richiesta(porta, 'POST', '/login', corpo=urlencode({'email': email, 'password': PASSWORD_SINTETICA}))
+    for nome, valore in risposta.getheaders():
+        if nome.lower() == 'set-cookie' and valore.startswith('session='):
+            return valore.split(';', 1)[0]
+    raise RuntimeError(f"Accesso non riuscito per {email} (status {risposta.status})")
+
+
+def avvia_server(modalita, porta, log):
+    ambiente = dict(os.environ)
+    ambiente.update(WEB_WORKER_MODALITA=modalita, WEB_CONCURRENCY=str(WORKERS))
+    ambiente.pop('DB_POOL_SIZE', None)
+    processo = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{porta}', 'app:app'],
+        cwd=CARTELLA_APP, env=ambiente, stdout=log, stderr=log)
+    scadenza = time.monotonic() + 30
+    while time.monotonic() < scadenza:
+        if processo.poll() is not None:
+            raise RuntimeError(f"gunicorn ({modalita}) terminato all'avvio: vedi {log.name}")
+        try:
+            if richiesta(porta, 'GET', '/login').status == 200:
+                return processo
+        except OSError:
+            time.sleep(0.2)
+    processo.terminate()
+    raise RuntimeError(f"gunicorn ({modalita}) non risponde dopo 30 s: vedi {log.name}")
+
+
+def carico(porta, mix, cookie, durata, indice, misure):
+    rnd = random.Random(SEME + indice)
+    pesi = [peso for _, _, peso, _ in mix]
+    scadenza = time.monotonic() + durata
+    while time.monotonic() < scadenza:
+        ruolo, percorso, _, lenta = rnd.choices(mix, weights=pesi)[0]
+        inizio = time.perf_counter()
+        try:
+            status = richiesta(porta, 'GET', percorso, cookie=cookie[ruolo]).status
+        except OSError:
+            status = None
+        misure.append((percorso, lenta, (time.perf_counter() - inizio) * 1000, status,
+                       time.monotonic() <= scadenza))
+
+
+def esegui_carico(porta, mix, cookie, durata):
+    misure = []
+    client = [threading.Thread(target=carico, args=(porta, mix, cookie, durata, i, misure)) for i in range(CLIENT)]
+    for c in client:
+        c.start()
+    for c in client:
+        c.join()
+    return misure
+
+
+def percentile(valori, quota):
+    return valori[min(len(valori) - 1, int(len(valori) * quota))] if valori else 0.0
+
+
+def misura_modalita(modalita, utenti, mix):
+    porta = porta_libera()
+    with open(os.path.join(_cartella, f'gunicorn_{modalita}.log'), 'w') as log:
+        processo = avvia_server(modalita, porta, log)
+        try:
+            # Un accesso per ruolo, condiviso dai client: l'hashing delle password non entra nella misura
+            cookie = {ruolo: accedi(porta, email) for ruolo, (email, _) in utenti.items()}
+            esegui_carico(porta, mix, cookie, RISCALDAMENTO)
+            misure = esegui_carico(porta, mix, cookie, DURATA)
+        finally:
+            processo.terminate()
+            processo.wait(timeout=30)
+
+    # Le latenze includono le richieste terminate dopo la scadenza; il throughput conta
+    # solo quelle completate nella finestra di misura
+    tutte = sorted(ms for _, _, ms, _, _ in misure)
+    veloci = sorted(ms for _, lenta, ms, _, _ in misure if not lenta)
+    errori = {}
+    for percorso, _, _, status, _ in misure:
+        if status != 200:
+            errori[(percorso, status)] = errori.get((percorso, status), 0) + 1
+    return {
+        'richieste': len(misure),
+        'al_secondo': sum(1 for *_, in_finestra in misure if in_finestra) / DURATA,
+        'p50_ms': percentile(tutte, 0.50),
+        'p99_ms': percentile(tutte, 0.99),
+        'p99_veloci_ms': percentile(veloci, 0.99),
+        'errori': errori,
+    }
+
+
+def verify_concorrenza():
+    print("--- CONFRONTO DELLE MODALITÀ DEI WORKER (SYNC / THREAD / GREEN) ---")
+    print(f"{WORKERS} worker, {CLIENT} client, {DURATA:.0f} s per modalità, {TRASFERTE} trasferte (SQLite)")
+    utenti = prepara_database()
+    mix = mix_di_rotte(utenti)
+
+    risultati = {}
+    falliti = []
+    for modalita in MODALITA:
+        if modalita == 'green':
+            try:
+                import gevent  # noqa: F401
+            except ImportError:
+                print("Modalità green saltata: gevent non installato.")
+                continue
+        print(f"Misura della modalità {modalita}...")
+        try:
+            risultati[modalita] = misura_modalita(modalita, utenti, mix)
+        except RuntimeError as e:
+            falliti.append(str(e))
+            continue
+        for (percorso, status), quante in sorted(risultati[modalita]['errori'].items(), key=str):
+            falliti.append(f"{modalita}: {percorso} -> {status} ({quante} volte)")
+
+    print(f"\n{'Modalità':<10} {'Richieste':>10} {'Rich./s':>9} {'p50 ms':>9} {'p99 ms':>9} {'p99 veloci':>11}")
+    for modalita, r in risultati.items():
+        print(f"{modalita:<10} {r['richieste']:>10} {r['al_secondo']:>9.1f} {r['p50_ms']:>9.1f} "
+              f"{r['p99_ms']:>9.1f} {r['p99_veloci_ms']:>11.1f}")
+
+    if falliti:
+        for f in falliti:
+            print(f"[FAILURE] {f}")
+        print(f"\nCRITICAL: {len(falliti)} problemi durante il confronto.")
+        return False
+    print("\n[SUCCESS] Tutte le modalità hanno servito il mix di rotte senza errori.")
+    return True
+
+
+if __name__ == '__main__':
+    sys.exit(0 if verify_concorrenza() else 1)
@@ -53,7 +53,7 @@ def verify_delegate_restrictions():
             
             from unittest.mock import patch
             
-            with patch('app.current_user', mock_user):
+            with patch('autorizzazioni.current_user', mock_user):
                 
                 # TEST A: Missione di ROSSI (Dirigente Delegante)
                 trasferta_rossi = Trasferta(id_dipendente=rossi.id, id_dirigente=rossi.id)
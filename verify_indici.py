@@ -0,0 +1,178 @@
+import os
+import sys
+import tempfile
+from datetime import date
+
+# Uso:
+#   python verify_indici.py                         -> SQLite temporaneo con 20000 trasferte sintetiche
+#   python verify_indici.py --seed 50000            -> SQLite temporaneo con 50000 trasferte sintetiche
+#   python verify_indici.py --database-configurato  -> database configurato (DATABASE_URL / POSTGRES_URL /
+#                                                      SQLite locale), che deve già contenere le tabelle
+SEED_DEFAULT = 20000
+DATABASE_CONFIGURATO = '--database-configurato' in sys.argv
+SEED_RIGHE = None
+if not DATABASE_CONFIGURATO:
+    SEED_RIGHE = int(sys.argv[sys.argv.index('--seed') + 1]) if '--seed' in sys.argv else SEED_DEFAULT
+    _db_temp = os.path.join(tempfile.mkdtemp(), 'verify_indici.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + _db_temp
+
+from sqlalchemy import or_, and_, text, inspect, Integer, func, extract
+from app import app, db
+from filtri_trasferte import applica_filtri_e_cursore
+from rotte.workflow import STATI_PRE_VISIBILI_APPROVATORE, STATI_POST_VISIBILI_APPROVATORE
+from rotte.amministrazione import _filtra_storico, _finestra_storico
+from models import Dipendente, Trasferta, Delega, Spesa
+from genera_dati_sintetici import genera
+import stati
+
+
+def seed(n_trasferte, n_dipendenti=200):
+    """Popola un database vuoto con dati sintetici sufficienti a rendere significativo il piano."""
+    db.create_all()
+    genera(n_dipendenti, n_trasferte, seme=42)
+
+
+def query_code():
+    """Le query delle code di lavoro, costruite come nelle rotte di app.py."""
+    oggi = date.today()
+    dirigente = Dipendente.query.filter_by(ruolo='Dirigente').first()
+    id_dirigente = dirigente.id if dirigente else 1
+    ids_dirigenti = [id_dirigente]
+    nessun_filtro = {'stato': None, 'dal': None, 'al': None, 'richiedente': None}
+    nessun_filtro_storico = {'mese': None, 'richiedente': None, 'esito': None}
+    finestra = _finestra_storico(nessun_filtro_storico)
+    anno = extract('year', Trasferta.data_approvazione_finale)
+    mese = extract('month', Trasferta.data_approvazione_finale)
+
+    lista_approvatore = Trasferta.query.filter(or_(
+        Trasferta.id_dipendente == id_dirigente,
+        and_(
+            Trasferta.id_dirigente.in_(ids_dirigenti),
+            or_(
+                Trasferta.stato_pre_missione.in_(STATI_PRE_VISIBILI_APPROVATORE),
+                Trasferta.stato_post_missione.in_(STATI_POST_VISIBILI_APPROVATORE)
+            )
+        )
+    ))
+
+    return {
+        'mie_trasferte (dirigente)': applica_filtri_e_cursore(lista_approvatore, nessun_filtro, None, 25),
+        'mie_trasferte (dipendente)': applica_filtri_e_cursore(
+            Trasferta.query.filter(Trasferta.id_dipendente == id_dirigente + 1), nessun_filtro, None, 25),
+        'mie_trasferte (dipendente, filtro stato)': applica_filtri_e_cursore(
+            Trasferta.query.filter(Trasferta.id_dipendente == id_dirigente + 1),
+            dict(nessun_filtro, stato='In attesa'), None, 25),
+        'coda pre-missione in attesa': Trasferta.query.filter(
+            Trasferta.id_dirigente == id_dirigente, Trasferta.stato_pre_missione == 'In attesa'
+        ).order_by(Trasferta.giorno_missione),
+        'coda rendiconti in attesa': Trasferta.query.filter(
+            Trasferta.id_dirigente == id_dirigente, Trasferta.stato_post_missione == 'In attesa'
+        ).order_by(Trasferta.giorno_missione),
+        'amministrazione: da approvare': Trasferta.query.filter(
+            Trasferta.stato_post_missione == 'Pronta per rimborso',
+            Trasferta.stato_approvazione_finale == None
+        ).order_by(Trasferta.giorno_missione.asc()),
+        'amministrazione: storico': _filtra_storico(Trasferta.query, nessun_filtro_storico).order_by(
+            Trasferta.data_approvazione_finale.desc(), Trasferta.id.desc()
+        ).limit(51),
+        'amministrazione: totali per mese': _filtra_storico(
+            db.session.query(anno, mese, func.sum(Trasferta.totale_spese)), nessun_filtro_storico, *finestra
+        ).group_by(anno, mese),
+        'presenze: elenco': Trasferta.query.order_by(Trasferta.giorno_missione.desc()).limit(50),
+        'deleghe attive del delegato': Delega.query.filter(
+            Delega.id_delegato == id_dirigente + 1,
+            Delega.data_inizio <= oggi,
+            (Delega.data_fine.is_(None) | (Delega.data_fine >= oggi))
+        ),
+        'gestisci_deleghe: attive': Delega.query.filter(
+            Delega.id_delegante == id_dirigente,
+            (Delega.data_fine.is_(None) | (Delega.data_fine >= oggi))
+        ).order_by(Delega.data_inizio.asc()),
+        'gestisci_deleghe: scadute': Delega.query.filter(
+            Delega.id_delegante == id_dirigente, Delega.data_fine < oggi
+        ).order_by(Delega.data_fine.desc()),
+        'spese della trasferta': Spesa.query.filter(Spesa.id_trasferta == 1),
+    }
+
+
+def piano(query):
+    """Esegue EXPLAIN (Postgres) o EXPLAIN QUERY PLAN (SQLite) e restituisce le righe del piano."""
+    engine = db.engine
+    sql = str(query.statement.compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True}))
+
+    with engine.connect() as conn:
+        if engine.dialect.name == 'sqlite':
+            righe = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql).fetchall()
+            return [r[-1] for r in righe]
+        righe = conn.exec_driver_sql('EXPLAIN ' + sql.replace('%', '%%')).fetchall()
+        return [r[0] for r in righe]
+
+
+def usa_indice(righe_piano, dialetto):
+    testo = '\n'.join(righe_piano)
+    if dialetto == 'sqlite':
+        scansioni_complete = [r for r in righe_piano if r.startswith('SCAN') and 'INDEX' not in r]
+        return 'INDEX' in testo and not scansioni_complete
+    return 'Index' in testo and 'Seq Scan' not in testo
+
+
+def stati_non_codificati():
+    """Colonne di stato che nel database non sono ancora intere (migrazione 7b3e9f1c2a58 non applicata)."""
+    colonne = {c['name']: c['type'] for c in inspect(db.engine).get_columns('trasferta')}
+    return [nome for nome in stati.REGISTRI if not isinstance(colonne.get(nome), Integer)]
+
+
+def database_pronto():
+    """True se il database configurato contiene le tabelle, senza creare un file SQLite che non esiste."""
+    url = db.engine.url
+    if url.get_backend_name() == 'sqlite' and url.database and not os.path.exists(url.database):
+        return False
+    return inspect(db.engine).has_table('trasferta')
+
+
+def verify_indici():
+    print("--- VERIFICA USO DEGLI INDICI SULLE CODE DI LAVORO ---")
+    with app.app_context():
+        if SEED_RIGHE:
+            print(f"Creazione database sintetico con {SEED_RIGHE} trasferte...")
+            seed(SEED_RIGHE)
+        elif not database_pronto():
+            print(f"Errore: il database configurato ({db.engine.url.render_as_string(hide_password=True)}) "
+                  "non contiene le tabelle. Eseguire 'flask db upgrade' oppure omettere --database-configurato.")
+            sys.exit(1)
+
+        dialetto = db.engine.dialect.name
+        totale = Trasferta.query.count()
+        print(f"Database: {dialetto}, trasferte presenti: {totale}")
+        if totale < 1000:
+            print("[WARNING] Pochi dati: il planner potrebbe preferire scansioni sequenziali. Prova senza --database-configurato.")
+
+        # Statistiche aggiornate per il planner
+        with db.engine.begin() as conn:
+            conn.execute(text('ANALYZE'))
+
+        falliti = 0
+        non_codificati = stati_non_codificati()
+        if non_codificati:
+            falliti += len(non_codificati)
+            print(f"\n[FAILURE] Stati ancora testuali: {', '.join(non_codificati)} (eseguire flask db upgrade)")
+        else:
+            print("\n[SUCCESS] Colonne di stato codificate come interi")
+
+        for nome, query in query_code().items():
+            righe_piano = piano(query)
+            esito = usa_indice(righe_piano, dialetto)
+            falliti += 0 if esito else 1
+            print(f"\n[{'SUCCESS' if esito else 'FAILURE'}] {nome}")
+            for riga in righe_piano:
+                print(f"    {riga}")
+
+        print()
+        if falliti:
+            print(f"CRITICAL: {falliti} controlli falliti (indici o stati non codificati).")
+            sys.exit(1)
+        print("Tutte le query delle code usano un indice.")
+
+
+if __name__ == "__main__":
+    verify_indici()
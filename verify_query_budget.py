@@ -0,0 +1,358 @@
+import os
+import sys
+import math
+import random
+import tempfile
+from datetime import date, datetime, timedelta
+
+# Uso:
+#   python verify_query_budget.py                   -> confronta 100 e 10000 trasferte
+#   python verify_query_budget.py --righe 100 2000  -> dimensioni a scelta (la prima è il riferimento)
+#
+# Ogni dimensione viene verificata su un SQLite temporaneo ricreato da zero.
+# Per ogni rotta dei blueprint e per ogni ruolo (Dipendente, Dirigente, delegato, Amministrazione,
+# Presenze, Superuser) si conta il numero di statement SQL eseguiti dalla richiesta e si verifica che:
+#   1. la rotta dichiari un budget con @budget_query(N), subito sotto @bp.route;
+#   2. il conteggio non superi il budget;
+#   3. il conteggio sia identico a tutte le dimensioni (nessuna query per riga: niente N+1).
+#      Fanno eccezione le rotte in streaming dichiarate con @budget_query(N, per_blocco=K, righe_per_blocco=R):
+#      per loro sono ammessi N + K statement per ogni blocco di R righe, mai uno per riga.
+# Le rotte di sola lettura sono eseguite con tutti i ruoli; quelle che modificano dati con il ruolo
+# che le usa davvero, su trasferte preparate apposta nello stato giusto.
+DIMENSIONI = [100, 10000]
+if '--righe' in sys.argv:
+    DIMENSIONI = [int(v) for v in sys.argv[sys.argv.index('--righe') + 1:] if v.isdigit()]
+
+_db_temp = os.path.join(tempfile.mkdtemp(), 'verify_query_budget.db')
+os.environ['DATABASE_URL'] = 'sqlite:///' + _db_temp
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from werkzeug.security import generate_password_hash
+from app import app, db, invalida_cache_modali, invalida_cache_utenti
+from models import Dipendente, Trasferta, Delega, Spesa
+from monitoraggio import budget_della_rotta, budget_per_blocco
+from genera_dati_sintetici import genera_utenti, genera_deleghe, genera_trasferte, inserisci
+
+app.config['WTF_CSRF_ENABLED'] = False
+app.config['PROPAGATE_EXCEPTIONS'] = False
+
+# Utenti con ruolo fisso usati dagli scenari (gli altri sono generati)
+ID_DIRIGENTE, ID_DIPENDENTE, ID_DELEGATO, ID_AMMINISTRAZIONE, ID_PRESENZE, ID_SUPERUSER, ID_BERSAGLIO = range(1, 8)
+RUOLI = {
+    'Dipendente': ID_DIPENDENTE,
+    'Dirigente': ID_DIRIGENTE,
+    'delegato': ID_DELEGATO,
+    'Amministrazione': ID_AMMINISTRAZIONE,
+    'Presenze': ID_PRESENZE,
+    'Superuser': ID_SUPERUSER,
+}
+TUTTI = list(RUOLI)
+ANONIMO = 'anonimo'
+PASSWORD = 'password'
+
+# Trasferte "bersaglio" degli scenari: nome -> (richiedente, stato pre, stato post, numero spese)
+FIXTURE = {
+    'pre_attesa': (ID_DIPENDENTE, 'In attesa', 'N/A', 0),
+    'pre_attesa_delegato': (ID_DIPENDENTE, 'In attesa', 'N/A', 0),
+    'da_modificare': (ID_DIPENDENTE, 'In attesa', 'N/A', 0),
+    'da_rendicontare': (ID_DIPENDENTE, 'Approvata', 'N/A', 0),
+    'da_inviare': (ID_DIPENDENTE, 'Approvata', 'N/A', 0),
+    'spese_da_gestire': (ID_DIPENDENTE, 'Approvata', 'N/A', 0),
+    'post_attesa_a': (ID_DIPENDENTE, 'Approvata', 'In attesa', 2),
+    'post_attesa_b': (ID_DIPENDENTE, 'Approvata', 'In attesa', 2),
+    'post_attesa_c': (ID_DIPENDENTE, 'Approvata', 'In attesa', 2),
+    'pronta_a': (ID_DIPENDENTE, 'Approvata', 'Pronta per rimborso', 3),
+    'pronta_b': (ID_DIPENDENTE, 'Approvata', 'Pronta per rimborso', 3),
+    'pronta_c': (ID_DIPENDENTE, 'Approvata', 'Pronta per rimborso', 3),
+    'conclusa': (ID_DIPENDENTE, 'Approvata', 'Conclusa', 2),
+    'da_forzare': (ID_DIPENDENTE, 'Approvata', 'In attesa', 1),
+    'pre_multipla_a': (ID_DIPENDENTE, 'In attesa', 'N/A', 0),
+    'pre_multipla_b': (ID_DIPENDENTE, 'In attesa', 'N/A', 0),
+    'pronta_lotto_a': (ID_DIPENDENTE, 'Approvata', 'Pronta per rimborso', 2),
+    'pronta_lotto_b': (ID_DIPENDENTE, 'Approvata', 'Pronta per rimborso', 3),
+}
+
+
+def seed(n_trasferte):
+    """
+    Database realistico: i ruoli fissi degli scenari con le loro trasferte "bersaglio", più il volume
+    prodotto da genera_dati_sintetici (gerarchia, deleghe, trasferte in tutti gli stati con spese).
+    """
+    rnd = random.Random(7)
+    oggi = date.today()
+    hash_password = generate_password_hash(PASSWORD, method='pbkdf2:sha256:1000')
+    conn = db.session.connection()
+
+    # --- Utenti: ruoli fissi + organizzazione generata ---
+    utenti = [
+        {'id': ID_DIRIGENTE, 'ruolo': 'Dirigente', 'id_dirigente': ID_DIRIGENTE},
+        {'id': ID_DIPENDENTE, 'ruolo': 'Dipendente', 'id_dirigente': ID_DIRIGENTE},
+        {'id': ID_DELEGATO, 'ruolo': 'Dipendente', 'id_dirigente': ID_DIRIGENTE},
+        {'id': ID_AMMINISTRAZIONE, 'ruolo': 'Amministrazione', 'id_dirigente': None},
+        {'id': ID_PRESENZE, 'ruolo': 'Presenze', 'id_dirigente': None},
+        {'id': ID_SUPERUSER, 'ruolo': 'Superuser', 'id_dirigente': None},
+        {'id': ID_BERSAGLIO, 'ruolo': 'Dipendente', 'id_dirigente': ID_DIRIGENTE},
+    ]
+    for u in utenti:
+        u.update(nome=f'Nome{u["id"]}', cognome=f'Cognome{u["id"]}', email=f'utente{u["id"]}@budget.it',
+                 password_hash=hash_password)
+    generati = genera_utenti(max(40, n_trasferte // 50), rnd, primo_id=len(utenti) + 1, hash_password=hash_password)
+    utenti += generati
+    inserisci(conn, Dipendente, utenti)
+
+    # --- Deleghe: attiva verso il delegato, una revocabile, una scaduta, più quelle generate ---
+    deleghe = [
+        {'id_delegante': ID_DIRIGENTE, 'id_delegato': ID_DELEGATO, 'data_inizio': oggi - timedelta(days=60), 'data_fine': None},
+        {'id_delegante': ID_DIRIGENTE, 'id_delegato': ID_BERSAGLIO, 'data_inizio': oggi - timedelta(days=5), 'data_fine': oggi + timedelta(days=5)},
+        {'id_delegante': ID_DIRIGENTE, 'id_delegato': ID_DIPENDENTE, 'data_inizio': oggi - timedelta(days=400), 'data_fine': oggi - timedelta(days=300)},
+    ] + genera_deleghe(generati, rnd, oggi)
+    for posizione, delega in enumerate(deleghe, start=1):
+        delega['id'] = posizione
+    inserisci(conn, Delega, deleghe)
+
+    # --- Trasferte bersaglio (id 1..len(FIXTURE)), ciascuna nello stato richiesto dal proprio scenario ---
+    fixture_ids, trasferte, spese = {}, [], []
+    for id_trasferta, (nome, (richiedente, pre, post, n_spese)) in enumerate(FIXTURE.items(), start=1):
+        fixture_ids[nome] = id_trasferta
+        giorno = oggi - timedelta(days=id_trasferta)
+        trasferte.append({
+            'id': id_trasferta, 'id_dipendente': richiedente, 'id_dirigente': ID_DIRIGENTE,
+            'giorno_missione': giorno, 'missione_presso': 'Sede', 'motivo_missione': 'Riunione',
+            'stato_pre_missione': pre, 'stato_post_missione': post,
+            'id_approvatore_pre': ID_DIRIGENTE if pre != 'In attesa' else None,
+            'data_approvazione_pre': datetime.combine(giorno, datetime.min.time()) if pre != 'In attesa' else None,
+            'data_approvazione_post': datetime.combine(giorno, datetime.min.time()) if post != 'N/A' else None,
+            'totale_spese': 10.0 * n_spese, 'numero_spese': n_spese,
+        })
+        spese += [{'id': len(spese) + k, 'id_trasferta': id_trasferta, 'categoria': 'Vitto', 'descrizione': '',
+                   'importo': 10.0, 'data_spesa': giorno} for k in range(1, n_spese + 1)]
+    inserisci(conn, Trasferta, trasferte)
+    inserisci(conn, Spesa, spese)
+
+    # --- Volume: un terzo delle trasferte al dipendente di riferimento, così anche le sue liste crescono ---
+    altri = [u['id'] for u in generati if u['ruolo'] in ('Dipendente', 'Dirigente')]
+    richiedenti = altri + [ID_DIPENDENTE] * (len(altri) // 2) + [ID_DIRIGENTE, ID_DELEGATO] * (len(altri) // 20 + 1)
+    for trasferte, spese in genera_trasferte(utenti, n_trasferte - len(FIXTURE), rnd, oggi,
+                                             primo_id=len(FIXTURE) + 1, primo_id_spesa=len(spese) + 1,
+                                             richiedenti=richiedenti):
+        inserisci(conn, Trasferta, trasferte)
+        inserisci(conn, Spesa, spese)
+    db.session.commit()
+
+    fixture_ids['delega_revocabile'] = 2
+    return fixture_ids
+
+
+# --------------------------------------------------------------------
+# SCENARI: (endpoint, ruoli, metodo, percorso(F), dati(F))
+# --------------------------------------------------------------------
+def _form_spese(giorno):
+    return {
+        'spesa_categoria[]': ['Vitto', 'Trasporto'], 'spesa_importo[]': ['12.50', '30'],
+        'spesa_data[]': [giorno, giorno], 'spesa_descrizione[]': ['Pranzo', 'Treno'],
+    }
+
+
+GIORNO_FUTURO = (date.today() + timedelta(days=10)).isoformat()
+
+SCENARI_LETTURA = [
+    ('autenticazione.index', TUTTI + [ANONIMO], 'GET', lambda F: '/', None),
+    ('autenticazione.login', [ANONIMO], 'GET', lambda F: '/login', None),
+    ('autenticazione.register', [ANONIMO], 'GET', lambda F: '/register', None),
+    ('superuser.associa_dirigente_script', [ANONIMO], 'GET', lambda F: '/associa_dirigente.html', None),
+    ('autenticazione.cambia_password', TUTTI, 'GET', lambda F: '/cambia_password', None),
+    ('workflow.mie_trasferte', TUTTI, 'GET', lambda F: '/mie_trasferte', None),
+    ('workflow.mie_trasferte', TUTTI, 'GET', lambda F: '/mie_trasferte?stato=Approvata&dopo=2100-01-01_999999999', None),
+    ('workflow.gestisci_deleghe', TUTTI, 'GET', lambda F: '/gestisci_deleghe', None),
+    ('workflow.nuova_trasferta', TUTTI, 'GET', lambda F: '/nuova_trasferta', None),
+    ('workflow.get_modale_content', TUTTI, 'GET', lambda F: f'/get_modale_content/{F["post_attesa_a"]}/pre', None),
+    ('workflow.get_modale_content', TUTTI, 'GET', lambda F: f'/get_modale_content/{F["post_attesa_a"]}/rendiconto', None),
+    ('workflow.get_modale_content', TUTTI, 'GET', lambda F: f'/get_modale_content/{F["pronta_a"]}/rimborso', None),
+    ('workflow.report_trasferta', TUTTI, 'GET', lambda F: f'/report_trasferta/{F["conclusa"]}', None),
+    ('workflow.get_dettagli_trasferta', TUTTI, 'GET', lambda F: f'/get_dettagli_trasferta/{F["da_rendicontare"]}', None),
+    ('workflow.dettagli_trasferta', TUTTI, 'GET', lambda F: f'/dettagli_trasferta/{F["post_attesa_a"]}', None),
+    ('superuser.associa_dirigente', TUTTI, 'GET', lambda F: '/associa_dirigente', None),
+    ('amministrazione.dashboard_amministrazione', TUTTI, 'GET', lambda F: '/dashboard_amministrazione', None),
+    ('amministrazione.dashboard_amministrazione', TUTTI, 'GET',
+     lambda F: f'/dashboard_amministrazione?mese={date.today():%Y-%m}&richiedente={ID_DIPENDENTE}&esito=Rimborsata'
+               f'&dopo=2100-01-01T00:00:00_999999999', None),
+    ('superuser.dashboard_superuser', TUTTI, 'GET', lambda F: '/dashboard_superuser', None),
+    ('superuser.dashboard_superuser_missioni', TUTTI, 'GET', lambda F: '/dashboard_superuser/missioni', None),
+    ('superuser.dashboard_superuser_missioni_legacy', TUTTI, 'GET', lambda F: '/dashboard_superuser_missioni', None),
+    ('superuser.dashboard_superuser_utenti', TUTTI, 'GET', lambda F: '/dashboard_superuser/utenti', None),
+    ('superuser.dashboard_superuser_prestazioni', TUTTI, 'GET', lambda F: '/dashboard_superuser/prestazioni', None),
+    ('presenze.dashboard_presenze', TUTTI, 'GET', lambda F: '/dashboard_presenze', None),
+    ('presenze.griglia_presenze', TUTTI, 'GET', lambda F: '/api/presenze/griglia?offset=0&limit=100', None),
+    ('presenze.griglia_presenze', TUTTI, 'GET',
+     lambda F: '/api/presenze/griglia?ordina=dipendente&verso=asc&f_stato=Conclusa&f_giorno=2025&f_dipendente=a&offset=50',
+     None),
+    ('presenze.export_csv_presenze', TUTTI, 'GET', lambda F: '/export_csv_presenze', None),
+    ('presenze.export_csv_presenze', TUTTI, 'GET',
+     lambda F: f'/export_csv_presenze?dal=2000-01-01&al={GIORNO_FUTURO}&stato=Approvata&richiedente={ID_DIPENDENTE}', None),
+    ('presenze.export_parquet_presenze', TUTTI, 'GET', lambda F: '/export_parquet_presenze', None),
+    ('presenze.export_parquet_presenze', TUTTI, 'GET', lambda F: '/export_parquet_presenze?tabella=spese&stato=Approvata', None),
+]
+
+# Eseguiti in questo ordine, una volta, con il ruolo indicato
+SCENARI_SCRITTURA = [
+    ('autenticazione.login', [ANONIMO], 'POST', lambda F: '/login', lambda F: {'email': f'utente{ID_BERSAGLIO}@budget.it', 'password': PASSWORD}),
+    ('autenticazione.register', [ANONIMO], 'POST', lambda F: '/register',
+     lambda F: {'nome': 'Nuovo', 'cognome': 'Utente', 'email': 'nuovo@budget.it', 'password': PASSWORD}),
+    ('workflow.nuova_trasferta', ['Dipendente'], 'POST', lambda F: '/nuova_trasferta',
+     lambda F: {'giorno_missione': GIORNO_FUTURO, 'missione_presso': 'Roma', 'motivo_missione': 'Convegno'}),
+    ('workflow.modifica_trasferta', ['Dipendente'], 'GET', lambda F: f'/modifica_trasferta/{F["da_modificare"]}', None),
+    ('workflow.modifica_trasferta', ['Dipendente'], 'POST', lambda F: f'/modifica_trasferta/{F["da_modificare"]}',
+     lambda F: {'giorno_missione': GIORNO_FUTURO, 'missione_presso': 'Milano'}),
+    ('workflow.approva_trasferta', ['Dirigente'], 'POST', lambda F: f'/approva_trasferta/{F["pre_attesa"]}',
+     lambda F: {'azione': 'approva', 'commento': 'Ok'}),
+    ('workflow.approva_trasferta', ['delegato'], 'POST', lambda F: f'/approva_trasferta/{F["pre_attesa_delegato"]}',
+     lambda F: {'azione': 'rifiuta', 'commento': 'No'}),
+    ('workflow.approva_trasferte', ['delegato'], 'POST', lambda F: '/approva_trasferte',
+     lambda F: {'azione': 'approva', 'commento': 'Ok',
+                'trasferta_ids': [str(F['pre_multipla_a']), str(F['pre_multipla_b']), str(F['pre_attesa'])]}),
+    ('workflow.rendiconta_trasferta', ['Dipendente'], 'GET', lambda F: f'/rendiconta_trasferta/{F["da_rendicontare"]}', None),
+    ('workflow.rendiconta_trasferta', ['Dipendente'], 'POST', lambda F: f'/rendiconta_trasferta/{F["da_rendicontare"]}',
+     lambda F: dict(_form_spese(GIORNO_FUTURO), ora_inizio_effettiva='09:00', ora_fine_effettiva='17:00', km_percorsi='12')),
+    ('workflow.invia_rendiconto', ['Dipendente'], 'POST', lambda F: f'/invia_rendiconto/{F["da_inviare"]}', lambda F: _form_spese(GIORNO_FUTURO)),
+    ('workflow.gestisci_spese', ['Dipendente'], 'GET', lambda F: f'/trasferta/{F["spese_da_gestire"]}/gestisci_spese', None),
+    ('workflow.gestisci_spese', ['Dipendente'], 'POST', lambda F: f'/trasferta/{F["spese_da_gestire"]}/gestisci_spese',
+     lambda F: _form_spese(GIORNO_FUTURO)),
+    ('workflow.approva_rendiconto', ['Dirigente'], 'POST', lambda F: f'/approva_rendiconto/{F["post_attesa_a"]}',
+     lambda F: {'commento_approva': 'Ok'}),
+    ('workflow.rifiuta_rendiconto', ['delegato'], 'POST', lambda F: f'/rifiuta_rendiconto/{F["post_attesa_b"]}',
+     lambda F: {'commento_rifiuta': 'Manca lo scontrino'}),
+    ('workflow.rifiuta_rimborso', ['Dirigente'], 'GET', lambda F: f'/rifiuta_rimborso/{F["post_attesa_c"]}', None),
+    ('workflow.richiedi_rimborso', ['Dipendente'], 'GET', lambda F: f'/richiedi_rimborso/{F["pronta_c"]}', None),
+    ('amministrazione.approva_rimborso_finale', ['Amministrazione'], 'POST', lambda F: f'/approva_rimborso_finale/{F["pronta_a"]}', lambda F: {}),
+    ('amministrazione.rifiuta_rimborso_finale', ['Amministrazione'], 'POST', lambda F: f'/rifiuta_rimborso_finale/{F["pronta_b"]}', lambda F: {}),
+    ('amministrazione.processa_rimborsi_finali', ['Amministrazione'], 'POST', lambda F: '/processa_rimborsi_finali',
+     lambda F: {'esito': 'Rimborsata',
+                'trasferta_ids': [str(F['pronta_lotto_a']), str(F['pronta_lotto_b']), str(F['pronta_a'])]}),
+    ('workflow.gestisci_deleghe', ['Dirigente'], 'POST', lambda F: '/gestisci_deleghe',
+     lambda F: {'delegato_id': str(ID_BERSAGLIO), 'data_inizio': GIORNO_FUTURO}),
+    ('workflow.revoca_delega', ['Dirigente'], 'POST', lambda F: f'/revoca_delega/{F["delega_revocabile"]}', lambda F: {}),
+    ('presenze.update_presenze_status', ['Presenze'], 'POST', lambda F: '/api/update_presenze_status',
+     lambda F: {'json': {'trasferta_id': F['conclusa'], 'field': 'gestito_presenze', 'value': True}}),
+    ('presenze.update_presenze_status_bulk', ['Presenze'], 'POST', lambda F: '/api/presenze/flag_bulk',
+     lambda F: {'json': {'modifiche': [
+         {'trasferta_id': F[chiave], 'field': campo, 'value': valore}
+         for chiave in ('conclusa', 'pronta_a', 'pronta_b', 'da_forzare')
+         for campo, valore in (('gestito_presenze', True), ('nbp', chiave != 'conclusa'))
+     ]}}),
+    ('superuser.superuser_modifica_stato_missione', ['Superuser'], 'POST', lambda F: '/superuser/modifica_stato_missione',
+     lambda F: {'trasferta_id': str(F['da_forzare']), 'stato_pre_missione': 'Approvata', 'stato_post_missione': 'Rimborsata'}),
+    ('superuser.associa_dirigente', ['Superuser'], 'POST', lambda F: '/associa_dirigente',
+     lambda F: {'dipendente_id': str(ID_BERSAGLIO), 'dirigente_id': str(ID_DIRIGENTE)}),
+    ('superuser.aggiorna_ruolo', ['Superuser'], 'POST', lambda F: f'/aggiorna_ruolo/{ID_BERSAGLIO}', lambda F: {'nuovo_ruolo': 'Dipendente'}),
+    ('superuser.admin_reset_password', ['Superuser'], 'POST', lambda F: f'/admin_reset_password/{ID_BERSAGLIO}',
+     lambda F: {'nuova_password': 'nuova-password'}),
+    ('autenticazione.cambia_password', ['Dipendente'], 'POST', lambda F: '/cambia_password',
+     lambda F: {'password_attuale': PASSWORD, 'nuova_password': 'cambiata', 'conferma_password': 'cambiata'}),
+    ('autenticazione.logout', ['Dipendente'], 'GET', lambda F: '/logout', None),
+]
+
+
+_statement = [0]
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _conta_statement(*args, **kwargs):
+    _statement[0] += 1
+
+
+def client_per(ruolo):
+    client = app.test_client()
+    if ruolo != ANONIMO:
+        with client.session_transaction() as sessione:
+            sessione['_user_id'] = str(RUOLI[ruolo])
+            sessione['_fresh'] = True
+    return client
+
+
+def esegui(fixture_ids):
+    """Esegue tutti gli scenari e restituisce [(chiave, endpoint, statement, status)] nell'ordine di esecuzione."""
+    risultati = []
+    for endpoint, ruoli, metodo, percorso, dati in SCENARI_LETTURA + SCENARI_SCRITTURA:
+        for ruolo in ruoli:
+            url = percorso(fixture_ids)
+            kwargs = dati(fixture_ids) if dati else {}
+            if 'json' not in kwargs and kwargs:
+                kwargs = {'data': kwargs}
+            client = client_per(ruolo)
+            # Il budget vale anche a cache fredda: l'utente viene sempre riletto dal DB
+            invalida_cache_utenti()
+            _statement[0] = 0
+            risposta = client.open(url, method=metodo, **kwargs)
+            risposta.get_data()  # le risposte in streaming eseguono le query mentre il corpo viene letto
+            risultati.append(((endpoint, ruolo, metodo, url), endpoint, _statement[0], risposta.status_code))
+    return risultati
+
+
+def verify_query_budget():
+    print("--- VERIFICA BUDGET DI QUERY PER ROTTA ---")
+    falliti = []
+
+    # 1. Ogni rotta dichiara un budget ed è coperta da almeno uno scenario
+    endpoint_app = sorted({r.endpoint for r in app.url_map.iter_rules() if r.endpoint != 'static'})
+    coperti = {s[0] for s in SCENARI_LETTURA + SCENARI_SCRITTURA}
+    for endpoint in endpoint_app:
+        if budget_della_rotta(app, endpoint) is None:
+            falliti.append(f"{endpoint}: budget non dichiarato (@budget_query)")
+        if endpoint not in coperti:
+            falliti.append(f"{endpoint}: nessuno scenario la esegue")
+
+    # 2. Esecuzione a ogni dimensione su un database ricreato
+    per_dimensione = {}
+    for n in DIMENSIONI:
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            print(f"\nCreazione database con {n} trasferte...")
+            fixture_ids = seed(n)
+            # Gli id ripartono da 1: i frammenti dei modali del database precedente non valgono più
+            invalida_cache_modali()
+            db.session.remove()
+        per_dimensione[n] = esegui(fixture_ids)
+
+    # 3. Confronto con il budget e con la dimensione di riferimento
+    riferimento = per_dimensione[DIMENSIONI[0]]
+    massimo_per_endpoint = {}
+    for n, risultati in per_dimensione.items():
+        for (chiave, endpoint, conteggio, status), (_, _, conteggio_rif, _) in zip(risultati, riferimento):
+            budget = budget_della_rotta(app, endpoint)
+            blocchi = budget_per_blocco(app, endpoint)
+            if blocchi:
+                # Streaming: il budget cresce con il numero di blocchi, il confronto fra dimensioni non si applica
+                per_blocco, righe_per_blocco = blocchi
+                budget += per_blocco * (math.ceil(n / righe_per_blocco) + 1)
+                conteggio_rif = conteggio
+            descrizione = f"{chiave[2]} {chiave[3]} come {chiave[1]} ({n} righe)"
+            massimo_per_endpoint[endpoint] = max(massimo_per_endpoint.get(endpoint, 0), conteggio)
+            if status >= 500:
+                falliti.append(f"{endpoint}: {descrizione} ha risposto {status}")
+            if budget is not None and conteggio > budget:
+                falliti.append(f"{endpoint}: {descrizione} esegue {conteggio} statement, budget {budget}")
+            if conteggio != conteggio_rif:
+                falliti.append(f"{endpoint}: {descrizione} esegue {conteggio} statement contro "
+                               f"{conteggio_rif} con {DIMENSIONI[0]} righe (cresce con i dati)")
+
+    print(f"\n{'Endpoint':<50} {'Max':>5} {'Budget':>7}")
+    for endpoint in endpoint_app:
+        budget = budget_della_rotta(app, endpoint)
+        massimo = massimo_per_endpoint.get(endpoint, '-')
+        blocchi = budget_per_blocco(app, endpoint)
+        nota = f"  (+{blocchi[0]} ogni {blocchi[1]} righe)" if blocchi else ''
+        print(f"{endpoint:<50} {massimo:>5} {budget if budget is not None else '-':>7}{nota}")
+
+    print()
+    if falliti:
+        for f in falliti:
+            print(f"[FAILURE] {f}")
+        print(f"\nCRITICAL: {len(falliti)} violazioni del budget di query.")
+        sys.exit(1)
+    print(f"[SUCCESS] Tutte le rotte rispettano il budget, costante da {DIMENSIONI[0]} a {DIMENSIONI[-1]} righe.")
+
+
+if __name__ == "__main__":
+    verify_query_budget()